@@ -2,16 +2,35 @@
 from __future__ import annotations
 
 import argparse
+import json
+import signal
+import sys
 from pathlib import Path
-from typing import Iterable, List, Sequence
+from typing import Dict, Iterable, List, Optional, Sequence
 
-from .engine import SearchResult, build_index, load_index, save_index, search_with_limits
-from .ingest.loader import load_documents_from_json
-from .resource_plan import ResourceLimits
-from .sample_docs import SAMPLE_DOCUMENTS
+from . import sample_docs
+from .core.models import Document
+from .engine import (
+    SEARCH_STRATEGIES,
+    SearchResult,
+    build_index,
+    build_index_file,
+    index_format_for,
+    load_index,
+    save_index,
+    search_with_limits,
+    verify_index,
+)
+from .ingest.dedup import DEDUP_MODES, DEFAULT_MAX_DISTANCE, NearDuplicateFilter
+from .ingest.loader import DEFAULT_SAMPLE_PATH, iter_documents
+from .resource_plan import ResourceLimits, StopReason
 
+# The sample corpus and the crawler, manifest and pipeline modules (with
+# their thread, process and SQLite imports) are only needed to build an
+# index, so they are imported by the index handlers; short commands such as
+# ``notso search`` start without them. ``tests/test_startup.py`` guards this.
 
-DEFAULT_INDEX_PATH = Path("data/index.json")
+DEFAULT_INDEX_PATH = Path("data/index.bin")
 
 
 def _print_results(results: Iterable[SearchResult]) -> None:
@@ -20,96 +39,416 @@ def _print_results(results: Iterable[SearchResult]) -> None:
 
 
 def _handle_index(args: argparse.Namespace) -> int:
-    documents = load_documents_from_json(Path(args.data)) if args.data else SAMPLE_DOCUMENTS
-    index = build_index(documents)
+    if args.incremental:
+        if args.dedup:
+            print("--dedup cannot be combined with --incremental")
+            return 2
+        return _update_index(args)
+    dedup = None
+    if args.dedup:
+        dedup = NearDuplicateFilter(args.dedup, max_distance=args.dedup_distance)
+    if args.pipeline is not None:
+        if args.max_memory_mb is not None:
+            print("--pipeline builds the index in memory; drop --max-memory-mb")
+            return 2
+        from .ingest.pipeline import DEFAULT_QUEUE_SIZE, build_index_pipelined
+
+        workers = dict(args.pipeline)
+        workers.setdefault("analyze", args.workers)
+        index, stats = build_index_pipelined(
+            args.data or DEFAULT_SAMPLE_PATH,
+            workers=workers,
+            dedup=dedup,
+            queue_size=args.queue_size or DEFAULT_QUEUE_SIZE,
+        )
+        save_index(index, args.output)
+        count = index.document_count()
+        print("\n".join(stats.format_lines()))
+        print(f"Bottleneck: {stats.bottleneck.name}")
+    else:
+        count = _build(args, dedup)
+        if count is None:
+            return 2
+    if index_format_for(args.output) == "sqlite":
+        from .ingest.manifest import manifest_path
+
+        # The rebuilt database no longer matches an incremental manifest.
+        manifest_path(args.output).unlink(missing_ok=True)
+    print(f"Indexed {count} documents into {args.output}")
+    if dedup is not None:
+        action = "dropped" if args.dedup == "drop" else "marked duplicate_of"
+        print(f"{dedup.duplicates} near-duplicates {action}")
+    return 0
+
+
+def _build(args: argparse.Namespace, dedup: Optional[NearDuplicateFilter]) -> Optional[int]:
+    if not args.data:
+        documents: Iterable[Document] = sample_docs.SAMPLE_DOCUMENTS
+    elif Path(args.data).is_dir():
+        from .ingest.crawler import crawl_documents
+
+        documents = crawl_documents(args.data)
+    else:
+        documents = iter_documents(args.data)
+    if dedup is not None:
+        documents = dedup.filter(documents)
+    if index_format_for(args.output) == "binary":
+        # Binary indexes are built straight to disk within the memory budget.
+        limits = None
+        if args.max_memory_mb is not None:
+            limits = ResourceLimits(max_memory_bytes=args.max_memory_mb * 1024 * 1024)
+        return build_index_file(documents, args.output, limits=limits, workers=args.workers)
+    if args.max_memory_mb is not None:
+        print("--max-memory-mb builds a binary index; choose another --output")
+        return None
+    index = build_index(documents, workers=args.workers)
     save_index(index, args.output)
-    print(f"Indexed {index.document_count()} documents into {args.output}")
+    return index.document_count()
+
+
+def _stage_workers(spec: str) -> Dict[str, int]:
+    from .ingest.pipeline import STAGE_NAMES
+
+    workers: Dict[str, int] = {}
+    for part in filter(None, spec.split(",")):
+        name, _, count = part.partition("=")
+        if name not in STAGE_NAMES or not count.isdigit() or int(count) < 1:
+            raise argparse.ArgumentTypeError(
+                f"expected STAGE=N with STAGE one of {', '.join(STAGE_NAMES)}: {part!r}"
+            )
+        workers[name] = int(count)
+    return workers
+
+
+def _update_index(args: argparse.Namespace) -> int:
+    if not args.data or index_format_for(args.output) != "sqlite":
+        print("--incremental needs --data and a SQLite --output (.db, .sqlite)")
+        return 2
+    from .ingest.manifest import (
+        ADD,
+        DELETE,
+        UPDATE,
+        apply_changes,
+        corpus_changes,
+        load_index_manifest,
+        manifest_path,
+    )
+    from .storage.sqlite_index import SqliteIndex
+
+    path = manifest_path(args.output)
+    with SqliteIndex(args.output) as index:
+        manifest = load_index_manifest(path, index)
+        counts = apply_changes(index, corpus_changes(args.data, manifest))
+        count = index.document_count()
+    manifest.save(path)
+    print(
+        f"Updated {args.output}: {counts[ADD]} added, {counts[UPDATE]} updated,"
+        f" {counts[DELETE]} removed; {count} documents"
+    )
     return 0
 
 
-def _handle_search(args: argparse.Namespace) -> int:
-    index = load_index(args.index)
-    limits = ResourceLimits(
+def _limits(args: argparse.Namespace) -> ResourceLimits:
+    return ResourceLimits(
         max_seconds=args.max_seconds,
         max_memory_bytes=args.max_memory_kb * 1024 if args.max_memory_kb else None,
         max_documents=args.max_docs,
         max_query_terms=args.max_terms,
         term_block_size=args.term_block_size,
     )
-    results, stop_reason = search_with_limits(index, args.query, top_k=args.top_k, limits=limits)
+
+
+def _print_search(results: List[SearchResult], stop_reason: Optional[StopReason]) -> None:
     if not results:
         print("No results found.")
-        return 0
+        return
     _print_results(results)
     if stop_reason:
         print(f"Search stopped early: {stop_reason.reason} ({stop_reason.detail})")
+
+
+def _handle_search(args: argparse.Namespace) -> int:
+    if args.daemon is not None:
+        return _search_daemon(args)
+    # Results read their text from the index, so print them before it closes.
+    with load_index(args.index) as index:
+        _print_search(
+            *search_with_limits(
+                index, args.query, top_k=args.top_k, limits=_limits(args), strategy=args.strategy
+            )
+        )
     return 0
 
 
-def build_parser() -> argparse.ArgumentParser:
-    """Build the CLI argument parser."""
+def _search_daemon(args: argparse.Namespace) -> int:
+    from .daemon import DEFAULT_SOCKET_PATH, DaemonClient
 
-    parser = argparse.ArgumentParser(prog="notso")
-    subparsers = parser.add_subparsers(dest="command", required=True)
+    socket_path = args.daemon or DEFAULT_SOCKET_PATH
+    try:
+        client = DaemonClient(socket_path)
+    except OSError as exc:
+        print(f"No notso daemon on {socket_path} ({exc}); start one with `notso serve-cli`")
+        return 1
+    with client:
+        try:
+            results, stop_reason = client.search(
+                args.query, top_k=args.top_k, limits=_limits(args), strategy=args.strategy
+            )
+        except ValueError as exc:
+            print(f"Search failed: {exc}")
+            return 1
+    _print_search(results, stop_reason)
+    return 0
 
-    index_parser = subparsers.add_parser("index", help="Index sample documents")
-    index_parser.add_argument(
-        "--output",
-        default=str(DEFAULT_INDEX_PATH),
-        help="Output path for the index JSON",
-    )
-    index_parser.add_argument(
-        "--data",
-        default=None,
-        help="Optional path to a JSON corpus file",
-    )
-    index_parser.set_defaults(func=_handle_index)
 
-    search_parser = subparsers.add_parser("search", help="Search the index")
-    search_parser.add_argument("query", help="Query string")
-    search_parser.add_argument(
-        "--index",
-        default=str(DEFAULT_INDEX_PATH),
-        help="Path to the index JSON",
-    )
-    search_parser.add_argument(
+def _handle_shell(args: argparse.Namespace) -> int:
+    from .daemon import QueryService
+
+    limits = _limits(args)
+    interactive = sys.stdin.isatty()
+    with load_index(args.index) as index:
+        service = QueryService(index)
+        while True:
+            if interactive:
+                print("notso> ", end="", flush=True)
+            line = sys.stdin.readline()
+            if not line or line.strip() in ("quit", "exit"):
+                return 0
+            query = line.strip()
+            if not query:
+                continue
+            if args.json:
+                request = {"query": query, "top_k": args.top_k, "strategy": args.strategy}
+                request["limits"] = {
+                    name: value for name, value in vars(limits).items() if value is not None
+                }
+                print(json.dumps(service.handle(request)), flush=True)
+                continue
+            _print_search(
+                *service.search(query, top_k=args.top_k, limits=limits, strategy=args.strategy)
+            )
+            # A blank line ends each answer, so scripts can split the output.
+            print(flush=True)
+
+
+def _handle_serve(args: argparse.Namespace) -> int:
+    from .daemon import DEFAULT_SOCKET_PATH, QueryServer, QueryService
+
+    socket_path = args.socket or DEFAULT_SOCKET_PATH
+    with load_index(args.index) as index:
+        try:
+            server = QueryServer(socket_path, QueryService(index))
+        except OSError as exc:
+            print(f"Cannot listen on {socket_path}: {exc}")
+            return 1
+        print(f"Serving {args.index} on {socket_path}", flush=True)
+        # Stop on ``kill`` as on Ctrl-C, so the socket file is removed either way.
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    return 0
+
+
+def _handle_verify(args: argparse.Namespace) -> int:
+    status = 0
+    for result in verify_index(args.index):
+        if not result.ok:
+            print(f"{result.path}: CORRUPT: {result.error}")
+            status = 1
+        elif result.blocks:
+            print(f"{result.path}: OK ({result.blocks} blocks, {result.bytes_checked} bytes)")
+        else:
+            print(f"{result.path}: not checked (no checksums)")
+    return status
+
+
+def _add_search_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
         "--top-k",
         type=int,
         default=5,
         help="Number of results to return",
     )
-    search_parser.add_argument(
+    parser.add_argument(
         "--max-seconds",
         type=float,
         default=None,
         help="Stop searching after this many seconds",
     )
-    search_parser.add_argument(
+    parser.add_argument(
         "--max-memory-kb",
         type=int,
         default=None,
         help="Stop searching after this many kilobytes of memory",
     )
-    search_parser.add_argument(
+    parser.add_argument(
         "--max-docs",
         type=int,
         default=None,
         help="Stop searching after scoring this many documents",
     )
-    search_parser.add_argument(
+    parser.add_argument(
         "--max-terms",
         type=int,
         default=None,
         help="Limit the number of query terms used for scoring",
     )
-    search_parser.add_argument(
+    parser.add_argument(
         "--term-block-size",
         type=int,
         default=None,
         help="Process query terms in blocks of this size",
     )
+    parser.add_argument(
+        "--strategy",
+        choices=SEARCH_STRATEGIES,
+        default="exhaustive",
+        help="Candidate evaluation strategy (results are identical)",
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the CLI argument parser."""
+
+    parser = argparse.ArgumentParser(prog="notso")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="Index sample documents")
+    index_parser.add_argument(
+        "--output",
+        default=str(DEFAULT_INDEX_PATH),
+        help="Output path for the index (.json writes JSON, .db/.sqlite writes SQLite)",
+    )
+    index_parser.add_argument(
+        "--data",
+        default=None,
+        help=(
+            "Optional JSON corpus file (.jsonl/.ndjson for JSON Lines), or a directory"
+            " whose .txt and .html files are crawled"
+        ),
+    )
+    index_parser.add_argument(
+        "--max-memory-mb",
+        type=int,
+        default=None,
+        help="Build on disk, spilling postings to temporary runs above this many megabytes",
+    )
+    index_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Tokenize documents in this many processes (the index is identical)",
+    )
+    index_parser.add_argument(
+        "--dedup",
+        choices=DEDUP_MODES,
+        default=None,
+        help=(
+            "Find near-duplicate documents by SimHash and drop them, or keep them"
+            " with a duplicate_of metadata entry (cluster)"
+        ),
+    )
+    index_parser.add_argument(
+        "--dedup-distance",
+        type=int,
+        default=DEFAULT_MAX_DISTANCE,
+        help="Fingerprints differing in at most this many of 64 bits are near-duplicates",
+    )
+    index_parser.add_argument(
+        "--pipeline",
+        nargs="?",
+        const="",
+        default=None,
+        type=_stage_workers,
+        metavar="STAGE=N,...",
+        help=(
+            "Ingest through staged read/normalize/analyze workers connected by bounded"
+            " queues and print per-stage throughput, e.g. --pipeline read=4,analyze=2"
+        ),
+    )
+    index_parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=None,
+        help="Batches that may wait between two --pipeline stages",
+    )
+    index_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "Apply only the documents added, changed or removed since the last run,"
+            " tracked in a manifest next to a SQLite --output"
+        ),
+    )
+    index_parser.set_defaults(func=_handle_index)
+
+    search_parser = subparsers.add_parser("search", help="Search the index")
+    search_parser.add_argument("query", help="Query string")
+    search_parser.add_argument(
+        "--index",
+        default=str(DEFAULT_INDEX_PATH),
+        help="Path to the index file",
+    )
+    _add_search_options(search_parser)
+    search_parser.add_argument(
+        "--daemon",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="SOCKET",
+        help=(
+            "Forward the search to a running `notso serve-cli` instead of loading the index"
+            " (default: the socket serve-cli listens on by default)"
+        ),
+    )
     search_parser.set_defaults(func=_handle_search)
 
+    shell_parser = subparsers.add_parser(
+        "shell", help="Load the index once and answer one query per line of stdin"
+    )
+    shell_parser.add_argument(
+        "--index",
+        default=str(DEFAULT_INDEX_PATH),
+        help="Path to the index file",
+    )
+    _add_search_options(shell_parser)
+    shell_parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print one JSON response per query, in the daemon's protocol format",
+    )
+    shell_parser.set_defaults(func=_handle_shell)
+
+    serve_parser = subparsers.add_parser(
+        "serve-cli", help="Keep the index loaded and answer searches on a Unix socket"
+    )
+    serve_parser.add_argument(
+        "--index",
+        default=str(DEFAULT_INDEX_PATH),
+        help="Path to the index file",
+    )
+    serve_parser.add_argument(
+        "--socket",
+        default=None,
+        help="Path of the Unix socket to listen on (default: notso.daemon.DEFAULT_SOCKET_PATH)",
+    )
+    serve_parser.set_defaults(func=_handle_serve)
+
+    verify_parser = subparsers.add_parser(
+        "verify", help="Check an index and its document store against their checksums"
+    )
+    verify_parser.add_argument(
+        "index",
+        nargs="?",
+        default=str(DEFAULT_INDEX_PATH),
+        help="Path to the index file",
+    )
+    verify_parser.set_defaults(func=_handle_verify)
+
     return parser
 
 
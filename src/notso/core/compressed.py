@@ -0,0 +1,326 @@
+"""Compact read-only index backed by block-encoded integer postings."""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .index import analyze_documents
+from .models import Document, DocumentView, Index
+from .postings import PostingsWriter, decode_block, decode_positions, iter_blocks
+from .ranker import relative_length
+from .store import DocumentSource, DocumentStore
+from .vocab import SortedTermTable, Vocabulary
+
+if TYPE_CHECKING:
+    import mmap
+
+
+@dataclass
+class CompressedIndex(Index):
+    """Inverted index that stores postings as delta/varint encoded blocks.
+
+    Documents are addressed by dense integer ordinals. Terms are interned in
+    ``_vocabulary`` and ``_term_slots[term_id]`` gives each term's position
+    in the sorted term table, or -1 when the term has no postings here;
+    ``_term_blocks[slot]`` is the first block of that term's postings and
+    ``_term_blocks[slot + 1]`` is one past its last block. Blocks are only
+    decoded when a query iterates the term's postings. Content token positions
+    are stored in ``_position_data`` using the same block boundaries, and
+    document text in ``_store``.
+
+    The integer tables are arrays when the index is built in memory and
+    zero-copy views of a mapped file when it is opened from disk (see
+    ``notso.storage.binary``); ``_ordinals`` is then built on first use, and
+    ``_mapping`` and every view of it in ``_views`` are released on close.
+    """
+
+    _store: DocumentSource
+    _ordinals: Optional[Dict[str, int]]
+    _doc_lengths: Sequence[int]
+    _length_norms: Sequence[float]
+    _vocabulary: Union[Vocabulary, SortedTermTable]
+    _term_slots: Sequence[int]
+    _document_frequencies: Sequence[int]
+    _max_term_frequencies: Sequence[int]
+    _min_document_lengths: Sequence[int]
+    _term_blocks: Sequence[int]
+    _block_last: Sequence[int]
+    _block_max_tfs: Sequence[int]
+    _block_min_lengths: Sequence[int]
+    _block_offsets: Sequence[int]
+    _data: Sequence[int]
+    _position_offsets: Sequence[int]
+    _position_data: Sequence[int]
+    _average_document_length: float
+    _mapping: Optional[mmap.mmap] = None
+    _views: List[memoryview] = field(default_factory=list)
+
+    def documents(self) -> Iterable[Document]:
+        return self._store.documents()
+
+    def document_at(self, ordinal: int) -> DocumentView:
+        return self._store.view(ordinal)
+
+    def close(self) -> None:
+        try:
+            for view in reversed(self._views):
+                view.release()
+            if self._mapping is not None:
+                self._mapping.close()
+        finally:
+            self._store.close()
+
+    def __enter__(self) -> CompressedIndex:
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.close()
+
+    def document_length(self, ordinal: int) -> int:
+        return self._doc_lengths[ordinal]
+
+    def ordinal(self, doc_id: str) -> Optional[int]:
+        """Return a document's ordinal, or ``None`` if it is not indexed."""
+
+        if self._ordinals is None:
+            store = self._store
+            self._ordinals = {store.doc_id(ordinal): ordinal for ordinal in range(len(store))}
+        return self._ordinals.get(doc_id)
+
+    def length_norms(self) -> Sequence[float]:
+        return self._length_norms
+
+    def postings(self, term: str) -> Iterator[Tuple[int, int]]:
+        slot = self._term_slot(term)
+        if slot is None:
+            return iter(())
+        return iter_blocks(
+            self._data,
+            self._block_last,
+            self._block_offsets,
+            self._term_blocks[slot],
+            self._term_blocks[slot + 1],
+        )
+
+    def positions(self, ordinal: int, term: str) -> Sequence[int]:
+        slot = self._term_slot(term)
+        if slot is None:
+            return ()
+        first_block = self._term_blocks[slot]
+        end_block = self._term_blocks[slot + 1]
+        block = bisect_left(self._block_last, ordinal, first_block, end_block)
+        if block == end_block:
+            return ()
+        previous = self._block_last[block - 1] if block > first_block else -1
+        ordinals, _frequencies = decode_block(
+            self._data, self._block_offsets[block], self._block_offsets[block + 1], previous
+        )
+        entry = bisect_left(ordinals, ordinal)
+        if entry == len(ordinals) or ordinals[entry] != ordinal:
+            return ()
+        return decode_positions(self._position_data, self._position_offsets[block], entry)
+
+    def term_bound(self, term: str) -> Tuple[int, int]:
+        slot = self._term_slot(term)
+        if slot is None:
+            return 0, 0
+        return self._max_term_frequencies[slot], self._min_document_lengths[slot]
+
+    def posting_blocks(self, term: str) -> Sequence[Tuple[int, int, int]]:
+        slot = self._term_slot(term)
+        if slot is None:
+            return ()
+        blocks = range(self._term_blocks[slot], self._term_blocks[slot + 1])
+        return [
+            (self._block_last[b], self._block_max_tfs[b], self._block_min_lengths[b])
+            for b in blocks
+        ]
+
+    def block_postings(self, term: str, block: int) -> Sequence[Tuple[int, int]]:
+        slot = self._term_slot(term)
+        if slot is None:
+            return ()
+        first_block = self._term_blocks[slot]
+        block += first_block
+        previous = self._block_last[block - 1] if block > first_block else -1
+        ordinals, frequencies = decode_block(
+            self._data, self._block_offsets[block], self._block_offsets[block + 1], previous
+        )
+        return list(zip(ordinals, frequencies))
+
+    def term_frequencies(self, doc_id: str) -> Dict[str, int]:
+        """Return a document's term counts.
+
+        The index has no forward lists, so this scans every posting list; the
+        search path reads frequencies from ``postings`` instead.
+        """
+
+        ordinal = self.ordinal(doc_id)
+        if ordinal is None:
+            return {}
+        frequencies: Dict[str, int] = {}
+        for term in self.terms():
+            for posting_ordinal, tf in self.postings(term):
+                if posting_ordinal == ordinal:
+                    frequencies[term] = tf
+                    break
+                if posting_ordinal > ordinal:
+                    break
+        return frequencies
+
+    def document_frequency(self, term: str) -> int:
+        slot = self._term_slot(term)
+        return 0 if slot is None else self._document_frequencies[slot]
+
+    def document_count(self) -> int:
+        return len(self._store)
+
+    def average_document_length(self) -> float:
+        return self._average_document_length
+
+    def terms(self) -> List[str]:
+        """Return the indexed terms in sorted order."""
+
+        terms = self._vocabulary.terms()
+        slots = self._term_slots
+        ordered = [""] * (len(self._term_blocks) - 1)
+        for term_id, slot in enumerate(slots):
+            if slot >= 0:
+                ordered[slot] = terms[term_id]
+        return ordered
+
+    def posting_count(self) -> int:
+        """Return the total number of (document, term) postings."""
+
+        return sum(self._document_frequencies)
+
+    def postings_nbytes(self) -> int:
+        """Return the bytes used by encoded postings and their block tables."""
+
+        return (
+            len(self._data)
+            + _array_nbytes(self._block_last)
+            + _array_nbytes(self._block_max_tfs)
+            + _array_nbytes(self._block_min_lengths)
+            + _array_nbytes(self._block_offsets)
+            + _array_nbytes(self._term_blocks)
+            + _array_nbytes(self._document_frequencies)
+        )
+
+    def positions_nbytes(self) -> int:
+        """Return the bytes used by the encoded position stream."""
+
+        return len(self._position_data) + _array_nbytes(self._position_offsets)
+
+    def bytes_per_posting(self) -> float:
+        """Return the average encoded size of one posting, in bytes."""
+
+        return self.postings_nbytes() / max(self.posting_count(), 1)
+
+    def _term_slot(self, term: str) -> Optional[int]:
+        term_id = self._vocabulary.get(term)
+        if term_id is None or term_id >= len(self._term_slots):
+            return None
+        slot = self._term_slots[term_id]
+        return slot if slot >= 0 else None
+
+
+def _array_nbytes(values: Sequence[int]) -> int:
+    return values.itemsize * len(values)
+
+
+def build_compressed_index(
+    documents: Iterable[Document],
+    vocabulary: Optional[Vocabulary] = None,
+    *,
+    workers: int = 1,
+) -> CompressedIndex:
+    """Build a compressed index for the provided documents.
+
+    Passing a ``vocabulary`` lets several indexes share one term table.
+    ``workers`` processes tokenize the documents (see ``analyze_documents``);
+    the index is identical for any number of them.
+    """
+
+    store = DocumentStore()
+    ordinals: Dict[str, int] = {}
+    doc_lengths = array("I")
+    writers: Dict[int, PostingsWriter] = {}
+    vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+    total_length = 0
+
+    for doc, (length, counts, positions) in analyze_documents(
+        documents, vocabulary, workers=workers
+    ):
+        if doc.doc_id in ordinals:
+            raise ValueError(f"Duplicate document id: {doc.doc_id}")
+        ordinal = store.append(doc)
+        ordinals[doc.doc_id] = ordinal
+        doc_lengths.append(length)
+        total_length += length
+        for term_id, tf in counts.items():
+            writer = writers.get(term_id)
+            if writer is None:
+                writer = writers[term_id] = PostingsWriter()
+            writer.add(ordinal, tf, positions.get(term_id, ()), length)
+
+    term_ids = vocabulary.sorted_ids(writers)
+    term_slots = array("i", [-1]) * len(vocabulary)
+    document_frequencies = array("I")
+    max_term_frequencies = array("I")
+    min_document_lengths = array("I")
+    term_blocks = array("I")
+    block_last = array("I")
+    block_max_tfs = array("I")
+    block_min_lengths = array("I")
+    block_offsets = array("Q")
+    position_offsets = array("Q")
+    data = bytearray()
+    position_data = bytearray()
+    for slot, term_id in enumerate(term_ids):
+        term_slots[term_id] = slot
+        writer = writers.pop(term_id)
+        base = len(data)
+        position_base = len(position_data)
+        term_blocks.append(len(block_last))
+        document_frequencies.append(writer.count)
+        max_term_frequencies.append(writer.max_term_frequency)
+        min_document_lengths.append(writer.min_document_length)
+        block_last.extend(writer.block_last)
+        block_max_tfs.extend(writer.block_max_tfs)
+        block_min_lengths.extend(writer.block_min_lengths)
+        block_offsets.extend(base + offset for offset in writer.block_offsets)
+        position_offsets.extend(position_base + offset for offset in writer.position_offsets)
+        data.extend(writer.data)
+        position_data.extend(writer.position_data)
+    term_blocks.append(len(block_last))
+    block_offsets.append(len(data))
+    position_offsets.append(len(position_data))
+
+    average_length = total_length / max(len(store), 1)
+    return CompressedIndex(
+        _store=store,
+        _ordinals=ordinals,
+        _doc_lengths=doc_lengths,
+        _length_norms=array("d", (relative_length(length, average_length) for length in doc_lengths)),
+        _vocabulary=vocabulary,
+        _term_slots=term_slots,
+        _document_frequencies=document_frequencies,
+        _max_term_frequencies=max_term_frequencies,
+        _min_document_lengths=min_document_lengths,
+        _term_blocks=term_blocks,
+        _block_last=block_last,
+        _block_max_tfs=block_max_tfs,
+        _block_min_lengths=block_min_lengths,
+        _block_offsets=block_offsets,
+        _data=bytes(data),
+        _position_offsets=position_offsets,
+        _position_data=bytes(position_data),
+        _average_document_length=average_length,
+    )
+
+
+__all__ = ["CompressedIndex", "build_compressed_index"]
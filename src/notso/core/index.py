@@ -2,64 +2,516 @@
 
 from __future__ import annotations
 
-from collections import Counter, defaultdict
-from dataclasses import dataclass
-from typing import Dict, Iterable, List
+from array import array
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import (
+    TYPE_CHECKING,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
-from .models import Document, Index
-from .ranker import tokenize
+from .models import Document, DocumentView, Index
+from .postings import BLOCK_SIZE
+from .ranker import relative_length
+from .store import DocumentSource, DocumentStore
+from .vocab import Vocabulary
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+# Deleted documents whose postings an index may hold before it compacts, as a
+# count and as a share of all the documents in its posting lists.
+COMPACT_MIN_DEAD = 64
+COMPACT_DEAD_RATIO = 0.25
 
 
 @dataclass
 class InMemoryIndex(Index):
-    """Simple in-memory inverted index."""
+    """Simple in-memory inverted index.
+
+    Documents receive dense ordinals in insertion order and can be added,
+    updated or deleted in place. A delete leaves a tombstone: its postings
+    stay where they are but are filtered out of query results, while document
+    frequencies and the average document length are adjusted immediately.
+    Term and block bounds can only overestimate after a delete, so pruned
+    searches stay exact. Once deleted documents make up ``COMPACT_DEAD_RATIO``
+    of the posting lists, ``compact`` drops them and renumbers the rest.
 
-    _documents: Dict[str, Document]
-    _term_frequencies: Dict[str, Dict[str, int]]
-    _document_frequencies: Dict[str, int]
-    _average_document_length: float
+    Terms are interned in ``_vocabulary``; per-document counts and positions
+    are keyed by term id and the per-term tables are lists indexed by it.
+    Document text lives in ``_store``; deleted documents keep their slot.
+    """
+
+    _vocabulary: Vocabulary = field(default_factory=Vocabulary)
+    _store: DocumentStore = field(default_factory=DocumentStore)
+    _term_frequencies: Dict[str, Dict[int, int]] = field(default_factory=dict)
+    _document_frequencies: List[int] = field(default_factory=list)
+    _average_document_length: float = 0.0
+    _postings: List[List[Tuple[int, int]]] = field(default_factory=list)
+    _doc_lengths: List[int] = field(default_factory=list)
+    _positions: List[Dict[int, List[int]]] = field(default_factory=list)
+    _length_norms: Optional[array] = None
+    _term_bounds: List[Tuple[int, int]] = field(default_factory=list)
+    _posting_blocks: List[List[Tuple[int, int, int]]] = field(default_factory=list)
+    _ordinals: Dict[str, int] = field(default_factory=dict)
+    _deleted: Set[int] = field(default_factory=set)
+    _total_length: int = 0
+    # Deleted documents whose postings have not been compacted away.
+    _dead: int = 0
 
     def documents(self) -> Iterable[Document]:
-        return self._documents.values()
+        # Ordinals are assigned in insertion order and never reused.
+        return (self._store.document(ordinal) for ordinal in self._ordinals.values())
+
+    def document_at(self, ordinal: int) -> DocumentView:
+        return self._store.view(ordinal)
+
+    def close(self) -> None:
+        self._store.close()
+
+    def __enter__(self) -> InMemoryIndex:
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.close()
+
+    def document_length(self, ordinal: int) -> int:
+        return self._doc_lengths[ordinal]
+
+    def length_norms(self) -> Sequence[float]:
+        if self._length_norms is None:
+            average_length = self._average_document_length
+            self._length_norms = array(
+                "d", (relative_length(length, average_length) for length in self._doc_lengths)
+            )
+        return self._length_norms
+
+    def postings(self, term: str) -> Sequence[Tuple[int, int]]:
+        term_id = self._term_id(term)
+        return () if term_id is None else self._live(self._postings[term_id])
+
+    def positions(self, ordinal: int, term: str) -> Sequence[int]:
+        term_id = self._term_id(term)
+        return () if term_id is None else self._positions[ordinal].get(term_id, ())
+
+    def term_bound(self, term: str) -> Tuple[int, int]:
+        term_id = self._term_id(term)
+        return (0, 0) if term_id is None else self._term_bounds[term_id]
+
+    def posting_blocks(self, term: str) -> Sequence[Tuple[int, int, int]]:
+        term_id = self._term_id(term)
+        return () if term_id is None else self._posting_blocks[term_id]
+
+    def block_postings(self, term: str, block: int) -> Sequence[Tuple[int, int]]:
+        start = block * BLOCK_SIZE
+        return self._live(self._postings[self._term_id(term)][start : start + BLOCK_SIZE])
 
     def term_frequencies(self, doc_id: str) -> Dict[str, int]:
+        term = self._vocabulary.term
+        return {term(term_id): tf for term_id, tf in self.term_counts(doc_id).items()}
+
+    def term_counts(self, doc_id: str) -> Dict[int, int]:
+        """Return a document's term counts keyed by term id."""
+
         return self._term_frequencies.get(doc_id, {})
 
     def document_frequency(self, term: str) -> int:
-        return self._document_frequencies.get(term, 0)
+        term_id = self._term_id(term)
+        return 0 if term_id is None else self._document_frequencies[term_id]
 
     def document_count(self) -> int:
-        return len(self._documents)
+        return len(self._ordinals)
 
     def average_document_length(self) -> float:
         return self._average_document_length
 
+    def vocabulary(self) -> Vocabulary:
+        return self._vocabulary
+
+    def analyzed_documents(self) -> Iterator[Tuple[Document, _Analysis]]:
+        """Yield each document with its stored ``analyze_document`` result, in order.
+
+        Nothing is tokenized: the counts and positions are the index's own,
+        keyed by ids in ``vocabulary()``.
+        """
+
+        for doc_id, ordinal in self._ordinals.items():
+            yield self._store.document(ordinal), (
+                self._doc_lengths[ordinal],
+                self._term_frequencies[doc_id],
+                self._positions[ordinal],
+            )
+
+    def deleted_count(self) -> int:
+        """Return the number of tombstoned ordinals."""
+
+        return len(self._deleted)
+
+    def add_documents(self, documents: Iterable[Document], *, workers: int = 1) -> int:
+        """Index new documents and return how many were added.
+
+        With ``workers`` above one, documents are tokenized in that many
+        processes (see ``analyze_documents``); the index is the same.
+        """
+
+        if workers > 1:
+            return self._add_counted(
+                analyze_documents(documents, self._vocabulary, workers=workers)
+            )
+        added = 0
+        try:
+            for doc in documents:
+                if doc.doc_id in self._ordinals:
+                    raise ValueError(f"Duplicate document id: {doc.doc_id}")
+                self._append(doc)
+                added += 1
+        finally:
+            if added:
+                self._refresh_statistics()
+        return added
+
+    def add_analyzed(self, analyzed: Iterable[Tuple[Document, TermAnalysis]]) -> int:
+        """Index documents tokenized elsewhere and return how many were added.
+
+        Each analysis is keyed by term, as ``analyze_texts`` returns it. Terms
+        are interned in order, so the index is the one ``add_documents``
+        builds from the same documents.
+        """
+
+        vocabulary = self._vocabulary
+        return self._add_counted(
+            (doc, intern_analysis(analysis, vocabulary)) for doc, analysis in analyzed
+        )
+
+    def _add_counted(self, analyzed: Iterable[Tuple[Document, _Analysis]]) -> int:
+        added = 0
+        try:
+            for doc, (length, counts, positions) in analyzed:
+                if doc.doc_id in self._ordinals:
+                    raise ValueError(f"Duplicate document id: {doc.doc_id}")
+                ordinal = self._store.append(doc)
+                self._index_counts(ordinal, doc.doc_id, length, counts, positions)
+                added += 1
+        finally:
+            if added:
+                self._refresh_statistics()
+        return added
+
+    def update_document(self, document: Document) -> None:
+        """Replace the document with the same id, or add it if it is new."""
+
+        self.delete_document(document.doc_id)
+        self.add_documents([document])
+
+    def delete_document(self, doc_id: str) -> bool:
+        """Tombstone a document and return whether it was present."""
+
+        ordinal = self._ordinals.pop(doc_id, None)
+        if ordinal is None:
+            return False
+        for term_id in self._term_frequencies.pop(doc_id):
+            self._document_frequencies[term_id] -= 1
+        self._total_length -= self._doc_lengths[ordinal]
+        self._positions[ordinal] = {}
+        self._deleted.add(ordinal)
+        self._dead += 1
+        self._refresh_statistics()
+        live = len(self._ordinals)
+        if self._dead >= COMPACT_MIN_DEAD and self._dead > COMPACT_DEAD_RATIO * (live + self._dead):
+            self.compact()
+        return True
+
+    def compact(self) -> int:
+        """Drop deleted documents' postings and text; return how many were dropped.
+
+        Documents added to the index are renumbered to close the gaps, so
+        ordinals from before the call no longer apply; views already handed
+        out keep reading the old store. Documents of a ``base`` store keep
+        their ordinals, and a deleted one keeps its empty slot.
+        """
 
-def build_in_memory_index(documents: Iterable[Document]) -> InMemoryIndex:
-    """Build an in-memory index for the provided documents."""
+        dropped = self._dead
+        if not dropped:
+            return 0
+        deleted = self._deleted
+        base_count = self._store.base_count()
+        kept = [
+            ordinal
+            for ordinal in range(len(self._doc_lengths))
+            if ordinal < base_count or ordinal not in deleted
+        ]
+        renumber = {ordinal: new for new, ordinal in enumerate(kept)}
+        self._store = self._store.without(deleted)
+        self._doc_lengths = [self._doc_lengths[ordinal] for ordinal in kept]
+        self._positions = [self._positions[ordinal] for ordinal in kept]
+        self._ordinals = {doc_id: renumber[ordinal] for doc_id, ordinal in self._ordinals.items()}
+        lengths = self._doc_lengths
+        for term_id, term_postings in enumerate(self._postings):
+            live = [
+                (renumber[ordinal], tf) for ordinal, tf in term_postings if ordinal not in deleted
+            ]
+            blocks = []
+            for start in range(0, len(live), BLOCK_SIZE):
+                block = live[start : start + BLOCK_SIZE]
+                max_tf = max(tf for _ordinal, tf in block)
+                min_length = min(lengths[ordinal] for ordinal, _tf in block)
+                blocks.append((block[-1][0], max_tf, min_length))
+            self._postings[term_id] = live
+            self._posting_blocks[term_id] = blocks
+            self._term_bounds[term_id] = (
+                (max(block[1] for block in blocks), min(block[2] for block in blocks))
+                if blocks
+                else (0, 0)
+            )
+        self._deleted = {ordinal for ordinal in deleted if ordinal < base_count}
+        self._dead = 0
+        self._length_norms = None
+        return dropped
 
-    doc_map: Dict[str, Document] = {}
-    term_frequencies: Dict[str, Dict[str, int]] = {}
-    document_frequencies: Dict[str, int] = defaultdict(int)
-    total_length = 0
+    def _append(self, doc: Document) -> None:
+        self._index_document(self._store.append(doc), doc)
 
-    for doc in documents:
-        doc_map[doc.doc_id] = doc
-        tokens = tokenize(f"{doc.title} {doc.content}")
-        total_length += len(tokens)
-        counts = Counter(tokens)
-        term_frequencies[doc.doc_id] = dict(counts)
-        for term in counts:
-            document_frequencies[term] += 1
+    def _index_document(self, ordinal: int, doc: Document) -> None:
+        length, counts, positions = analyze_document(doc, self._vocabulary)
+        self._index_counts(ordinal, doc.doc_id, length, counts, positions)
 
-    average_length = total_length / max(len(doc_map), 1)
+    def _index_counts(
+        self,
+        ordinal: int,
+        doc_id: str,
+        length: int,
+        counts: Dict[int, int],
+        positions: Dict[int, List[int]],
+    ) -> None:
+        self._ordinals[doc_id] = ordinal
+        self._term_frequencies[doc_id] = counts
+        self._doc_lengths.append(length)
+        self._positions.append(positions)
+        self._total_length += length
+        for _ in range(len(self._postings), len(self._vocabulary)):
+            self._document_frequencies.append(0)
+            self._postings.append([])
+            self._term_bounds.append((0, 0))
+            self._posting_blocks.append([])
+        for term_id, tf in counts.items():
+            self._document_frequencies[term_id] += 1
+            term_postings = self._postings[term_id]
+            term_postings.append((ordinal, tf))
+            if len(term_postings) == 1:
+                self._term_bounds[term_id] = (tf, length)
+            else:
+                max_tf, min_length = self._term_bounds[term_id]
+                self._term_bounds[term_id] = (max(max_tf, tf), min(min_length, length))
+            blocks = self._posting_blocks[term_id]
+            if len(term_postings) % BLOCK_SIZE == 1:
+                blocks.append((ordinal, tf, length))
+            else:
+                _last, block_tf, block_length = blocks[-1]
+                blocks[-1] = (ordinal, max(block_tf, tf), min(block_length, length))
 
-    return InMemoryIndex(
-        _documents=doc_map,
-        _term_frequencies=term_frequencies,
-        _document_frequencies=dict(document_frequencies),
-        _average_document_length=average_length,
+    def _refresh_statistics(self) -> None:
+        self._average_document_length = self._total_length / max(len(self._ordinals), 1)
+        self._length_norms = None
+
+    def _term_id(self, term: str) -> Optional[int]:
+        # A shared vocabulary can hold terms this index has never seen.
+        term_id = self._vocabulary.get(term)
+        return term_id if term_id is not None and term_id < len(self._postings) else None
+
+    def _live(self, postings: Sequence[Tuple[int, int]]) -> Sequence[Tuple[int, int]]:
+        if not self._deleted:
+            return postings
+        deleted = self._deleted
+        return [posting for posting in postings if posting[0] not in deleted]
+
+
+def analyze_document(
+    doc: DocumentView, vocabulary: Vocabulary
+) -> Tuple[int, Dict[int, int], Dict[int, List[int]]]:
+    """Return a document's token count, term counts and content token positions.
+
+    Counts cover the title and content; positions index into the content
+    tokens only, which is what proximity scoring measures. Terms are
+    interned in ``vocabulary`` and keyed by id.
+    """
+
+    title_tokens = vocabulary.encode(doc.title)
+    content_tokens = vocabulary.encode(doc.content)
+    counts = Counter(title_tokens)
+    counts.update(content_tokens)
+    positions: Dict[int, List[int]] = defaultdict(list)
+    for position, token in enumerate(content_tokens):
+        positions[token].append(position)
+    return len(title_tokens) + len(content_tokens), dict(counts), dict(positions)
+
+
+_Analysis = Tuple[int, Dict[int, int], Dict[int, List[int]]]
+# The same, keyed by term rather than by a vocabulary's ids.
+TermAnalysis = Tuple[int, Dict[str, int], Dict[str, List[int]]]
+
+# Documents sent to a worker process at a time.
+ANALYZE_BATCH_SIZE = 64
+
+
+def analyze_documents(
+    documents: Iterable[Document], vocabulary: Vocabulary, *, workers: int = 1
+) -> Iterator[Tuple[Document, _Analysis]]:
+    """Yield each document with its ``analyze_document`` result, in order.
+
+    With ``workers`` above one, batches of documents are tokenized and
+    counted in a process pool; the workers key their counts by term and the
+    terms are interned here in each document's first-seen order, so the
+    vocabulary ends up exactly as a serial run leaves it. At most two
+    batches per worker are in flight, so a streamed corpus is never read
+    far ahead.
+    """
+
+    if workers <= 1:
+        for doc in documents:
+            yield doc, analyze_document(doc, vocabulary)
+        return
+
+    # Imported here: it pulls in multiprocessing, which serial builds and
+    # searches never need.
+    from concurrent.futures import ProcessPoolExecutor
+
+    iterator = iter(documents)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Tuple[List[Document], Future]] = deque()
+        while True:
+            while len(pending) < 2 * workers:
+                batch = list(islice(iterator, ANALYZE_BATCH_SIZE))
+                if not batch:
+                    break
+                texts = [(doc.title, doc.content) for doc in batch]
+                pending.append((batch, pool.submit(analyze_texts, texts)))
+            if not pending:
+                return
+            batch, future = pending.popleft()
+            for doc, analysis in zip(batch, future.result()):
+                yield doc, intern_analysis(analysis, vocabulary)
+
+
+def intern_analysis(analysis: TermAnalysis, vocabulary: Vocabulary) -> _Analysis:
+    """Key a ``TermAnalysis`` by term id, interning its terms in first-seen order."""
+
+    length, counts, positions = analysis
+    intern = vocabulary.intern
+    term_counts = {intern(term): tf for term, tf in counts.items()}
+    term_positions = {intern(term): plist for term, plist in positions.items()}
+    return length, term_counts, term_positions
+
+
+def analyze_texts(texts: List[Tuple[str, str]]) -> List[TermAnalysis]:
+    """Run ``analyze_document`` on ``(title, content)`` pairs, keying results by term.
+
+    It needs no shared vocabulary, so it can run in a worker process.
+    """
+
+    vocabulary = Vocabulary()
+    term = vocabulary.term
+    results = []
+    for title, content in texts:
+        length, counts, positions = analyze_document(Document("", title, content), vocabulary)
+        results.append(
+            (
+                length,
+                {term(term_id): tf for term_id, tf in counts.items()},
+                {term(term_id): plist for term_id, plist in positions.items()},
+            )
+        )
+    return results
+
+
+def build_in_memory_index(
+    documents: Iterable[Document],
+    vocabulary: Optional[Vocabulary] = None,
+    *,
+    workers: int = 1,
+) -> InMemoryIndex:
+    """Build an in-memory index for the provided documents.
+
+    ``workers`` processes tokenize the documents; the index is identical
+    for any number of them.
+    """
+
+    index = InMemoryIndex(_vocabulary=vocabulary if vocabulary is not None else Vocabulary())
+    index.add_documents(documents, workers=workers)
+    return index
+
+
+def build_in_memory_index_from_store(
+    source: DocumentSource, vocabulary: Optional[Vocabulary] = None
+) -> InMemoryIndex:
+    """Index the documents of an existing store without copying their text.
+
+    The index reads content back from ``source`` when it is displayed;
+    documents added later are kept in memory alongside it.
+    """
+
+    index = InMemoryIndex(
+        _vocabulary=vocabulary if vocabulary is not None else Vocabulary(),
+        _store=DocumentStore(base=source),
     )
+    for ordinal in range(len(source)):
+        doc = source.document(ordinal)
+        if doc.doc_id in index._ordinals:
+            raise ValueError(f"Duplicate document id: {doc.doc_id}")
+        index._index_document(ordinal, doc)
+    index._refresh_statistics()
+    return index
+
+
+def restore_in_memory_index(
+    source: DocumentSource,
+    document_lengths: Sequence[int],
+    term_frequencies: Sequence[Mapping[str, int]],
+    term_positions: Sequence[Mapping[str, Sequence[int]]],
+    vocabulary: Optional[Vocabulary] = None,
+) -> InMemoryIndex:
+    """Rebuild an index from persisted per-document statistics.
+
+    The statistics are given by ordinal, as ``analyze_document`` would have
+    produced them for the documents in ``source``; nothing is tokenized.
+    """
+
+    if not len(source) == len(document_lengths) == len(term_frequencies) == len(term_positions):
+        raise ValueError("Persisted statistics do not match the document store")
+    vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+    intern = vocabulary.intern
+    index = InMemoryIndex(_vocabulary=vocabulary, _store=DocumentStore(base=source))
+    for ordinal, length in enumerate(document_lengths):
+        doc_id = source.doc_id(ordinal)
+        if doc_id in index._ordinals:
+            raise ValueError(f"Duplicate document id: {doc_id}")
+        counts = {intern(term): tf for term, tf in term_frequencies[ordinal].items()}
+        positions = {intern(term): list(plist) for term, plist in term_positions[ordinal].items()}
+        index._index_counts(ordinal, doc_id, length, counts, positions)
+    index._refresh_statistics()
+    return index
 
 
-__all__ = ["InMemoryIndex", "build_in_memory_index"]
+__all__ = [
+    "ANALYZE_BATCH_SIZE",
+    "COMPACT_DEAD_RATIO",
+    "COMPACT_MIN_DEAD",
+    "InMemoryIndex",
+    "TermAnalysis",
+    "analyze_document",
+    "analyze_documents",
+    "analyze_texts",
+    "build_in_memory_index",
+    "build_in_memory_index_from_store",
+    "intern_analysis",
+    "restore_in_memory_index",
+]
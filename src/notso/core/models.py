@@ -2,18 +2,80 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Iterable, Protocol
+from dataclasses import FrozenInstanceError
+from typing import Any, Iterable, NoReturn, Optional, Protocol, Sequence, Tuple
 
 
-@dataclass(frozen=True)
 class Document:
-    """A minimal document representation for indexing and retrieval."""
+    """A minimal document representation for indexing and retrieval.
+
+    Documents are immutable and slotted, so they carry no per-instance
+    ``__dict__``; indexes keep their text in a document store rather than
+    holding on to these objects.
+    """
+
+    __slots__ = ("doc_id", "title", "content", "metadata")
 
     doc_id: str
     title: str
     content: str
-    metadata: dict[str, str] | None = None
+    metadata: Optional[dict[str, str]]
+
+    def __init__(
+        self, doc_id: str, title: str, content: str, metadata: Optional[dict[str, str]] = None
+    ) -> None:
+        object.__setattr__(self, "doc_id", doc_id)
+        object.__setattr__(self, "title", title)
+        object.__setattr__(self, "content", content)
+        object.__setattr__(self, "metadata", metadata)
+
+    def __setattr__(self, name: str, value: Any) -> NoReturn:
+        raise FrozenInstanceError(f"cannot assign to field {name!r}")
+
+    def __delattr__(self, name: str) -> NoReturn:
+        raise FrozenInstanceError(f"cannot delete field {name!r}")
+
+    def __reduce__(self) -> Tuple[type, Tuple[str, str, str, Optional[dict[str, str]]]]:
+        return Document, (self.doc_id, self.title, self.content, self.metadata)
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not Document:
+            return NotImplemented
+        return (self.doc_id, self.title, self.content, self.metadata) == (
+            other.doc_id,
+            other.title,
+            other.content,
+            other.metadata,
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.doc_id, self.title, self.content))
+
+    def __repr__(self) -> str:
+        return (
+            f"Document(doc_id={self.doc_id!r}, title={self.title!r}, "
+            f"content={self.content!r}, metadata={self.metadata!r})"
+        )
+
+
+class DocumentView(Protocol):
+    """Read-only document fields, as returned by ``Index.document_at``."""
+
+    @property
+    def doc_id(self) -> str:
+        ...
+
+    @property
+    def title(self) -> str:
+        ...
+
+    @property
+    def content(self) -> str:
+        ...
+
+    @property
+    def metadata(self) -> Optional[dict[str, str]]:
+        ...
 
 
 class Index(Protocol):
@@ -22,6 +84,37 @@ class Index(Protocol):
     def documents(self) -> Iterable[Document]:
         ...
 
+    def document_at(self, ordinal: int) -> DocumentView:
+        """Return the document with ``ordinal``; its text may be read lazily."""
+        ...
+
+    def document_length(self, ordinal: int) -> int:
+        ...
+
+    def length_norms(self) -> Sequence[float]:
+        """Return each document's length divided by the average, by ordinal."""
+        ...
+
+    def postings(self, term: str) -> Iterable[Tuple[int, int]]:
+        """Return ``(ordinal, term_frequency)`` pairs in ascending ordinal order."""
+        ...
+
+    def positions(self, ordinal: int, term: str) -> Sequence[int]:
+        """Return the ascending positions of ``term`` among a document's content tokens."""
+        ...
+
+    def term_bound(self, term: str) -> Tuple[int, int]:
+        """Return ``(max term frequency, min document length)`` over a term's postings."""
+        ...
+
+    def posting_blocks(self, term: str) -> Sequence[Tuple[int, int, int]]:
+        """Return ``(last ordinal, max term frequency, min document length)`` per posting block."""
+        ...
+
+    def block_postings(self, term: str, block: int) -> Sequence[Tuple[int, int]]:
+        """Return the ``(ordinal, term_frequency)`` pairs of one posting block."""
+        ...
+
     def term_frequencies(self, doc_id: str) -> dict[str, int]:
         ...
 
@@ -34,5 +127,9 @@ class Index(Protocol):
     def average_document_length(self) -> float:
         ...
 
+    def close(self) -> None:
+        """Release files the index reads from; it must not be searched afterwards."""
+        ...
+
 
-__all__ = ["Document", "Index"]
+__all__ = ["Document", "DocumentView", "Index"]
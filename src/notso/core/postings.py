@@ -0,0 +1,227 @@
+"""Block-encoded integer posting lists.
+
+A posting list is a sequence of ``(ordinal, term_frequency)`` pairs in
+ascending ordinal order. Postings are grouped into blocks of ``BLOCK_SIZE``
+entries; inside a block every pair is stored as two unsigned LEB128 varints,
+the ordinal as the gap from the previous posting. Each block records the last
+ordinal it contains and its starting byte offset, so a reader can skip to a
+block and decode only that block. Blocks also record their largest term
+frequency and smallest document length, which bound the score of any
+posting inside them.
+
+Token positions live in a parallel stream with the same block boundaries:
+each posting contributes a varint count followed by its positions, each
+stored as the gap from the previous one.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+BLOCK_SIZE = 128
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    """Append ``value`` to ``out`` as an unsigned LEB128 varint."""
+
+    if value < 0:
+        raise ValueError(f"Cannot encode negative value {value}")
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data: Sequence[int], position: int) -> Tuple[int, int]:
+    """Decode one varint at ``position`` and return it with the next position."""
+
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def decode_varints(data: Sequence[int], start: int, end: int) -> List[int]:
+    """Decode every varint stored in ``data[start:end]``."""
+
+    values: List[int] = []
+    value = 0
+    shift = 0
+    for position in range(start, end):
+        byte = data[position]
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = 0
+            shift = 0
+    if shift:
+        raise ValueError("Truncated varint in posting block")
+    return values
+
+
+class PostingsWriter:
+    """Accumulates one term's postings in block-encoded form.
+
+    ``drain`` hands over the bytes encoded so far, so a long posting list can
+    be written out as it grows; block offsets keep counting from its start.
+    """
+
+    __slots__ = (
+        "data",
+        "position_data",
+        "block_last",
+        "block_max_tfs",
+        "block_min_lengths",
+        "block_offsets",
+        "position_offsets",
+        "count",
+        "max_term_frequency",
+        "min_document_length",
+        "_last",
+        "_in_block",
+        "_drained",
+        "_positions_drained",
+    )
+
+    def __init__(self) -> None:
+        self.data = bytearray()
+        self.position_data = bytearray()
+        self.block_last = array("I")
+        self.block_max_tfs = array("I")
+        self.block_min_lengths = array("I")
+        self.block_offsets = array("Q")
+        self.position_offsets = array("Q")
+        self.count = 0
+        self.max_term_frequency = 0
+        self.min_document_length = 0
+        self._last = -1
+        self._in_block = 0
+        self._drained = 0
+        self._positions_drained = 0
+
+    def add(
+        self,
+        ordinal: int,
+        term_frequency: int,
+        positions: Iterable[int] = (),
+        document_length: int = 0,
+    ) -> None:
+        if ordinal <= self._last:
+            raise ValueError("Postings must be added in ascending ordinal order")
+        if self._in_block == BLOCK_SIZE or self.count == 0:
+            self.block_offsets.append(self._drained + len(self.data))
+            self.position_offsets.append(self._positions_drained + len(self.position_data))
+            self.block_last.append(ordinal)
+            self.block_max_tfs.append(term_frequency)
+            self.block_min_lengths.append(document_length)
+            self._in_block = 0
+        encode_varint(ordinal - self._last - 1, self.data)
+        encode_varint(term_frequency, self.data)
+        encode_positions(positions, self.position_data)
+        self.block_last[-1] = ordinal
+        self.block_max_tfs[-1] = max(self.block_max_tfs[-1], term_frequency)
+        self.block_min_lengths[-1] = min(self.block_min_lengths[-1], document_length)
+        if self.count == 0 or document_length < self.min_document_length:
+            self.min_document_length = document_length
+        self.max_term_frequency = max(self.max_term_frequency, term_frequency)
+        self._last = ordinal
+        self._in_block += 1
+        self.count += 1
+
+    def drain(self) -> Tuple[bytearray, bytearray]:
+        """Remove and return the postings and positions bytes encoded so far."""
+
+        data, self.data = self.data, bytearray()
+        position_data, self.position_data = self.position_data, bytearray()
+        self._drained += len(data)
+        self._positions_drained += len(position_data)
+        return data, position_data
+
+
+def decode_block(
+    data: Sequence[int], start: int, end: int, previous_ordinal: int
+) -> Tuple[List[int], List[int]]:
+    """Decode one block into parallel ordinal and term-frequency lists."""
+
+    values = decode_varints(data, start, end)
+    ordinals: List[int] = []
+    frequencies = values[1::2]
+    current = previous_ordinal
+    for gap in values[0::2]:
+        current += gap + 1
+        ordinals.append(current)
+    return ordinals, frequencies
+
+
+def encode_positions(positions: Iterable[int], out: bytearray) -> None:
+    """Append one posting's ascending positions as a count plus gaps."""
+
+    values = list(positions)
+    encode_varint(len(values), out)
+    previous = -1
+    for position in values:
+        encode_varint(position - previous - 1, out)
+        previous = position
+
+
+def decode_positions(data: Sequence[int], start: int, entry: int) -> List[int]:
+    """Decode the positions of the ``entry``-th posting of a block at ``start``."""
+
+    cursor = start
+    for _ in range(entry):
+        count, cursor = read_varint(data, cursor)
+        for _ in range(count):
+            _gap, cursor = read_varint(data, cursor)
+    count, cursor = read_varint(data, cursor)
+    positions: List[int] = []
+    previous = -1
+    for _ in range(count):
+        gap, cursor = read_varint(data, cursor)
+        previous += gap + 1
+        positions.append(previous)
+    return positions
+
+
+def iter_blocks(
+    data: Sequence[int],
+    block_last: Sequence[int],
+    block_offsets: Sequence[int],
+    first_block: int,
+    end_block: int,
+    previous: int = -1,
+) -> Iterator[Tuple[int, int]]:
+    """Yield ``(ordinal, term_frequency)`` pairs from blocks ``[first_block, end_block)``.
+
+    Block ``b`` spans ``data[block_offsets[b]:block_offsets[b + 1]]``, so
+    ``block_offsets`` carries one trailing end offset after the last block.
+    ``previous`` is the last ordinal before ``first_block`` (``-1`` when
+    ``first_block`` starts a posting list).
+    """
+
+    for block in range(first_block, end_block):
+        ordinals, frequencies = decode_block(
+            data, block_offsets[block], block_offsets[block + 1], previous
+        )
+        yield from zip(ordinals, frequencies)
+        previous = block_last[block]
+
+
+__all__ = [
+    "BLOCK_SIZE",
+    "PostingsWriter",
+    "decode_block",
+    "decode_positions",
+    "decode_varints",
+    "encode_positions",
+    "encode_varint",
+    "iter_blocks",
+    "read_varint",
+]
@@ -0,0 +1,378 @@
+"""Document-at-a-time top-k evaluation with dynamic pruning.
+
+Two evaluators share the same cursors and bounds: MaxScore, which splits the
+query terms into essential and non-essential lists by their global upper
+bounds, and Block-Max WAND, which also uses each posting block's maximum
+contribution to jump over whole blocks.
+"""
+
+from __future__ import annotations
+
+import sys
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from .models import Index
+from .postings import BLOCK_SIZE
+from .ranker import HybridRanker, ScoringContext, relative_length
+from .topk import TopKCollector
+
+END_OF_POSTINGS = sys.maxsize
+
+StopT = TypeVar("StopT")
+
+
+@dataclass
+class EvaluationStats:
+    """Work counters for one top-k evaluation.
+
+    ``docs_skipped`` counts candidate postings eliminated by an upper bound
+    without a full score; a document skipped in several posting lists counts
+    once per list. ``blocks_skipped`` counts posting blocks jumped over
+    without being decoded.
+    """
+
+    docs_scored: int = 0
+    docs_skipped: int = 0
+    blocks_skipped: int = 0
+
+
+class PostingCursor:
+    """Forward-only cursor over one term's postings.
+
+    The cursor holds one decoded block at a time and uses the index's block
+    table to jump over blocks that end before an ``advance`` target.
+    """
+
+    __slots__ = (
+        "term",
+        "doc",
+        "tf",
+        "blocks_skipped",
+        "_index",
+        "_blocks",
+        "_lasts",
+        "_last_block_size",
+        "_block",
+        "_entries",
+        "_entry",
+    )
+
+    def __init__(self, index: Index, term: str) -> None:
+        self.term = term
+        self.blocks_skipped = 0
+        self._index = index
+        self._blocks = index.posting_blocks(term)
+        self._lasts = [block[0] for block in self._blocks]
+        self._last_block_size: Optional[int] = None
+        self._load(0)
+
+    def _load(self, block: int) -> None:
+        # Blocks can come back empty when every posting in them was deleted.
+        self._entry = 0
+        while block < len(self._blocks):
+            self._entries: Sequence[Tuple[int, int]] = self._index.block_postings(self.term, block)
+            if self._entries:
+                self._block = block
+                self.doc, self.tf = self._entries[0]
+                return
+            block += 1
+        self._block = block
+        self._entries = ()
+        self.doc, self.tf = END_OF_POSTINGS, 0
+
+    def _block_size(self, block: int) -> int:
+        if block < len(self._blocks) - 1:
+            return BLOCK_SIZE
+        # The document frequency can't size the last block: it drops on a
+        # delete while the deleted postings stay in their blocks.
+        if self._last_block_size is None:
+            self._last_block_size = len(self._index.block_postings(self.term, block))
+        return self._last_block_size
+
+    def next(self) -> None:
+        self._entry += 1
+        if self._entry < len(self._entries):
+            self.doc, self.tf = self._entries[self._entry]
+        elif self.doc != END_OF_POSTINGS:
+            self._load(self._block + 1)
+
+    def advance(self, target: int) -> int:
+        """Move to the first posting at or after ``target``; return postings passed."""
+
+        if self.doc >= target:
+            return 0
+        passed = 0
+        if self._lasts[self._block] < target:
+            passed = len(self._entries) - self._entry
+            block = bisect_left(self._lasts, target, self._block + 1)
+            for skipped in range(self._block + 1, block):
+                passed += self._block_size(skipped)
+            self.blocks_skipped += block - self._block - 1
+            self._load(block)
+            if self.doc >= target:
+                return passed
+        entry = bisect_left(self._entries, (target, 0), self._entry)
+        passed += entry - self._entry
+        if entry == len(self._entries):
+            self._load(self._block + 1)
+            return passed
+        self._entry = entry
+        self.doc, self.tf = self._entries[entry]
+        return passed
+
+    def block_for(self, target: int) -> Optional[int]:
+        """Return the block that would hold ``target`` without decoding it.
+
+        Returns ``None`` when every remaining posting precedes ``target``.
+        """
+
+        if self._block >= len(self._blocks):
+            return None
+        if self._lasts[self._block] >= target:
+            return self._block
+        block = bisect_left(self._lasts, target, self._block + 1)
+        return block if block < len(self._blocks) else None
+
+    def block_summary(self, block: int) -> Tuple[int, int, int]:
+        """Return ``(last ordinal, max term frequency, min document length)`` of a block."""
+
+        return self._blocks[block]
+
+
+def _no_stop(_docs_scored: int) -> None:
+    return None
+
+
+def max_score_top_k(
+    index: Index,
+    ranker: HybridRanker,
+    context: ScoringContext,
+    collector: TopKCollector,
+    *,
+    checkpoint: Callable[[int], Optional[StopT]] = _no_stop,
+    stats: Optional[EvaluationStats] = None,
+) -> Optional[StopT]:
+    """Fill ``collector`` with the exact top-k of ``ranker.score_document``.
+
+    Query terms are ordered by their score upper bound. Terms whose combined
+    bound cannot beat the current top-k threshold become non-essential: only
+    documents from the remaining essential lists are visited, and the
+    non-essential lists are probed only while a document can still qualify.
+    ``checkpoint`` is called with the number of documents scored so far before
+    each candidate and a non-``None`` return stops the evaluation.
+    """
+
+    stats = stats if stats is not None else EvaluationStats()
+    scored = 0
+    norms = index.length_norms()
+    average_length = index.average_document_length()
+
+    bounded: List[Tuple[float, str]] = []
+    for term in set(context.terms):
+        max_tf, min_length = index.term_bound(term)
+        if max_tf == 0:
+            continue
+        min_norm = relative_length(min_length, average_length)
+        bounded.append((ranker.term_score(context, term, max_tf, min_norm), term))
+    bounded.sort()
+
+    cursors = [PostingCursor(index, term) for _bound, term in bounded]
+    bounds = [bound for bound, _term in bounded]
+    prefix_bounds = [0.0]
+    for bound in bounds:
+        prefix_bounds.append(prefix_bounds[-1] + bound)
+
+    first_essential = 0
+    while True:
+        threshold = collector.threshold()
+        while first_essential < len(cursors) and ranker.score_upper_bound(
+            context, prefix_bounds[first_essential + 1], first_essential + 1
+        ) <= threshold:
+            first_essential += 1
+        essential = cursors[first_essential:]
+        if not essential:
+            break
+        pivot = min(cursor.doc for cursor in essential)
+        if pivot == END_OF_POSTINGS:
+            break
+
+        stop = checkpoint(scored)
+        if stop is not None:
+            stats.blocks_skipped += sum(cursor.blocks_skipped for cursor in cursors)
+            return stop
+
+        norm = norms[pivot]
+        frequencies: Dict[str, int] = {}
+        lexical = 0.0
+        for cursor in essential:
+            if cursor.doc == pivot:
+                frequencies[cursor.term] = cursor.tf
+                lexical += ranker.term_score(context, cursor.term, cursor.tf, norm)
+                cursor.next()
+
+        # Probe non-essential lists from the largest bound down, giving up as
+        # soon as the remaining bounds cannot lift the document past the threshold.
+        qualifies = True
+        for position in range(first_essential - 1, -1, -1):
+            if ranker.score_upper_bound(
+                context,
+                lexical + prefix_bounds[position + 1],
+                len(frequencies) + position + 1,
+            ) <= threshold:
+                qualifies = False
+                break
+            cursor = cursors[position]
+            stats.docs_skipped += cursor.advance(pivot)
+            if cursor.doc == pivot:
+                frequencies[cursor.term] = cursor.tf
+                lexical += ranker.term_score(context, cursor.term, cursor.tf, norm)
+
+        if not qualifies:
+            stats.docs_skipped += 1
+            continue
+
+        scored += 1
+        stats.docs_scored += 1
+        document = index.document_at(pivot)
+        score = ranker.score_document(
+            context,
+            document=document,
+            term_frequencies=frequencies,
+            length_norm=norm,
+            term_positions={term: index.positions(pivot, term) for term in frequencies},
+        )
+        if score > 0:
+            collector.offer(pivot, score)
+
+    stats.blocks_skipped += sum(cursor.blocks_skipped for cursor in cursors)
+    return None
+
+
+def block_max_wand_top_k(
+    index: Index,
+    ranker: HybridRanker,
+    context: ScoringContext,
+    collector: TopKCollector,
+    *,
+    checkpoint: Callable[[int], Optional[StopT]] = _no_stop,
+    stats: Optional[EvaluationStats] = None,
+) -> Optional[StopT]:
+    """Fill ``collector`` with the exact top-k using Block-Max WAND.
+
+    Cursors are kept sorted by current document. The pivot is the first
+    document whose cursors' global bounds could beat the threshold; the
+    blocks holding the pivot then give a tighter bound, and when that bound
+    fails the cursors up to the pivot jump over every block whose maximum
+    still cannot qualify.
+    ``checkpoint`` behaves as in ``max_score_top_k``.
+    """
+
+    stats = stats if stats is not None else EvaluationStats()
+    scored = 0
+    norms = index.length_norms()
+    average_length = index.average_document_length()
+
+    cursors: List[PostingCursor] = []
+    global_bounds: Dict[str, float] = {}
+    for term in sorted(set(context.terms)):
+        max_tf, min_length = index.term_bound(term)
+        if max_tf == 0:
+            continue
+        min_norm = relative_length(min_length, average_length)
+        global_bounds[term] = ranker.term_score(context, term, max_tf, min_norm)
+        cursors.append(PostingCursor(index, term))
+
+    block_bounds: Dict[Tuple[str, int], float] = {}
+
+    def block_bound(cursor: PostingCursor, block: int) -> float:
+        key = (cursor.term, block)
+        bound = block_bounds.get(key)
+        if bound is None:
+            _last, max_tf, min_length = cursor.block_summary(block)
+            bound = ranker.term_score(
+                context, cursor.term, max_tf, relative_length(min_length, average_length)
+            )
+            block_bounds[key] = bound
+        return bound
+
+    while True:
+        cursors.sort(key=lambda cursor: cursor.doc)
+        threshold = collector.threshold()
+
+        pivot = -1
+        accumulated = 0.0
+        for position, cursor in enumerate(cursors):
+            if cursor.doc == END_OF_POSTINGS:
+                break
+            accumulated += global_bounds[cursor.term]
+            if ranker.score_upper_bound(context, accumulated, position + 1) > threshold:
+                pivot = position
+                break
+        if pivot < 0:
+            break
+        pivot_doc = cursors[pivot].doc
+        last = pivot
+        while last + 1 < len(cursors) and cursors[last + 1].doc == pivot_doc:
+            last += 1
+        leading = cursors[: last + 1]
+
+        # Bound the pivot by the blocks that would hold it. While that bound
+        # fails, no document before the end of the shortest of those blocks
+        # can qualify, so keep moving the target across block tables without
+        # decoding, stopping at the next cursor's document.
+        next_doc = cursors[last + 1].doc if last + 1 < len(cursors) else END_OF_POSTINGS
+        target = pivot_doc
+        while target < next_doc:
+            block_sum = 0.0
+            block_end = END_OF_POSTINGS
+            for cursor in leading:
+                block = cursor.block_for(target)
+                if block is not None:
+                    block_sum += block_bound(cursor, block)
+                    block_end = min(block_end, cursor.block_summary(block)[0] + 1)
+            if ranker.score_upper_bound(context, block_sum, len(leading)) > threshold:
+                break
+            target = min(block_end, next_doc)
+        if target > pivot_doc:
+            for cursor in leading:
+                stats.docs_skipped += cursor.advance(target)
+            continue
+
+        if cursors[0].doc != pivot_doc:
+            for cursor in cursors[:pivot]:
+                stats.docs_skipped += cursor.advance(pivot_doc)
+            continue
+
+        stop = checkpoint(scored)
+        if stop is not None:
+            stats.blocks_skipped += sum(cursor.blocks_skipped for cursor in cursors)
+            return stop
+
+        frequencies = {cursor.term: cursor.tf for cursor in leading}
+        scored += 1
+        stats.docs_scored += 1
+        score = ranker.score_document(
+            context,
+            document=index.document_at(pivot_doc),
+            term_frequencies=frequencies,
+            length_norm=norms[pivot_doc],
+            term_positions={term: index.positions(pivot_doc, term) for term in frequencies},
+        )
+        if score > 0:
+            collector.offer(pivot_doc, score)
+        for cursor in leading:
+            cursor.next()
+
+    stats.blocks_skipped += sum(cursor.blocks_skipped for cursor in cursors)
+    return None
+
+
+__all__ = [
+    "END_OF_POSTINGS",
+    "EvaluationStats",
+    "PostingCursor",
+    "block_max_wand_top_k",
+    "max_score_top_k",
+]
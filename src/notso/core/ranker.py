@@ -4,9 +4,9 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from math import log
-from typing import Callable, Iterable, List
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
 
-from .models import Document
+from .models import DocumentView
 
 
 @dataclass(frozen=True)
@@ -23,6 +23,58 @@ def tokenize(text: str) -> List[str]:
     return [token.lower() for token in text.split() if token.strip()]
 
 
+def bm25_idf(document_frequency: int, corpus_size: int) -> float:
+    """Return the BM25 inverse document frequency of a term."""
+
+    return log((corpus_size - document_frequency + 0.5) / (document_frequency + 0.5) + 1.0)
+
+
+def relative_length(document_length: int, average_document_length: float) -> float:
+    """Return a document's length relative to the corpus average."""
+
+    return max(document_length, 1) / (average_document_length or 1.0)
+
+
+class RelativeLengths:
+    """Length norms computed on access against a corpus-wide average."""
+
+    __slots__ = ("_length", "_count", "_average")
+
+    def __init__(self, length: Callable[[int], int], count: int, average: float) -> None:
+        self._length = length
+        self._count = count
+        self._average = average
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, ordinal: int) -> float:
+        return relative_length(self._length(ordinal), self._average)
+
+
+@dataclass(frozen=True)
+class ScoringContext:
+    """Per-query constants shared by every candidate document.
+
+    With ``norm`` a document's entry from ``Index.length_norms()``, the BM25
+    denominator of a posting is ``tf + norm_base + norm_scale * norm``.
+    """
+
+    terms: Tuple[str, ...]
+    idfs: Dict[str, float]
+    k1_plus_one: float
+    norm_base: float
+    norm_scale: float
+
+
+# Positions are distinct, so two matched positions already span two tokens.
+_MAX_PROXIMITY_BONUS = 0.5
+_TITLE_BOOST_WEIGHT = 0.2
+# Relative headroom on upper bounds so float rounding never prunes a document
+# whose exact score would tie or beat the threshold.
+_BOUND_SLACK = 1e-9
+
+
 class HybridRanker:
     """Hybrid ranker combining lexical and custom signal scoring."""
 
@@ -30,52 +82,138 @@ class HybridRanker:
         self._k1 = k1
         self._b = b
 
-    def score(
+    def context(self, query_terms: Iterable[str], idfs: Mapping[str, float]) -> ScoringContext:
+        """Build the scoring context for a query from its term IDFs."""
+
+        terms = tuple(query_terms)
+        return ScoringContext(
+            terms=terms,
+            idfs={term: idfs.get(term, 0.0) for term in terms},
+            k1_plus_one=self._k1 + 1,
+            norm_base=self._k1 * (1 - self._b),
+            norm_scale=self._k1 * self._b,
+        )
+
+    def score_document(
         self,
+        context: ScoringContext,
         *,
-        query_terms: Iterable[str],
-        document: Document,
-        term_frequencies: dict[str, int],
-        average_document_length: float,
-        corpus_size: int,
-        document_frequency_lookup: Callable[[str], int],
+        document: DocumentView,
+        term_frequencies: Mapping[str, int],
+        length_norm: float,
+        term_positions: Optional[Mapping[str, Sequence[int]]] = None,
     ) -> float:
-        """Return a hybrid lexical + custom rank score."""
-        terms = list(query_terms)
-        doc_len = max(sum(term_frequencies.values()), 1)
-        avg_len = average_document_length or 1.0
+        """Return the hybrid score of one candidate under a query context.
+
+        ``term_frequencies`` only needs entries for the query terms.
+        """
+        norm = context.norm_base + context.norm_scale * length_norm
+        idfs = context.idfs
         lexical_score = 0.0
         matched_terms = 0
 
-        for term in terms:
+        for term in context.terms:
             tf = term_frequencies.get(term, 0)
             if tf == 0:
                 continue
             matched_terms += 1
-            df = document_frequency_lookup(term)
-            idf = log((corpus_size - df + 0.5) / (df + 0.5) + 1.0)
-            denom = tf + self._k1 * (1 - self._b + self._b * (doc_len / avg_len))
-            lexical_score += idf * (tf * (self._k1 + 1) / denom)
+            lexical_score += idfs[term] * (tf * context.k1_plus_one / (tf + norm))
 
         if matched_terms == 0:
             return 0.0
 
-        proximity_bonus = self._proximity_bonus(document, terms)
-        coverage_bonus = matched_terms / max(len(terms), 1)
-        title_boost = 1.0 + 0.2 * self._title_match_ratio(document.title, terms)
+        proximity_bonus = self._proximity_bonus(document, context.terms, term_positions)
+        coverage_bonus = matched_terms / max(len(context.terms), 1)
+        title_boost = 1.0 + _TITLE_BOOST_WEIGHT * self._title_match_ratio(
+            document.title, context.terms
+        )
 
         return (lexical_score + proximity_bonus + coverage_bonus) * title_boost
 
-    def _proximity_bonus(self, document: Document, query_terms: Iterable[str]) -> float:
-        tokens = tokenize(document.content)
-        term_positions = {
-            term: [idx for idx, token in enumerate(tokens) if token == term]
-            for term in query_terms
+    def term_score(
+        self, context: ScoringContext, term: str, term_frequency: int, length_norm: float
+    ) -> float:
+        """Return one term's BM25 contribution, as summed by ``score_document``."""
+
+        norm = context.norm_base + context.norm_scale * length_norm
+        return context.idfs[term] * (term_frequency * context.k1_plus_one / (term_frequency + norm))
+
+    def score_upper_bound(
+        self, context: ScoringContext, lexical_bound: float, matched_terms: int
+    ) -> float:
+        """Bound ``score_document`` for a document matching at most ``matched_terms``.
+
+        ``lexical_bound`` must bound the document's summed term contributions;
+        BM25 contributions grow with term frequency and shrink with length, so
+        ``term_score`` at a term's largest frequency and smallest length norm
+        bounds every posting of that term.
+        """
+
+        coverage = matched_terms / max(len(context.terms), 1)
+        bound = (lexical_bound + _MAX_PROXIMITY_BONUS + coverage) * (1.0 + _TITLE_BOOST_WEIGHT)
+        return bound * (1.0 + _BOUND_SLACK)
+
+    def score(
+        self,
+        *,
+        query_terms: Iterable[str],
+        document: DocumentView,
+        term_frequencies: dict[str, int],
+        average_document_length: float,
+        corpus_size: int,
+        document_frequency_lookup: Callable[[str], int],
+        document_length: Optional[int] = None,
+        term_positions: Optional[Mapping[str, Sequence[int]]] = None,
+    ) -> float:
+        """Return a hybrid lexical + custom rank score.
+
+        ``term_frequencies`` only needs entries for the query terms when
+        ``document_length`` is supplied; otherwise the length is the sum of
+        its counts. ``term_positions`` holds indexed content positions for the
+        query terms; without it the content is tokenized to find them.
+        """
+        terms = list(query_terms)
+        if document_length is None:
+            document_length = sum(term_frequencies.values())
+        idfs = {
+            term: bm25_idf(document_frequency_lookup(term), corpus_size)
+            for term in set(terms)
+            if term_frequencies.get(term, 0)
         }
-        positions = [pos for plist in term_positions.values() for pos in plist]
-        if len(positions) < 2:
+        return self.score_document(
+            self.context(terms, idfs),
+            document=document,
+            term_frequencies=term_frequencies,
+            length_norm=relative_length(document_length, average_document_length),
+            term_positions=term_positions,
+        )
+
+    def _proximity_bonus(
+        self,
+        document: DocumentView,
+        query_terms: Iterable[str],
+        term_positions: Optional[Mapping[str, Sequence[int]]] = None,
+    ) -> float:
+        terms = set(query_terms)
+        if term_positions is None:
+            tokens = tokenize(document.content)
+            term_positions = {
+                term: [idx for idx, token in enumerate(tokens) if token == term]
+                for term in terms
+            }
+        # Position lists are ascending, so only their ends bound the span.
+        count = 0
+        first = last = 0
+        for term in terms:
+            plist = term_positions.get(term)
+            if not plist:
+                continue
+            first = plist[0] if count == 0 else min(first, plist[0])
+            last = plist[-1] if count == 0 else max(last, plist[-1])
+            count += len(plist)
+        if count < 2:
             return 0.0
-        span = max(positions) - min(positions) + 1
+        span = last - first + 1
         return 1.0 / span
 
     def _title_match_ratio(self, title: str, query_terms: Iterable[str]) -> float:
@@ -86,4 +224,12 @@ class HybridRanker:
         return matches / len(title_terms)
 
 
-__all__ = ["HybridRanker", "RankedResult", "tokenize"]
+__all__ = [
+    "HybridRanker",
+    "RankedResult",
+    "RelativeLengths",
+    "ScoringContext",
+    "bm25_idf",
+    "relative_length",
+    "tokenize",
+]
@@ -0,0 +1,453 @@
+"""Segmented index: immutable compressed segments plus a mutable buffer.
+
+New documents go into a small ``InMemoryIndex`` buffer. A full buffer is
+frozen into a ``CompressedIndex`` segment, and a tiered merge policy later
+compacts runs of similarly sized segments, dropping deleted documents. Deletes
+never rewrite a segment; they only tombstone its ordinals.
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .compressed import CompressedIndex, build_compressed_index
+from .index import InMemoryIndex, analyze_document
+from .models import Document, DocumentView, Index
+from .ranker import RelativeLengths
+from .vocab import Vocabulary
+
+
+@dataclass(eq=False)
+class Segment:
+    """An immutable compressed index and the ordinals deleted since it was built."""
+
+    index: CompressedIndex
+    deleted: Set[int] = field(default_factory=set)
+
+    def live_count(self) -> int:
+        return self.index.document_count() - len(self.deleted)
+
+    def live_documents(self) -> List[Document]:
+        deleted = self.deleted
+        return [doc for ordinal, doc in enumerate(self.index.documents()) if ordinal not in deleted]
+
+
+@dataclass
+class _ShardView(Index):
+    """One segment or the buffer, seen under corpus-wide statistics.
+
+    Posting-level methods are local to the shard and skip its deleted
+    ordinals; ``document_count`` and ``average_document_length`` describe the
+    whole corpus, so scores match a single index over the same live documents.
+    """
+
+    _index: Index
+    _deleted: Set[int]
+    _raw_count: int
+    _document_count: int
+    _average_document_length: float
+
+    def documents(self) -> Iterable[Document]:
+        if not self._deleted:
+            return self._index.documents()
+        deleted = self._deleted
+        documents = enumerate(self._index.documents())
+        return (doc for ordinal, doc in documents if ordinal not in deleted)
+
+    def document_at(self, ordinal: int) -> DocumentView:
+        return self._index.document_at(ordinal)
+
+    def document_length(self, ordinal: int) -> int:
+        return self._index.document_length(ordinal)
+
+    def length_norms(self) -> Sequence[float]:
+        return RelativeLengths(
+            self._index.document_length, self._raw_count, self._average_document_length
+        )
+
+    def postings(self, term: str) -> Iterable[Tuple[int, int]]:
+        return self._live(self._index.postings(term))
+
+    def positions(self, ordinal: int, term: str) -> Sequence[int]:
+        return self._index.positions(ordinal, term)
+
+    def term_bound(self, term: str) -> Tuple[int, int]:
+        return self._index.term_bound(term)
+
+    def posting_blocks(self, term: str) -> Sequence[Tuple[int, int, int]]:
+        return self._index.posting_blocks(term)
+
+    def block_postings(self, term: str, block: int) -> Sequence[Tuple[int, int]]:
+        return list(self._live(self._index.block_postings(term, block)))
+
+    def term_frequencies(self, doc_id: str) -> Dict[str, int]:
+        return self._index.term_frequencies(doc_id)
+
+    def document_frequency(self, term: str) -> int:
+        # This counts the shard's own postings; scoring takes its IDFs from
+        # the corpus-wide figure.
+        return self._index.document_frequency(term)
+
+    def document_count(self) -> int:
+        return self._document_count
+
+    def average_document_length(self) -> float:
+        return self._average_document_length
+
+    def _live(self, postings: Iterable[Tuple[int, int]]) -> Iterable[Tuple[int, int]]:
+        if not self._deleted:
+            return postings
+        deleted = self._deleted
+        return (posting for posting in postings if posting[0] not in deleted)
+
+
+class SegmentedIndex(Index):
+    """Index made of immutable segments plus a small mutable buffer.
+
+    Writes only touch the buffer or a segment's tombstones, so they stay
+    cheap; once the buffer holds ``buffer_size`` documents it becomes a new
+    segment. Segments whose live size falls in the same tier (powers of
+    ``merge_factor`` times ``buffer_size``) are merged ``merge_factor`` at a
+    time, in a background thread when ``background`` is true and inline after
+    each flush otherwise. A failed background merge is raised, as a
+    ``RuntimeError``, by the next write or by ``close``.
+
+    Global ordinals number the segments' documents oldest first, followed by
+    the buffer's; they shift when segments are flushed or merged, so callers
+    resolving them must hold ``locked()`` for the whole search. The buffer and
+    every segment share one vocabulary.
+    """
+
+    def __init__(
+        self,
+        documents: Iterable[Document] = (),
+        *,
+        buffer_size: int = 1000,
+        merge_factor: int = 4,
+        background: bool = True,
+    ) -> None:
+        if buffer_size < 1:
+            raise ValueError("buffer_size must be at least 1")
+        if merge_factor < 2:
+            raise ValueError("merge_factor must be at least 2")
+        self._buffer_size = buffer_size
+        self._merge_factor = merge_factor
+        self._vocabulary = Vocabulary()
+        self._segments: List[Segment] = []
+        self._buffer = InMemoryIndex(_vocabulary=self._vocabulary)
+        self._locations: Dict[str, Optional[Segment]] = {}
+        self._document_frequencies: Dict[int, int] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+        self._merge_needed = threading.Condition(self._lock)
+        self._merge_mutex = threading.Lock()
+        self._closed = False
+        # A background merge failure, raised by the next write or ``close``.
+        self._merge_error: Optional[Exception] = None
+        self._merger: Optional[threading.Thread] = None
+        if background:
+            self._merger = threading.Thread(
+                target=self._merge_loop, name="notso-segment-merge", daemon=True
+            )
+            self._merger.start()
+        self.add_documents(documents)
+
+    def locked(self) -> threading.RLock:
+        """Return the lock that keeps global ordinals stable while held."""
+
+        return self._lock
+
+    def shards(self) -> List[Tuple[int, Index]]:
+        """Return ``(base ordinal, view)`` pairs for every segment and the buffer.
+
+        Each view numbers its documents locally from zero; adding the base
+        gives the global ordinal.
+        """
+
+        with self._lock:
+            count = len(self._locations)
+            average = self._total_length / max(count, 1)
+            shards: List[Tuple[int, Index]] = []
+            base = 0
+            for index, deleted, raw_count in self._parts():
+                shards.append((base, _ShardView(index, deleted, raw_count, count, average)))
+                base += raw_count
+            return shards
+
+    def segment_count(self) -> int:
+        """Return the number of immutable segments."""
+
+        with self._lock:
+            return len(self._segments)
+
+    # -- writes ---------------------------------------------------------------
+
+    def add_documents(self, documents: Iterable[Document]) -> int:
+        """Index new documents and return how many were added."""
+
+        added = 0
+        with self._lock:
+            self._raise_merge_error()
+            for doc in documents:
+                if doc.doc_id in self._locations:
+                    raise ValueError(f"Duplicate document id: {doc.doc_id}")
+                self._buffer.add_documents([doc])
+                self._locations[doc.doc_id] = None
+                self._count_terms(self._buffer.term_counts(doc.doc_id), 1)
+                added += 1
+                buffered = self._buffer.document_count() + self._buffer.deleted_count()
+                if buffered >= self._buffer_size:
+                    self.flush()
+        return added
+
+    def update_document(self, document: Document) -> None:
+        """Replace the document with the same id, or add it if it is new."""
+
+        with self._lock:
+            self.delete_document(document.doc_id)
+            self.add_documents([document])
+
+    def delete_document(self, doc_id: str) -> bool:
+        """Tombstone a document and return whether it was present."""
+
+        with self._lock:
+            self._raise_merge_error()
+            if doc_id not in self._locations:
+                return False
+            segment = self._locations.pop(doc_id)
+            if segment is None:
+                counts = self._buffer.term_counts(doc_id)
+                self._buffer.delete_document(doc_id)
+            else:
+                ordinal = segment.index.ordinal(doc_id)
+                _length, counts, _positions = analyze_document(
+                    segment.index.document_at(ordinal), self._vocabulary
+                )
+                segment.deleted.add(ordinal)
+            self._count_terms(counts, -1)
+            return True
+
+    def flush(self) -> bool:
+        """Freeze the buffer into a new segment; return whether one was written."""
+
+        with self._lock:
+            self._raise_merge_error()
+            documents = list(self._buffer.documents())
+            self._buffer = InMemoryIndex(_vocabulary=self._vocabulary)
+            if not documents:
+                return False
+            segment = Segment(build_compressed_index(documents, self._vocabulary))
+            self._segments.append(segment)
+            for doc in documents:
+                self._locations[doc.doc_id] = segment
+            if self._merger is not None and not self._closed:
+                self._merge_needed.notify()
+            else:
+                self.merge_pending()
+            return True
+
+    def merge_pending(self) -> int:
+        """Run merges until the policy finds none; return how many ran."""
+
+        merges = 0
+        while self._merge_once():
+            merges += 1
+        return merges
+
+    def close(self) -> None:
+        """Finish outstanding merges and stop the background merge thread.
+
+        Raises ``RuntimeError`` if a background merge failed and no write has
+        reported it yet.
+        """
+
+        with self._lock:
+            self._closed = True
+            self._merge_needed.notify_all()
+        if self._merger is not None:
+            self._merger.join()
+        with self._lock:
+            self._raise_merge_error()
+
+    # -- Index protocol over global ordinals --------------------------------------
+
+    def documents(self) -> Iterable[Document]:
+        with self._lock:
+            return list(chain.from_iterable(view.documents() for _base, view in self.shards()))
+
+    def document_at(self, ordinal: int) -> DocumentView:
+        with self._lock:
+            base, view = self._locate(ordinal)
+            return view.document_at(ordinal - base)
+
+    def document_length(self, ordinal: int) -> int:
+        with self._lock:
+            base, view = self._locate(ordinal)
+            return view.document_length(ordinal - base)
+
+    def length_norms(self) -> Sequence[float]:
+        with self._lock:
+            raw_count = sum(raw for _index, _deleted, raw in self._parts())
+            return RelativeLengths(self.document_length, raw_count, self.average_document_length())
+
+    def postings(self, term: str) -> Iterable[Tuple[int, int]]:
+        with self._lock:
+            return [
+                (base + ordinal, tf)
+                for base, view in self.shards()
+                for ordinal, tf in view.postings(term)
+            ]
+
+    def positions(self, ordinal: int, term: str) -> Sequence[int]:
+        with self._lock:
+            base, view = self._locate(ordinal)
+            return view.positions(ordinal - base, term)
+
+    def term_bound(self, term: str) -> Tuple[int, int]:
+        with self._lock:
+            bounds = [view.term_bound(term) for _base, view in self.shards()]
+            bounds = [bound for bound in bounds if bound[0]]
+            if not bounds:
+                return 0, 0
+            return max(tf for tf, _length in bounds), min(length for _tf, length in bounds)
+
+    def posting_blocks(self, term: str) -> Sequence[Tuple[int, int, int]]:
+        with self._lock:
+            return [
+                (base + last, max_tf, min_length)
+                for base, view in self.shards()
+                for last, max_tf, min_length in view.posting_blocks(term)
+            ]
+
+    def block_postings(self, term: str, block: int) -> Sequence[Tuple[int, int]]:
+        with self._lock:
+            for base, view in self.shards():
+                blocks = len(view.posting_blocks(term))
+                if block < blocks:
+                    postings = view.block_postings(term, block)
+                    return [(base + ordinal, tf) for ordinal, tf in postings]
+                block -= blocks
+            raise IndexError("posting block out of range")
+
+    def term_frequencies(self, doc_id: str) -> Dict[str, int]:
+        with self._lock:
+            if doc_id not in self._locations:
+                return {}
+            segment = self._locations[doc_id]
+            if segment is None:
+                return self._buffer.term_frequencies(doc_id)
+            return segment.index.term_frequencies(doc_id)
+
+    def document_frequency(self, term: str) -> int:
+        term_id = self._vocabulary.get(term)
+        return 0 if term_id is None else self._document_frequencies.get(term_id, 0)
+
+    def document_count(self) -> int:
+        return len(self._locations)
+
+    def average_document_length(self) -> float:
+        with self._lock:
+            return self._total_length / max(len(self._locations), 1)
+
+    # -- internals ------------------------------------------------------------
+
+    def _parts(self) -> Iterator[Tuple[Index, Set[int], int]]:
+        for segment in self._segments:
+            yield segment.index, segment.deleted, segment.index.document_count()
+        buffer = self._buffer
+        yield buffer, set(), buffer.document_count() + buffer.deleted_count()
+
+    def _locate(self, ordinal: int) -> Tuple[int, Index]:
+        shards = self.shards()
+        position = bisect_right([base for base, _view in shards], ordinal) - 1
+        if ordinal < 0 or position < 0:
+            raise IndexError("document ordinal out of range")
+        return shards[position]
+
+    def _count_terms(self, counts: Dict[int, int], sign: int) -> None:
+        frequencies = self._document_frequencies
+        for term_id in counts:
+            remaining = frequencies.get(term_id, 0) + sign
+            if remaining:
+                frequencies[term_id] = remaining
+            else:
+                del frequencies[term_id]
+        self._total_length += sign * sum(counts.values())
+
+    def _tier(self, segment: Segment) -> int:
+        tier = 0
+        size = self._buffer_size * self._merge_factor
+        while segment.live_count() >= size:
+            tier += 1
+            size *= self._merge_factor
+        return tier
+
+    def _merge_candidate(self) -> Optional[List[Segment]]:
+        # The first run of ``merge_factor`` adjacent segments in the same tier.
+        # Merging only adjacent segments keeps global ordinals in insertion order.
+        run: List[Segment] = []
+        for segment in self._segments:
+            if run and self._tier(run[-1]) != self._tier(segment):
+                run = []
+            run.append(segment)
+            if len(run) == self._merge_factor:
+                return run
+        return None
+
+    def _merge_once(self) -> bool:
+        with self._merge_mutex:
+            with self._lock:
+                run = self._merge_candidate()
+                if run is None:
+                    return False
+                snapshots = [set(segment.deleted) for segment in run]
+                documents = [doc for segment in run for doc in segment.live_documents()]
+
+            # Building the merged segment is the slow part and runs unlocked;
+            # searches and writes meanwhile keep using the old segments.
+            merged = (
+                Segment(build_compressed_index(documents, self._vocabulary)) if documents else None
+            )
+
+            with self._lock:
+                if merged is not None:
+                    # Re-apply deletes that landed on the old segments during the build.
+                    for segment, snapshot in zip(run, snapshots):
+                        for ordinal in segment.deleted - snapshot:
+                            doc_id = segment.index.document_at(ordinal).doc_id
+                            merged.deleted.add(merged.index.ordinal(doc_id))
+                    for ordinal, doc in enumerate(merged.index.documents()):
+                        if ordinal not in merged.deleted:
+                            self._locations[doc.doc_id] = merged
+                start = self._segments.index(run[0])
+                self._segments[start : start + len(run)] = [merged] if merged is not None else []
+            return True
+
+    def _raise_merge_error(self) -> None:
+        error, self._merge_error = self._merge_error, None
+        if error is not None:
+            raise RuntimeError("Background segment merge failed") from error
+
+    def _merge_loop(self) -> None:
+        # After a failure the loop waits until the error has been reported and
+        # a flush asks for a merge again, rather than retrying in a tight loop.
+        while True:
+            with self._lock:
+                while not self._closed and (
+                    self._merge_error is not None or self._merge_candidate() is None
+                ):
+                    self._merge_needed.wait()
+                if self._merge_error is not None or self._merge_candidate() is None:
+                    return
+            try:
+                self._merge_once()
+            except Exception as exc:
+                with self._lock:
+                    self._merge_error = exc
+
+
+__all__ = ["Segment", "SegmentedIndex"]
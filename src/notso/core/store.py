@@ -0,0 +1,206 @@
+"""Append-only document store that keeps document text out of line."""
+
+from __future__ import annotations
+
+import json
+from array import array
+from typing import Iterator, List, Optional, Protocol, Set
+
+from .models import Document
+
+
+class DocumentSource(Protocol):
+    """Read access to documents by ordinal."""
+
+    def __len__(self) -> int:
+        ...
+
+    def doc_id(self, ordinal: int) -> str:
+        ...
+
+    def title(self, ordinal: int) -> str:
+        ...
+
+    def content(self, ordinal: int) -> str:
+        ...
+
+    def metadata(self, ordinal: int) -> Optional[dict[str, str]]:
+        ...
+
+    def document(self, ordinal: int) -> Document:
+        ...
+
+    def view(self, ordinal: int) -> StoredDocument:
+        ...
+
+    def documents(self) -> Iterator[Document]:
+        ...
+
+    def close(self) -> None:
+        """Release any file the source reads from."""
+        ...
+
+
+class DocumentStore:
+    """Holds documents by ordinal with their text in one shared buffer.
+
+    Ids and titles stay as strings because ranking reads them for every
+    candidate. Content and metadata are appended UTF-8 encoded to a single
+    buffer: ``_offsets[2 * ordinal]`` is where a document's content starts,
+    ``_offsets[2 * ordinal + 1]`` where its JSON metadata starts, and the
+    next entry where it ends. They are decoded only when asked for.
+
+    A ``base`` source, such as an on-disk store, supplies the first
+    ``len(base)`` ordinals; documents appended afterwards are held here.
+    """
+
+    __slots__ = ("_base", "_base_count", "_doc_ids", "_titles", "_data", "_offsets")
+
+    def __init__(self, base: Optional[DocumentSource] = None) -> None:
+        self._base = base
+        self._base_count = len(base) if base is not None else 0
+        self._doc_ids: List[str] = []
+        self._titles: List[str] = []
+        self._data = bytearray()
+        self._offsets = array("Q", [0])
+
+    def __len__(self) -> int:
+        return self._base_count + len(self._doc_ids)
+
+    def append(self, document: Document) -> int:
+        """Store ``document`` and return its ordinal."""
+
+        ordinal = len(self)
+        self._doc_ids.append(document.doc_id)
+        self._titles.append(document.title)
+        self._data += document.content.encode("utf-8")
+        self._offsets.append(len(self._data))
+        if document.metadata is not None:
+            self._data += json.dumps(document.metadata, separators=(",", ":")).encode("utf-8")
+        self._offsets.append(len(self._data))
+        return ordinal
+
+    def doc_id(self, ordinal: int) -> str:
+        if ordinal < self._base_count:
+            return self._base.doc_id(ordinal)
+        return self._doc_ids[ordinal - self._base_count]
+
+    def title(self, ordinal: int) -> str:
+        if ordinal < self._base_count:
+            return self._base.title(ordinal)
+        return self._titles[ordinal - self._base_count]
+
+    def content(self, ordinal: int) -> str:
+        if ordinal < self._base_count:
+            return self._base.content(ordinal)
+        local = 2 * (ordinal - self._base_count)
+        start, end = self._offsets[local], self._offsets[local + 1]
+        return self._data[start:end].decode("utf-8")
+
+    def metadata(self, ordinal: int) -> Optional[dict[str, str]]:
+        if ordinal < self._base_count:
+            return self._base.metadata(ordinal)
+        local = 2 * (ordinal - self._base_count)
+        start, end = self._offsets[local + 1], self._offsets[local + 2]
+        if start == end:
+            return None
+        return json.loads(self._data[start:end])
+
+    def view(self, ordinal: int) -> StoredDocument:
+        """Return a lazy view of one document."""
+
+        if not 0 <= ordinal < len(self):
+            raise IndexError("document ordinal out of range")
+        return StoredDocument(self, ordinal)
+
+    def document(self, ordinal: int) -> Document:
+        """Decode one document in full."""
+
+        if ordinal < self._base_count:
+            return self._base.document(ordinal)
+        return Document(
+            doc_id=self.doc_id(ordinal),
+            title=self.title(ordinal),
+            content=self.content(ordinal),
+            metadata=self.metadata(ordinal),
+        )
+
+    def documents(self) -> Iterator[Document]:
+        """Decode every stored document in ordinal order."""
+
+        return (self.document(ordinal) for ordinal in range(len(self)))
+
+    def without(self, ordinals: Set[int]) -> DocumentStore:
+        """Return a copy without the appended documents at ``ordinals``.
+
+        The copy shares the ``base`` source, whose documents keep their
+        ordinals; the remaining appended documents are renumbered in order
+        after them. This store is left as it is for views already handed out.
+        """
+
+        store = DocumentStore(self._base)
+        offsets = self._offsets
+        for local, doc_id in enumerate(self._doc_ids):
+            if self._base_count + local in ordinals:
+                continue
+            start, middle, end = offsets[2 * local], offsets[2 * local + 1], offsets[2 * local + 2]
+            shift = len(store._data) - start
+            store._doc_ids.append(doc_id)
+            store._titles.append(self._titles[local])
+            store._data += self._data[start:end]
+            store._offsets.append(middle + shift)
+            store._offsets.append(end + shift)
+        return store
+
+    def base_count(self) -> int:
+        """Return how many ordinals the ``base`` source supplies."""
+
+        return self._base_count
+
+    def close(self) -> None:
+        """Close the ``base`` source, if any."""
+
+        if self._base is not None:
+            self._base.close()
+
+    def nbytes(self) -> int:
+        """Return the bytes used by the in-memory text buffer and its offsets."""
+
+        return len(self._data) + self._offsets.itemsize * len(self._offsets)
+
+
+class StoredDocument:
+    """A document in a ``DocumentStore``, read field by field on access."""
+
+    __slots__ = ("_store", "ordinal")
+
+    def __init__(self, store: DocumentSource, ordinal: int) -> None:
+        self._store = store
+        self.ordinal = ordinal
+
+    @property
+    def doc_id(self) -> str:
+        return self._store.doc_id(self.ordinal)
+
+    @property
+    def title(self) -> str:
+        return self._store.title(self.ordinal)
+
+    @property
+    def content(self) -> str:
+        return self._store.content(self.ordinal)
+
+    @property
+    def metadata(self) -> Optional[dict[str, str]]:
+        return self._store.metadata(self.ordinal)
+
+    def materialize(self) -> Document:
+        """Decode the full document."""
+
+        return self._store.document(self.ordinal)
+
+    def __repr__(self) -> str:
+        return f"StoredDocument(ordinal={self.ordinal}, doc_id={self.doc_id!r})"
+
+
+__all__ = ["DocumentSource", "DocumentStore", "StoredDocument"]
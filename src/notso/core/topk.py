@@ -0,0 +1,51 @@
+"""Bounded top-k selection over scored document ordinals."""
+
+from __future__ import annotations
+
+import heapq
+from typing import List, Tuple
+
+
+class TopKCollector:
+    """Keeps the ``k`` best ``(ordinal, score)`` pairs offered so far.
+
+    Higher scores win; equal scores prefer the smaller ordinal, which matches
+    a stable descending sort over candidates visited in corpus order.
+    """
+
+    def __init__(self, k: int) -> None:
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        self._k = k
+        self._heap: List[Tuple[float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def is_full(self) -> bool:
+        return len(self._heap) >= self._k
+
+    def threshold(self) -> float:
+        """Return the score a new candidate must beat once the collector is full."""
+
+        return self._heap[0][0] if self.is_full() else float("-inf")
+
+    def offer(self, ordinal: int, score: float) -> bool:
+        """Consider a candidate and return whether it was kept."""
+
+        entry = (score, -ordinal)
+        if len(self._heap) < self._k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def results(self) -> List[Tuple[int, float]]:
+        """Return the kept ``(ordinal, score)`` pairs, best first."""
+
+        return [(-neg_ordinal, score) for score, neg_ordinal in sorted(self._heap, reverse=True)]
+
+
+__all__ = ["TopKCollector"]
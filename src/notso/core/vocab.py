@@ -0,0 +1,116 @@
+"""Interned vocabulary mapping terms to dense integer ids."""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from .ranker import tokenize
+
+
+class Vocabulary:
+    """Interns terms as dense integer ids.
+
+    Ids are assigned in first-seen order and never change, so structures
+    indexed by id stay valid as the vocabulary grows. Each distinct term is
+    stored once, however many documents contain it.
+    """
+
+    __slots__ = ("_ids", "_terms")
+
+    def __init__(self, terms: Iterable[str] = ()) -> None:
+        self._ids: Dict[str, int] = {}
+        self._terms: List[str] = []
+        for term in terms:
+            self.intern(term)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def __contains__(self, term: object) -> bool:
+        return term in self._ids
+
+    def intern(self, term: str) -> int:
+        """Return the id of ``term``, assigning the next id if it is new."""
+
+        term_id = self._ids.get(term)
+        if term_id is None:
+            term_id = len(self._terms)
+            self._terms.append(term)
+            self._ids[term] = term_id
+        return term_id
+
+    def get(self, term: str) -> Optional[int]:
+        """Return the id of ``term``, or ``None`` if it was never interned."""
+
+        return self._ids.get(term)
+
+    def term(self, term_id: int) -> str:
+        return self._terms[term_id]
+
+    def terms(self) -> Sequence[str]:
+        """Return every term, indexed by id."""
+
+        return self._terms
+
+    def encode(self, text: str) -> List[int]:
+        """Tokenize ``text`` and return the interned id of each token."""
+
+        intern = self.intern
+        return [intern(token) for token in tokenize(text)]
+
+    def sorted_ids(self, term_ids: Iterable[int]) -> List[int]:
+        """Return ``term_ids`` ordered by their terms."""
+
+        terms = self._terms
+        return sorted(term_ids, key=terms.__getitem__)
+
+
+class SortedTermTable:
+    """Read-only vocabulary over a sorted, UTF-8 encoded term table.
+
+    A term's id is its position in the table: term ``i`` is
+    ``data[offsets[i]:offsets[i + 1]]``. Lookups binary-search the encoded
+    bytes, whose order matches string order, so the table can be used in
+    place from a mapped file without building a dict.
+    """
+
+    __slots__ = ("_offsets", "_data")
+
+    def __init__(self, offsets: Sequence[int], data: Sequence[int]) -> None:
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, term_id: int) -> bytes:
+        return bytes(self._data[self._offsets[term_id] : self._offsets[term_id + 1]])
+
+    def __contains__(self, term: object) -> bool:
+        return isinstance(term, str) and self.get(term) is not None
+
+    def get(self, term: str) -> Optional[int]:
+        """Return the id of ``term``, or ``None`` if it is not in the table."""
+
+        key = term.encode("utf-8")
+        term_id = bisect_left(self, key)
+        if term_id < len(self) and self[term_id] == key:
+            return term_id
+        return None
+
+    def term(self, term_id: int) -> str:
+        return self[term_id].decode("utf-8")
+
+    def terms(self) -> Sequence[str]:
+        """Return every term, indexed by id."""
+
+        return [self.term(term_id) for term_id in range(len(self))]
+
+    def sorted_ids(self, term_ids: Iterable[int]) -> List[int]:
+        """Return ``term_ids`` ordered by their terms."""
+
+        return sorted(term_ids)
+
+
+__all__ = ["SortedTermTable", "Vocabulary"]
@@ -0,0 +1,236 @@
+"""Query daemon that keeps an index loaded between searches.
+
+``notso serve-cli`` loads an index once and answers searches over a Unix
+socket, so a script running thousands of queries pays for starting Python
+and loading the index once rather than per query. ``notso search --daemon``
+and ``DaemonClient`` forward searches to it.
+
+The protocol is JSON Lines: each request is one object on its own line,
+with a ``query`` and optional ``top_k``, ``strategy`` and ``limits`` (the
+fields of ``ResourceLimits``). Each response is one line, either
+``{"results": [...], "stop_reason": ...}`` or ``{"error": "..."}``. A
+connection may carry any number of requests. Searches run one at a time,
+since they are CPU-bound and several indexes are not safe to search from
+several threads at once.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Mapping, Optional, Tuple
+
+from .core.models import Document, Index
+from .engine import SEARCH_STRATEGIES, SearchResult, search_with_limits
+from .resource_plan import ResourceLimits, StopReason
+
+DEFAULT_SOCKET_PATH = Path("data/notso.sock")
+
+_LIMIT_FIELDS = (
+    "max_seconds",
+    "max_memory_bytes",
+    "max_documents",
+    "max_query_terms",
+    "term_block_size",
+)
+
+
+class QueryService:
+    """A loaded index that answers searches one at a time."""
+
+    def __init__(self, index: Index) -> None:
+        self.index = index
+        self._lock = threading.Lock()
+
+    def search(
+        self,
+        query: str,
+        *,
+        top_k: int = 5,
+        limits: Optional[ResourceLimits] = None,
+        strategy: str = "exhaustive",
+    ) -> Tuple[List[SearchResult], Optional[StopReason]]:
+        with self._lock:
+            return search_with_limits(
+                self.index, query, top_k=top_k, limits=limits, strategy=strategy
+            )
+
+    def handle(self, request: Any) -> Dict[str, Any]:
+        """Answer one decoded protocol request with a response object."""
+
+        try:
+            if not isinstance(request, dict) or not isinstance(request.get("query"), str):
+                raise ValueError("Request must be an object with a string query")
+            top_k = request.get("top_k", 5)
+            strategy = request.get("strategy", "exhaustive")
+            if not isinstance(top_k, int) or top_k < 1:
+                raise ValueError("top_k must be a positive integer")
+            if strategy not in SEARCH_STRATEGIES:
+                raise ValueError(f"Unknown search strategy: {strategy}")
+            raw_limits = request.get("limits")
+            if raw_limits is None:
+                raw_limits = {}
+            elif not isinstance(raw_limits, dict):
+                raise ValueError("limits must be an object")
+            unknown = set(raw_limits) - set(_LIMIT_FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown limits: {', '.join(sorted(unknown))}")
+            results, stop_reason = self.search(
+                request["query"],
+                top_k=top_k,
+                limits=ResourceLimits(**raw_limits),
+                strategy=strategy,
+            )
+        except (TypeError, ValueError) as exc:
+            # A limit of the wrong type fails with ``TypeError`` mid-search.
+            return {"error": str(exc)}
+        return {
+            "results": [
+                {
+                    "doc_id": result.doc_id,
+                    "score": result.score,
+                    "title": result.title,
+                    "text": result.text,
+                    "metadata": result.metadata,
+                }
+                for result in results
+            ],
+            "stop_reason": None
+            if stop_reason is None
+            else {"reason": stop_reason.reason, "detail": stop_reason.detail},
+        }
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: QueryServer
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as exc:
+                response: Dict[str, Any] = {"error": f"Invalid request: {exc}"}
+            else:
+                response = self.server.service.handle(request)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class QueryServer(socketserver.ThreadingUnixStreamServer):
+    """Serves a ``QueryService`` on a Unix socket; one thread per connection.
+
+    A socket file left behind by a daemon that died is replaced; one that
+    still accepts connections raises ``OSError``. The socket file is removed
+    by ``server_close``.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str | Path, service: QueryService) -> None:
+        self.socket_path = Path(socket_path)
+        self.service = service
+        _remove_stale_socket(self.socket_path)
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(str(self.socket_path), _RequestHandler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_socket(path: Path) -> None:
+    try:
+        mode = path.stat().st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(f"{path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(str(path))
+    except ConnectionRefusedError:
+        os.unlink(path)
+    else:
+        raise OSError(f"A notso daemon is already listening on {path}")
+    finally:
+        probe.close()
+
+
+class DaemonClient:
+    """A connection to a running daemon; keep it open across many searches."""
+
+    def __init__(self, socket_path: str | Path = DEFAULT_SOCKET_PATH) -> None:
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._socket.connect(str(socket_path))
+        except OSError:
+            self._socket.close()
+            raise
+        self._stream: BinaryIO = self._socket.makefile("rwb")
+
+    def search(
+        self,
+        query: str,
+        *,
+        top_k: int = 5,
+        limits: Optional[ResourceLimits] = None,
+        strategy: str = "exhaustive",
+    ) -> Tuple[List[SearchResult], Optional[StopReason]]:
+        """Search through the daemon, as ``search_with_limits`` would locally.
+
+        Errors the daemon reports are raised as ``ValueError``.
+        """
+
+        request: Dict[str, Any] = {"query": query, "top_k": top_k, "strategy": strategy}
+        if limits is not None:
+            request["limits"] = {
+                name: getattr(limits, name)
+                for name in _LIMIT_FIELDS
+                if getattr(limits, name) is not None
+            }
+        response = self.request(request)
+        if "error" in response:
+            raise ValueError(response["error"])
+        results = [
+            SearchResult(
+                item["doc_id"],
+                item["score"],
+                Document(item["doc_id"], item["title"], item["text"], item["metadata"]),
+            )
+            for item in response["results"]
+        ]
+        stop_reason = response["stop_reason"]
+        return results, None if stop_reason is None else StopReason(**stop_reason)
+
+    def request(self, request: Mapping[str, Any]) -> Dict[str, Any]:
+        """Send one raw protocol request and return the decoded response."""
+
+        self._stream.write(json.dumps(request).encode("utf-8") + b"\n")
+        self._stream.flush()
+        line = self._stream.readline()
+        if not line:
+            raise ConnectionError("The notso daemon closed the connection")
+        return json.loads(line)
+
+    def close(self) -> None:
+        self._stream.close()
+        self._socket.close()
+
+    def __enter__(self) -> DaemonClient:
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.close()
+
+
+__all__ = ["DEFAULT_SOCKET_PATH", "DaemonClient", "QueryServer", "QueryService"]
@@ -1,147 +1,343 @@
 """Core search engine plumbing."""
 from __future__ import annotations
 
-from dataclasses import dataclass
-import json
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from .core.index import InMemoryIndex, build_in_memory_index
-from .core.models import Document
-from .core.ranker import HybridRanker, tokenize
+from .core.models import Document, DocumentView, Index
+from .core.pruning import EvaluationStats, block_max_wand_top_k, max_score_top_k
+from .core.ranker import HybridRanker, ScoringContext, bm25_idf, tokenize
+from .core.segments import SegmentedIndex
+from .core.topk import TopKCollector
 from .resource_plan import ResourceGuard, ResourceLimits, StopReason, plan_query_terms
+from .storage.binary import (
+    is_binary_index,
+    open_binary_index,
+    verify_binary_index,
+    write_binary_index,
+)
+from .storage.checksums import VerifyResult
+from .storage.docstore import document_store_path, verify_document_store
+from .storage.json_index import read_json_index, verify_json_index, write_json_index
+from .storage.sqlite_index import (
+    SqliteIndex,
+    is_sqlite_index,
+    verify_sqlite_index,
+    write_sqlite_index,
+)
 
 
-@dataclass(frozen=True)
 class SearchResult:
-    """Search result containing document metadata and a score."""
+    """Search result containing document metadata and a score.
 
-    doc_id: str
-    score: float
-    text: str
+    The result holds a view of the matching document rather than a copy of
+    it; ``text`` is read from the index's document store when displayed.
+    """
 
+    __slots__ = ("doc_id", "score", "_document")
 
-def build_index(documents: List[Document]) -> InMemoryIndex:
-    """Build a search index from documents."""
-    return build_in_memory_index(documents)
+    def __init__(self, doc_id: str, score: float, document: DocumentView) -> None:
+        self.doc_id = doc_id
+        self.score = score
+        self._document = document
+
+    @property
+    def text(self) -> str:
+        return self._document.content
+
+    @property
+    def title(self) -> str:
+        return self._document.title
+
+    @property
+    def metadata(self) -> Optional[dict[str, str]]:
+        return self._document.metadata
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SearchResult):
+            return NotImplemented
+        return (self.doc_id, self.score, self.text) == (other.doc_id, other.score, other.text)
+
+    def __hash__(self) -> int:
+        return hash((self.doc_id, self.score))
+
+    def __repr__(self) -> str:
+        return f"SearchResult(doc_id={self.doc_id!r}, score={self.score!r})"
+
+
+def build_index(documents: Iterable[Document], *, workers: int = 1) -> InMemoryIndex:
+    """Build a search index from documents.
+
+    ``documents`` is consumed once, so a generator such as
+    ``notso.ingest.loader.iter_documents`` is indexed as it is read. With
+    ``workers`` above one, tokenizing runs in that many processes and the
+    index is identical to a serial build.
+    """
+    return build_in_memory_index(documents, workers=workers)
+
+
+def build_index_file(
+    documents: Iterable[Document],
+    path: str | Path,
+    *,
+    limits: Optional[ResourceLimits] = None,
+    workers: int = 1,
+) -> int:
+    """Build a binary index file without holding the corpus's postings in memory.
+
+    Postings are spilled to sorted runs once they reach
+    ``limits.max_memory_bytes`` (256 MiB by default) and merged into the
+    file, which ``load_index`` then maps. ``workers`` processes tokenize the
+    documents; the file is byte-identical for any number of them. Returns
+    the number of documents.
+    """
+    # Imported here: its run files need ``tempfile``, which searches never use.
+    from .storage.external import DEFAULT_MEMORY_BUDGET, build_binary_index_external
+
+    budget = limits.max_memory_bytes if limits is not None else None
+    return build_binary_index_external(
+        path,
+        documents,
+        memory_budget=budget if budget is not None else DEFAULT_MEMORY_BUDGET,
+        workers=workers,
+    )
+
+
+SEARCH_STRATEGIES = ("exhaustive", "maxscore", "blockmax")
 
 
 def search_with_limits(
-    index: InMemoryIndex,
+    index: Index,
     query: str,
     top_k: int = 5,
     limits: Optional[ResourceLimits] = None,
+    *,
+    strategy: str = "exhaustive",
+    stats: Optional[EvaluationStats] = None,
 ) -> Tuple[List[SearchResult], Optional[StopReason]]:
-    """Search the index with optional resource limits."""
+    """Search the index with optional resource limits.
+
+    ``strategy`` selects how candidates are evaluated: ``"exhaustive"`` scores
+    every document in the query terms' postings, while ``"maxscore"`` walks
+    them document-at-a-time and skips documents whose score upper bound cannot
+    enter the top-k. ``"blockmax"`` (Block-Max WAND) also skips whole posting
+    blocks using per-block score maxima. All strategies return the same
+    results. When ``stats`` is given the numbers of documents scored and
+    skipped are added to it.
+
+    A ``SegmentedIndex`` is searched segment by segment under corpus-wide
+    statistics, and the per-segment top-k lists are merged. A ``SqliteIndex``
+    is searched within one database snapshot.
+    """
 
+    if strategy not in SEARCH_STRATEGIES:
+        raise ValueError(f"Unknown search strategy: {strategy}")
+    if isinstance(index, SegmentedIndex):
+        with index.locked():
+            return _search_shards(index, index.shards(), query, top_k, limits, strategy, stats)
+    if isinstance(index, SqliteIndex):
+        with index.snapshot():
+            return _search_shards(index, [(0, index)], query, top_k, limits, strategy, stats)
+    return _search_shards(index, [(0, index)], query, top_k, limits, strategy, stats)
+
+
+def _search_shards(
+    index: Index,
+    shards: Sequence[Tuple[int, Index]],
+    query: str,
+    top_k: int,
+    limits: Optional[ResourceLimits],
+    strategy: str,
+    stats: Optional[EvaluationStats],
+) -> Tuple[List[SearchResult], Optional[StopReason]]:
     tokens = tokenize(query)
     if not tokens:
         return [], None
 
-    # Calculate IDF for query planning
-    idf_map = {}
+    # The BM25 IDFs drive query planning and are reused by the scoring context.
+    idf_map: Dict[str, float] = {}
     doc_count = index.document_count()
     if doc_count > 0:
         for term in set(tokens):
             df = index.document_frequency(term)
-            # Standard IDF formula: log(N / df)
-            # Using specific formula from ranker if needed, but a simple one here for planning
-            if df > 0:
-                import math
-                idf_map[term] = math.log((doc_count - df + 0.5) / (df + 0.5) + 1.0)
-            else:
-                idf_map[term] = 0.0
+            idf_map[term] = bm25_idf(df, doc_count) if df > 0 else 0.0
 
     ordered_terms = plan_query_terms(tokens, idf_map, limits)
     if not ordered_terms:
-         return [], None
+        return [], None
 
     guard = ResourceGuard(limits or ResourceLimits())
     guard.start()
 
     ranker = HybridRanker()
-    # Pre-calculate corpus stats
-    avg_len = index.average_document_length()
-    
-    # We only need to score documents that contain at least one query term
-    # Optimization: simple OR query retrieval
-    candidate_doc_ids = set()
-    for term in ordered_terms:
-        # This is where we would ideally have an inverted index that gives us doc_ids easily
-        # The InMemoryIndex has _term_frequencies: doc_id -> {term: count}
-        # But not inverted index: term -> [doc_ids]
-        # For this refactor, we iterate all docs (efficient enough for small scale)
-        # OR we could rely on the fact the original engine iterated all docs.
-        pass
-
-    results: List[SearchResult] = []
+    context = ranker.context(ordered_terms, idf_map)
+    collector = TopKCollector(max(1, top_k))
+    stats = stats if stats is not None else EvaluationStats()
+    evaluate = _EVALUATORS[strategy]
     stop_reason: Optional[StopReason] = None
     docs_processed = 0
-    
-    # Optimization: In a real system we'd use an inverted index. 
-    # For now, we iterate all docs to maintain behavior of original engine but use new ranker.
-    
-    for doc in index.documents():
-        stop_reason = guard.checkpoint(docs_processed=docs_processed, terms_processed=0)
+
+    try:
+        for base, shard in shards:
+            shard_collector = TopKCollector(max(1, top_k))
+            scored_before = stats.docs_scored
+            stop_reason = evaluate(
+                shard,
+                ranker,
+                context,
+                shard_collector,
+                checkpoint=lambda docs_scored: guard.checkpoint(
+                    docs_processed=docs_processed + docs_scored, terms_processed=0
+                ),
+                stats=stats,
+            )
+            docs_processed += stats.docs_scored - scored_before
+            for ordinal, score in shard_collector.results():
+                collector.offer(base + ordinal, score)
+            if stop_reason:
+                break
+    finally:
+        guard.stop()
+
+    return _materialize_results(index, collector), stop_reason
+
+
+def _exhaustive_top_k(
+    index: Index,
+    ranker: HybridRanker,
+    context: ScoringContext,
+    collector: TopKCollector,
+    *,
+    checkpoint: Callable[[int], Optional[StopReason]],
+    stats: EvaluationStats,
+) -> Optional[StopReason]:
+    length_norms = index.length_norms()
+
+    # Only documents that contain at least one query term can score above zero,
+    # so the candidates are the union of the query terms' postings, visited in
+    # corpus order to keep tie-breaking deterministic. The postings also carry
+    # each candidate's query-term frequencies, so no forward lists are needed.
+    candidates: Dict[int, Dict[str, int]] = {}
+    for term in context.terms:
+        for ordinal, tf in index.postings(term):
+            candidates.setdefault(ordinal, {})[term] = tf
+
+    docs_processed = 0
+    for ordinal in sorted(candidates):
+        stop_reason = checkpoint(docs_processed)
         if stop_reason:
-            break
+            return stop_reason
         docs_processed += 1
-        
-        tf = index.term_frequencies(doc.doc_id)
-        
-        # Check if doc has any of the query terms to avoid scoring irrelevant docs
-        if not any(t in tf for t in ordered_terms):
-             continue
-
-        score = ranker.score(
-            query_terms=ordered_terms,
+        stats.docs_scored += 1
+
+        doc = index.document_at(ordinal)
+        term_frequencies = candidates[ordinal]
+
+        score = ranker.score_document(
+            context,
             document=doc,
-            term_frequencies=tf,
-            average_document_length=avg_len,
-            corpus_size=doc_count,
-            document_frequency_lookup=index.document_frequency
+            term_frequencies=term_frequencies,
+            length_norm=length_norms[ordinal],
+            term_positions={term: index.positions(ordinal, term) for term in term_frequencies},
         )
 
         if score > 0:
-            results.append(SearchResult(doc_id=doc.doc_id, score=score, text=doc.content))
+            collector.offer(ordinal, score)
+
+    return None
 
-    results.sort(key=lambda item: item.score, reverse=True)
-    return results[: max(1, top_k)], stop_reason
 
+_EVALUATORS = {
+    "exhaustive": _exhaustive_top_k,
+    "maxscore": max_score_top_k,
+    "blockmax": block_max_wand_top_k,
+}
 
-def search(index: InMemoryIndex, query: str, top_k: int = 5) -> List[SearchResult]:
+
+def _materialize_results(index: Index, collector: TopKCollector) -> List[SearchResult]:
+    results: List[SearchResult] = []
+    for ordinal, score in collector.results():
+        doc = index.document_at(ordinal)
+        results.append(SearchResult(doc_id=doc.doc_id, score=score, document=doc))
+    return results
+
+
+def search(
+    index: Index, query: str, top_k: int = 5, *, strategy: str = "exhaustive"
+) -> List[SearchResult]:
     """Search the index for a query and return ranked results."""
-    results, _ = search_with_limits(index, query, top_k=top_k)
+    results, _ = search_with_limits(index, query, top_k=top_k, strategy=strategy)
     return results
 
 
-def save_index(index: InMemoryIndex, path: str | Path) -> None:
-    """Save the index to disk as JSON."""
-    path = Path(path)
-    # Reconstruct the payload format expected by InMemoryIndex or create a new one.
-    # The original engine saved a specific format. We should try to respect a unified format.
-    # Let's save enough to reconstruct the InMemoryIndex.
-    
-    payload = {
-        "version": 2, # Bump version to signal change
-        "documents": [{"id": doc.doc_id, "title": doc.title, "content": doc.content, "metadata": doc.metadata} for doc in index.documents()],
-        # We can re-compute stats on load, so we just save documents for simplicity in this version,
-        # OR we save the pre-computed stats if we want fast load.
-        # Let's stick to saving documents for now as the 'source of truth' for the index.
-    }
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(payload, indent=2, sort_keys=True), encoding="utf-8")
-
-
-def load_index(path: str | Path) -> InMemoryIndex:
-    """Load the index from disk."""
+INDEX_FORMATS = ("binary", "json", "sqlite")
+
+# Path suffixes that select a format when ``save_index`` is not told one.
+_FORMAT_SUFFIXES = {".json": "json", ".db": "sqlite", ".sqlite": "sqlite", ".sqlite3": "sqlite"}
+
+
+def index_format_for(path: str | Path) -> str:
+    """Return the format ``save_index`` picks for ``path`` from its suffix."""
+    return _FORMAT_SUFFIXES.get(Path(path).suffix, "binary")
+
+
+def save_index(index: Index, path: str | Path, *, index_format: Optional[str] = None) -> None:
+    """Save the index to disk.
+
+    ``index_format`` is ``"binary"``, ``"json"`` or ``"sqlite"``; by default a
+    ``.json`` path gets JSON, a ``.db``, ``.sqlite`` or ``.sqlite3`` path
+    SQLite and anything else the binary format. The binary and JSON formats
+    put documents in a document store file next to ``path`` (see
+    ``document_store_path``); SQLite keeps them in the database.
+    """
     path = Path(path)
-    payload = json.loads(path.read_text(encoding="utf-8"))
-    
-    # Handle legacy version 1 (from original engine.py)
-    if payload.get("version") == 1:
-        documents = [Document(doc_id=item["id"], title="", content=item["text"], metadata={}) for item in payload["documents"]]
+    if index_format is None:
+        index_format = index_format_for(path)
+    if index_format not in INDEX_FORMATS:
+        raise ValueError(f"Unknown index format: {index_format}")
+    if index_format == "binary":
+        write_binary_index(path, index)
+    elif index_format == "sqlite":
+        write_sqlite_index(path, index)
     else:
-        documents = [Document(doc_id=item["id"], title=item.get("title", ""), content=item["content"], metadata=item.get("metadata")) for item in payload["documents"]]
-        
-    return build_in_memory_index(documents)
+        write_json_index(path, index)
+
+
+def load_index(path: str | Path) -> Index:
+    """Load an index saved by ``save_index``.
+
+    No format re-tokenizes documents: binary indexes are memory-mapped and
+    searched in place, JSON indexes carry their corpus statistics, and SQLite
+    databases are opened as a ``SqliteIndex`` that queries them directly.
+    Document text stays on disk and is read only for the results that are
+    displayed. Close the index (or use it as a context manager) to release
+    its files; results must be read before then.
+    """
+    path = Path(path)
+    if is_binary_index(path):
+        return open_binary_index(path)
+    if is_sqlite_index(path):
+        return SqliteIndex(path)
+    return read_json_index(path)
+
+
+def verify_index(path: str | Path) -> List[VerifyResult]:
+    """Check an index file and its document store against their checksums.
+
+    Both files are streamed block by block without loading the index, and
+    each result reports the first bad block of its file. A JSON index is
+    checked against the checksum table saved next to it and fails without
+    one; SQLite databases get SQLite's own page-level ``quick_check``.
+    """
+    path = Path(path)
+    if is_sqlite_index(path):
+        return [verify_sqlite_index(path)]
+    binary = is_binary_index(path)
+    results = [verify_binary_index(path) if binary else verify_json_index(path)]
+    store_path = document_store_path(path)
+    if store_path.exists():
+        results.append(verify_document_store(store_path))
+    elif binary:
+        results.append(VerifyResult(store_path, 0, 0, "document store is missing"))
+    return results
@@ -0,0 +1,176 @@
+"""Filesystem crawler that turns text and HTML files into documents.
+
+``crawl_documents`` walks a directory tree in sorted order, reads matching
+files in a thread pool and yields one ``Document`` per non-empty file, in
+walk order, so the same tree always indexes the same way. At most
+``queue_size`` files are read ahead of the consumer, which keeps memory flat
+however many files there are.
+
+HTML is reduced to text with ``html.parser``: the ``<title>`` becomes the
+document title and ``<script>``, ``<style>``, ``<template>`` and
+``<noscript>`` contents are dropped. There is no CSS or layout handling, so
+hidden elements are indexed, and malformed markup is read as leniently as
+``html.parser`` reads it. Files that are not valid UTF-8 are decoded with
+replacement characters.
+"""
+from __future__ import annotations
+
+import fnmatch
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Deque, Iterator, List, Optional, Sequence, Tuple
+
+from ..core.models import Document
+from .loader import _normalize_text
+
+DEFAULT_PATTERNS = ("*.txt", "*.html", "*.htm")
+HTML_SUFFIXES = (".html", ".htm")
+DEFAULT_THREADS = 8
+DEFAULT_QUEUE_SIZE = 256
+
+# Elements whose text is never shown as page content.
+_SKIPPED_TAGS = frozenset({"script", "style", "template", "noscript"})
+# Elements that separate words even when the markup has no whitespace.
+_BREAK_TAGS = frozenset(
+    {"br", "p", "div", "li", "tr", "td", "th", "h1", "h2", "h3", "h4", "h5", "h6", "section"}
+)
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.title: List[str] = []
+        self.text: List[str] = []
+        self._skipping = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag in _SKIPPED_TAGS:
+            self._skipping += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag in _BREAK_TAGS:
+            self.text.append(" ")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in _SKIPPED_TAGS:
+            self._skipping = max(self._skipping - 1, 0)
+        elif tag == "title":
+            self._in_title = False
+        elif tag in _BREAK_TAGS:
+            self.text.append(" ")
+
+    def handle_data(self, data: str) -> None:
+        if self._skipping:
+            return
+        (self.title if self._in_title else self.text).append(data)
+
+
+def extract_html_text(html: str) -> Tuple[str, str]:
+    """Return the normalized ``(title, text)`` of an HTML page."""
+
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return _normalize_text("".join(extractor.title)), _normalize_text("".join(extractor.text))
+
+
+def iter_paths(root: str | Path, patterns: Sequence[str] = DEFAULT_PATTERNS) -> Iterator[Path]:
+    """Yield files under ``root`` matching a pattern, by name, files before subdirectories."""
+
+    stack = [Path(root)]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as scan:
+            entries = sorted(scan, key=lambda entry: entry.name)
+        subdirectories = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(Path(entry.path))
+            elif entry.is_file() and any(fnmatch.fnmatch(entry.name, p) for p in patterns):
+                yield Path(entry.path)
+        stack.extend(reversed(subdirectories))
+
+
+def read_document(path: Path, root: Path) -> Optional[Document]:
+    """Read one file as a document, or return ``None`` if it has no text.
+
+    The document id is the path relative to ``root``.
+    """
+
+    return parse_document(path, root, path.read_bytes())
+
+
+def parse_document(path: Path, root: Path, data: bytes) -> Optional[Document]:
+    """Turn the bytes read from ``path`` into a document, as ``read_document`` does."""
+
+    raw = data.decode("utf-8", errors="replace")
+    relative = path.relative_to(root).as_posix()
+    if path.suffix.lower() in HTML_SUFFIXES:
+        title, content = extract_html_text(raw)
+        kind = "html"
+    else:
+        title, content = "", _normalize_text(raw)
+        kind = "text"
+    if not content:
+        return None
+    return Document(
+        doc_id=relative,
+        title=title or path.stem,
+        content=content,
+        metadata={"path": relative, "type": kind},
+    )
+
+
+def _read_if_present(path: Path, root: Path) -> Optional[Document]:
+    # Files can vanish or turn unreadable between the walk and the read.
+    try:
+        return read_document(path, root)
+    except OSError:
+        return None
+
+
+def crawl_documents(
+    root: str | Path,
+    *,
+    patterns: Sequence[str] = DEFAULT_PATTERNS,
+    threads: int = DEFAULT_THREADS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> Iterator[Document]:
+    """Yield a document for every matching, non-empty file under ``root``.
+
+    Files that cannot be read when their turn comes are skipped.
+    """
+
+    if threads < 1 or queue_size < 1:
+        raise ValueError("threads and queue_size must be at least 1")
+    root = Path(root)
+    paths = iter_paths(root, patterns)
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="notso-crawl") as pool:
+        pending: Deque[Future] = deque()
+        for path in paths:
+            pending.append(pool.submit(_read_if_present, path, root))
+            if len(pending) >= queue_size:
+                document = pending.popleft().result()
+                if document is not None:
+                    yield document
+        while pending:
+            document = pending.popleft().result()
+            if document is not None:
+                yield document
+
+
+__all__ = [
+    "DEFAULT_PATTERNS",
+    "DEFAULT_QUEUE_SIZE",
+    "DEFAULT_THREADS",
+    "HTML_SUFFIXES",
+    "crawl_documents",
+    "extract_html_text",
+    "iter_paths",
+    "parse_document",
+    "read_document",
+]
@@ -0,0 +1,169 @@
+"""Near-duplicate detection for documents as they are ingested.
+
+Each document gets a 64-bit SimHash fingerprint of its content's word
+shingles, so documents that share most of their text differ in only a few
+bits. To find an earlier document within ``max_distance`` bits without
+comparing against every one, fingerprints are split into ``bands`` bands
+and bucketed by band value (``DEFAULT_BANDS``, or one more than
+``max_distance`` if that is larger). Two fingerprints that differ in at most
+``max_distance`` bits must agree on at least one band when ``bands`` exceeds
+``max_distance``, so only documents sharing a bucket are compared, and every
+near-duplicate within the distance is found.
+
+The first document of each group is its representative. Later
+near-duplicates are either dropped or kept with a ``duplicate_of`` metadata
+entry naming the representative. Only representatives are bucketed, so
+memory grows with the number of distinct documents.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..core.models import Document
+from ..core.ranker import tokenize
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3
+DEFAULT_MAX_DISTANCE = 3
+DEFAULT_BANDS = 4
+DEDUP_MODES = ("drop", "cluster")
+
+
+def _shingle_hash(shingle: str) -> int:
+    # ``hash()`` is salted per process; fingerprints must be stable.
+    digest = hashlib.blake2b(shingle.encode("utf-8"), digest_size=FINGERPRINT_BITS // 8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """Return the SimHash of the word shingles of ``text``.
+
+    Texts shorter than a shingle are fingerprinted as one shingle, and an
+    empty text as zero.
+    """
+
+    tokens = tokenize(text)
+    if len(tokens) <= shingle_size:
+        shingles = Counter([" ".join(tokens)]) if tokens else Counter()
+    else:
+        shingles = Counter(
+            " ".join(tokens[start : start + shingle_size])
+            for start in range(len(tokens) - shingle_size + 1)
+        )
+    weights = [0] * FINGERPRINT_BITS
+    for shingle, count in shingles.items():
+        value = _shingle_hash(shingle)
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += count if value >> bit & 1 else -count
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(left: int, right: int) -> int:
+    return bin(left ^ right).count("1")
+
+
+class NearDuplicateIndex:
+    """Representative fingerprints bucketed by band for sub-quadratic lookup."""
+
+    def __init__(
+        self, *, max_distance: int = DEFAULT_MAX_DISTANCE, bands: Optional[int] = None
+    ) -> None:
+        if max_distance < 0:
+            raise ValueError("max_distance must not be negative")
+        if bands is None:
+            bands = max(DEFAULT_BANDS, max_distance + 1)
+        if not max_distance < bands <= FINGERPRINT_BITS:
+            raise ValueError("bands must exceed max_distance and fit the fingerprint")
+        self.max_distance = max_distance
+        width = FINGERPRINT_BITS // bands
+        # The last band takes the bits left over by the integer division.
+        self._bands = [
+            (band * width, width if band < bands - 1 else FINGERPRINT_BITS - band * width)
+            for band in range(bands)
+        ]
+        self._buckets: List[Dict[int, List[Tuple[int, str]]]] = [{} for _ in range(bands)]
+
+    def _keys(self, fingerprint: int) -> Iterator[Tuple[int, int]]:
+        for band, (shift, width) in enumerate(self._bands):
+            yield band, fingerprint >> shift & ((1 << width) - 1)
+
+    def find(self, fingerprint: int) -> Optional[str]:
+        """Return the id of a representative within ``max_distance``, if any."""
+
+        for band, key in self._keys(fingerprint):
+            for other, doc_id in self._buckets[band].get(key, ()):
+                if hamming_distance(fingerprint, other) <= self.max_distance:
+                    return doc_id
+        return None
+
+    def add(self, fingerprint: int, doc_id: str) -> None:
+        for band, key in self._keys(fingerprint):
+            self._buckets[band].setdefault(key, []).append((fingerprint, doc_id))
+
+
+class NearDuplicateFilter:
+    """Drops or clusters near-duplicate documents in a stream.
+
+    ``duplicates`` counts the near-duplicates seen so far.
+    """
+
+    def __init__(
+        self,
+        mode: str = "drop",
+        *,
+        max_distance: int = DEFAULT_MAX_DISTANCE,
+        bands: Optional[int] = None,
+        shingle_size: int = SHINGLE_SIZE,
+    ) -> None:
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode: {mode}")
+        self.mode = mode
+        self.shingle_size = shingle_size
+        self.duplicates = 0
+        self._index = NearDuplicateIndex(max_distance=max_distance, bands=bands)
+
+    def filter(self, documents: Iterable[Document]) -> Iterator[Document]:
+        for document in documents:
+            fingerprint = simhash(document.content, self.shingle_size)
+            original = self._index.find(fingerprint)
+            if original is None:
+                self._index.add(fingerprint, document.doc_id)
+                yield document
+                continue
+            self.duplicates += 1
+            if self.mode == "cluster":
+                metadata = dict(document.metadata or {}, duplicate_of=original)
+                yield Document(document.doc_id, document.title, document.content, metadata)
+
+
+def deduplicate_documents(
+    documents: Iterable[Document],
+    mode: str = "drop",
+    *,
+    max_distance: int = DEFAULT_MAX_DISTANCE,
+    bands: Optional[int] = None,
+) -> Iterator[Document]:
+    """Yield ``documents`` with near-duplicates dropped or marked ``duplicate_of``."""
+
+    return NearDuplicateFilter(mode, max_distance=max_distance, bands=bands).filter(documents)
+
+
+__all__ = [
+    "DEDUP_MODES",
+    "DEFAULT_BANDS",
+    "DEFAULT_MAX_DISTANCE",
+    "FINGERPRINT_BITS",
+    "SHINGLE_SIZE",
+    "NearDuplicateFilter",
+    "NearDuplicateIndex",
+    "deduplicate_documents",
+    "hamming_distance",
+    "simhash",
+]
@@ -3,13 +3,19 @@ from __future__ import annotations
 
 import json
 from pathlib import Path
-from typing import Any, Iterable, List
+from typing import Any, Iterable, Iterator, List, TextIO
 
 from ..core.models import Document
 
 
 DEFAULT_SAMPLE_PATH = Path(__file__).resolve().parents[3] / "data" / "sample_docs.json"
 
+# File suffixes read as JSON Lines (one document object per line).
+JSON_LINES_SUFFIXES = (".jsonl", ".ndjson")
+
+_READ_CHUNK = 1 << 16
+_WHITESPACE = " \t\n\r"
+
 
 def _normalize_text(text: str) -> str:
     return " ".join(text.split())
@@ -34,20 +40,191 @@ def _normalize_document(raw: dict[str, Any], index: int) -> Document:
     return Document(doc_id=doc_id, title=title, content=content, metadata=metadata)
 
 
+def iter_documents(path: str | Path) -> Iterator[Document]:
+    """Stream documents from a JSON corpus or, for ``.jsonl``/``.ndjson``, JSON Lines."""
+
+    return _normalize_records(iter_records(path))
+
+
+def iter_documents_from_jsonl(path: str | Path) -> Iterator[Document]:
+    """Yield documents from a JSON Lines file, one object per non-blank line."""
+
+    return _normalize_records(iter_records_from_jsonl(path))
+
+
+def iter_documents_from_json(path: str | Path) -> Iterator[Document]:
+    """Yield documents from a version 1 JSON corpus file as they are parsed.
+
+    The ``{"version": 1, "documents": [...]}`` envelope is parsed
+    incrementally, so only one document is held in memory at a time. When
+    the version follows the documents in the file it can only be checked
+    once they have been read.
+    """
+
+    return _normalize_records(iter_records_from_json(path))
+
+
 def load_documents_from_json(path: str | Path) -> List[Document]:
     """Load documents from a JSON corpus file."""
 
+    return list(iter_documents_from_json(path))
+
+
+def iter_records(path: str | Path) -> Iterator[dict[str, Any]]:
+    """Yield the raw, unnormalized document objects of a corpus file.
+
+    ``_normalize_document(record, position)`` turns the record at each
+    position into the document ``iter_documents`` yields.
+    """
+
     path = Path(path)
-    payload = json.loads(path.read_text(encoding="utf-8"))
-    if not isinstance(payload, dict):
-        raise ValueError("Corpus payload must be a JSON object")
-    version = payload.get("version")
+    if path.suffix in JSON_LINES_SUFFIXES:
+        return iter_records_from_jsonl(path)
+    return iter_records_from_json(path)
+
+
+def iter_records_from_jsonl(path: str | Path) -> Iterator[dict[str, Any]]:
+    with Path(path).open(encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"Invalid JSON on line {line_number}: {exc.msg}") from None
+            if not isinstance(raw, dict):
+                raise ValueError(f"Line {line_number} is not a JSON object")
+            yield raw
+
+
+def iter_records_from_json(path: str | Path) -> Iterator[dict[str, Any]]:
+    with Path(path).open(encoding="utf-8") as handle:
+        reader = _JsonReader(handle)
+        reader.expect("{")
+        version: Any = None
+        seen_documents = False
+        if not reader.consume("}"):
+            while True:
+                key = reader.value()
+                if not isinstance(key, str):
+                    raise ValueError("Corpus payload keys must be strings")
+                reader.expect(":")
+                if key == "documents":
+                    if seen_documents:
+                        raise ValueError("Corpus documents are given twice")
+                    seen_documents = True
+                    if version is not None and version != 1:
+                        raise ValueError(f"Unsupported corpus version: {version}")
+                    if not reader.consume("["):
+                        raise ValueError("Corpus documents must be a list")
+                    yield from _iter_array_records(reader)
+                else:
+                    value = reader.value()
+                    if key == "version":
+                        version = value
+                if reader.consume("}"):
+                    break
+                reader.expect(",")
+        reader.expect_end()
     if version != 1:
         raise ValueError(f"Unsupported corpus version: {version}")
-    raw_documents = payload.get("documents")
-    if not isinstance(raw_documents, list):
+    if not seen_documents:
         raise ValueError("Corpus documents must be a list")
-    return [_normalize_document(raw, index) for index, raw in enumerate(raw_documents)]
+
+
+def _normalize_records(records: Iterable[dict[str, Any]]) -> Iterator[Document]:
+    for position, raw in enumerate(records):
+        yield _normalize_document(raw, position)
+
+
+def _iter_array_records(reader: _JsonReader) -> Iterator[dict[str, Any]]:
+    if reader.consume("]"):
+        return
+    index = 0
+    while True:
+        raw = reader.value()
+        if not isinstance(raw, dict):
+            raise ValueError(f"Corpus document {index + 1} is not a JSON object")
+        yield raw
+        index += 1
+        if reader.consume("]"):
+            return
+        reader.expect(",")
+
+
+class _JsonReader:
+    """Reads JSON tokens and values from a text stream a chunk at a time.
+
+    Consumed text is dropped as the buffer advances, so memory is bounded by
+    the largest single value rather than by the file. While a value is still
+    incomplete each read is twice the size of the last, so a value of ``n``
+    characters is copied and re-decoded ``O(log n)`` times rather than once
+    per chunk.
+    """
+
+    def __init__(self, handle: TextIO) -> None:
+        self._handle = handle
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+
+        self._skip_whitespace()
+        size = _READ_CHUNK
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError as exc:
+                if self._eof:
+                    raise ValueError(f"Invalid corpus JSON: {exc.msg}") from None
+            else:
+                # A number could continue in the next chunk.
+                if end < len(self._buffer) or self._eof:
+                    self._position = end
+                    return value
+            self._fill(size)
+            size *= 2
+
+    def consume(self, token: str) -> bool:
+        """Skip ``token`` if it comes next and return whether it did."""
+
+        if self._peek() == token:
+            self._position += 1
+            return True
+        return False
+
+    def expect(self, token: str) -> None:
+        if not self.consume(token):
+            found = self._peek() or "end of file"
+            raise ValueError(f"Invalid corpus JSON: expected {token!r}, found {found!r}")
+
+    def expect_end(self) -> None:
+        if self._peek():
+            raise ValueError("Invalid corpus JSON: extra data after the payload")
+
+    def _peek(self) -> str:
+        self._skip_whitespace()
+        return self._buffer[self._position : self._position + 1]
+
+    def _skip_whitespace(self) -> None:
+        while True:
+            buffer = self._buffer
+            position = self._position
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            self._position = position
+            if position < len(buffer) or self._eof:
+                return
+            self._fill(_READ_CHUNK)
+
+    def _fill(self, size: int) -> None:
+        chunk = self._handle.read(size)
+        self._buffer = self._buffer[self._position :] + chunk
+        self._position = 0
+        self._eof = not chunk
 
 
 def load_sample_documents(path: str | Path | None = None) -> List[Document]:
@@ -68,6 +245,13 @@ def summarize_documents(documents: Iterable[Document]) -> list[str]:
 
 __all__ = [
     "DEFAULT_SAMPLE_PATH",
+    "JSON_LINES_SUFFIXES",
+    "iter_documents",
+    "iter_documents_from_json",
+    "iter_documents_from_jsonl",
+    "iter_records",
+    "iter_records_from_json",
+    "iter_records_from_jsonl",
     "load_documents_from_json",
     "load_sample_documents",
     "summarize_documents",
@@ -0,0 +1,251 @@
+"""Manifest of indexed sources for incremental re-ingest.
+
+The manifest records each source file's modification time and size along
+with a SHA-256 content hash of every document read from it.
+``Manifest.changes`` compares a fresh scan of the corpus against it: a source
+whose modification time and size are unchanged is not read at all, and the
+documents of a changed source flow on only when their hash differs.
+Documents whose source disappeared, or that a changed source no longer
+yields, come out as deletes.
+
+``apply_changes`` writes the changes to a ``SqliteIndex`` in one
+transaction, and the manifest is saved next to the index afterwards. Adds
+and updates both replace any document with the same id, so if a run stops
+between committing the index and saving the manifest, the next run applies
+the same changes again and ends in the same state.
+
+A manifest records the generation of the database it describes. The
+database draws a new generation whenever it is created or rebuilt, so
+``load_index_manifest`` notices a manifest that outlived its database, as
+it does one whose document count disagrees with the index. It then falls
+back to the documents actually in the index: every source is read again,
+and any indexed document the corpus no longer yields is deleted.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from ..core.models import Document
+from ..storage.sqlite_index import SqliteIndex
+from .crawler import DEFAULT_PATTERNS, iter_paths, read_document
+from .loader import iter_documents
+
+MANIFEST_VERSION = 1
+
+ADD = "add"
+UPDATE = "update"
+DELETE = "delete"
+
+
+class Change(NamedTuple):
+    """One document to add, update or delete; ``document`` is ``None`` for deletes."""
+
+    kind: str
+    doc_id: str
+    document: Optional[Document]
+
+
+class SourceEntry(NamedTuple):
+    """What the manifest knows about one source file."""
+
+    mtime_ns: int
+    size: int
+    # Content hash of each document read from the source, by id.
+    documents: Dict[str, str]
+
+
+def manifest_path(index_path: str | Path) -> Path:
+    """Return the manifest file that accompanies an index file."""
+
+    return Path(index_path).with_suffix(".manifest.json")
+
+
+def document_digest(document: Document) -> str:
+    """Return the SHA-256 hex digest of every field of ``document``."""
+
+    payload = json.dumps(
+        [document.doc_id, document.title, document.content, document.metadata],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """The sources behind an index, keyed by a name that is stable across runs.
+
+    ``generation`` is the ``SqliteIndex.generation`` the manifest was saved
+    for, if known.
+    """
+
+    def __init__(
+        self,
+        sources: Optional[Dict[str, SourceEntry]] = None,
+        *,
+        generation: Optional[int] = None,
+    ) -> None:
+        self.sources: Dict[str, SourceEntry] = dict(sources or {})
+        self.generation = generation
+
+    @classmethod
+    def load(cls, path: str | Path) -> Manifest:
+        """Read a manifest, or return an empty one if ``path`` does not exist."""
+
+        path = Path(path)
+        if not path.exists():
+            return cls()
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        version = payload.get("version")
+        if version != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version: {version}")
+        return cls(
+            {
+                name: SourceEntry(entry["mtime_ns"], entry["size"], dict(entry["documents"]))
+                for name, entry in payload["sources"].items()
+            },
+            generation=payload.get("index_generation"),
+        )
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        payload = {
+            "version": MANIFEST_VERSION,
+            "index_generation": self.generation,
+            "sources": {name: entry._asdict() for name, entry in self.sources.items()},
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(path.name + ".tmp")
+        temporary.write_text(json.dumps(payload, sort_keys=True), encoding="utf-8")
+        os.replace(temporary, path)
+
+    def document_count(self) -> int:
+        return sum(len(entry.documents) for entry in self.sources.values())
+
+    def changes(
+        self,
+        sources: Iterable[Tuple[str, Path]],
+        read: Callable[[Path], Iterable[Document]],
+    ) -> Iterator[Change]:
+        """Yield the changes that bring the index in line with ``sources``.
+
+        ``sources`` pairs each source's manifest name with its path and
+        ``read`` yields a path's documents. Deletes come last. Once the
+        iterator is exhausted the manifest describes the new state. A
+        document id that appears twice raises ``ValueError``.
+        """
+
+        previous = {
+            doc_id: digest
+            for entry in self.sources.values()
+            for doc_id, digest in entry.documents.items()
+        }
+        current: Dict[str, SourceEntry] = {}
+        seen: Set[str] = set()
+        for name, path in sources:
+            try:
+                stat = path.stat()
+            except OSError:
+                # Vanished since the walk; its documents are deleted below.
+                continue
+            entry = self.sources.get(name)
+            if entry is not None and (entry.mtime_ns, entry.size) == (
+                stat.st_mtime_ns,
+                stat.st_size,
+            ):
+                _claim(seen, entry.documents)
+                current[name] = entry
+                continue
+            documents: Dict[str, str] = {}
+            for document in read(path):
+                _claim(seen, (document.doc_id,))
+                digest = documents[document.doc_id] = document_digest(document)
+                old = previous.get(document.doc_id)
+                if old != digest:
+                    yield Change(ADD if old is None else UPDATE, document.doc_id, document)
+            current[name] = SourceEntry(stat.st_mtime_ns, stat.st_size, documents)
+        for doc_id in previous:
+            if doc_id not in seen:
+                yield Change(DELETE, doc_id, None)
+        self.sources = current
+
+
+def load_index_manifest(path: str | Path, index: SqliteIndex) -> Manifest:
+    """Load the manifest at ``path`` if it still describes ``index``.
+
+    Otherwise return a manifest that lists the documents in ``index`` under
+    no source, so every source is read again and those documents are updated
+    or deleted. Either way the manifest's generation is the index's.
+    """
+
+    manifest = Manifest.load(path)
+    generation = index.generation()
+    if manifest.generation == generation and manifest.document_count() == index.document_count():
+        return manifest
+    # No source is named "", so its documents are deleted unless read again.
+    indexed = {document.doc_id: "" for document in index.documents()}
+    return Manifest({"": SourceEntry(-1, -1, indexed)}, generation=generation)
+
+
+def _claim(seen: Set[str], doc_ids: Iterable[str]) -> None:
+    for doc_id in doc_ids:
+        if doc_id in seen:
+            raise ValueError(f"Duplicate document id: {doc_id}")
+        seen.add(doc_id)
+
+
+def corpus_changes(
+    data: str | Path, manifest: Manifest, *, patterns: Iterable[str] = DEFAULT_PATTERNS
+) -> Iterator[Change]:
+    """Yield the changes for a corpus read the way ``notso index --data`` reads it.
+
+    A directory's matching files are each a source named by their relative
+    path; any other path is a single JSON or JSON Lines source.
+    """
+
+    data = Path(data)
+    if not data.is_dir():
+        return manifest.changes([(data.name, data)], iter_documents)
+
+    def read(path: Path) -> List[Document]:
+        document = read_document(path, data)
+        return [] if document is None else [document]
+
+    sources = (
+        (path.relative_to(data).as_posix(), path) for path in iter_paths(data, tuple(patterns))
+    )
+    return manifest.changes(sources, read)
+
+
+def apply_changes(index: SqliteIndex, changes: Iterable[Change]) -> Dict[str, int]:
+    """Write ``changes`` to ``index`` in one transaction and count them by kind."""
+
+    counts = {ADD: 0, UPDATE: 0, DELETE: 0}
+    with index.transaction():
+        for change in changes:
+            if change.kind == DELETE:
+                index.delete_document(change.doc_id)
+            else:
+                index.update_document(change.document)
+            counts[change.kind] += 1
+    return counts
+
+
+__all__ = [
+    "ADD",
+    "DELETE",
+    "MANIFEST_VERSION",
+    "UPDATE",
+    "Change",
+    "Manifest",
+    "SourceEntry",
+    "apply_changes",
+    "corpus_changes",
+    "document_digest",
+    "load_index_manifest",
+    "manifest_path",
+]
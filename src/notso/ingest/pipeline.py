@@ -0,0 +1,421 @@
+"""Staged ingest pipeline connected by bounded queues.
+
+Ingest runs as a chain of stages: read -> normalize -> analyze -> index. A
+source thread cuts the input into batches, and every following stage runs
+its function on whole batches in its own pool of threads or processes. Each
+stage hands its pending results to the next through a bounded queue, in
+input order, so the index comes out as a serial build would make it. A full
+queue blocks the stage that feeds it: at most ``queue_size`` batches wait
+between two stages, and memory stays bounded however large the corpus is.
+The last stage, the sink, runs in the calling thread.
+
+``PipelineStats`` reports each stage's items, busy time, throughput and the
+depth of the queue in front of it. The stage whose workers are busiest, and
+whose queue stays full, is the bottleneck and the one to give more workers.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from ..core.index import InMemoryIndex, TermAnalysis, analyze_texts
+from ..core.models import Document
+from .crawler import DEFAULT_PATTERNS, iter_paths, parse_document
+from .dedup import NearDuplicateFilter
+from .loader import _normalize_document, iter_records
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_QUEUE_SIZE = 8
+STAGE_NAMES = ("read", "normalize", "analyze")
+
+# How often blocked queue operations check whether the pipeline stopped.
+_POLL_SECONDS = 0.1
+_DONE = object()
+
+
+class _Stopped(Exception):
+    """Raised in a stage thread when another stage has failed."""
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One step of a pipeline; ``function`` maps a batch (a list) to a list.
+
+    With ``processes`` the function runs in a process pool, for CPU-bound
+    steps, and it and its items must be picklable. With ``keep_inputs`` the
+    stage outputs ``(input, result)`` pairs, so a process need not send its
+    input back.
+    """
+
+    name: str
+    function: Callable[[List[Any]], List[Any]]
+    workers: int = 1
+    processes: bool = False
+    keep_inputs: bool = False
+
+
+@dataclass
+class StageStats:
+    """Counters for one stage; the queue is the one the stage reads from."""
+
+    name: str
+    workers: int
+    items: int = 0
+    busy_seconds: float = 0.0
+    queue_max: int = 0
+    queue_total: int = 0
+    queue_samples: int = 0
+
+    @property
+    def queue_mean(self) -> float:
+        return self.queue_total / max(self.queue_samples, 1)
+
+    def sample_queue(self, depth: int) -> None:
+        self.queue_max = max(self.queue_max, depth)
+        self.queue_total += depth
+        self.queue_samples += 1
+
+
+@dataclass
+class PipelineStats:
+    stages: List[StageStats]
+    elapsed_seconds: float
+
+    def throughput(self, stage: StageStats) -> float:
+        """Items per second over the whole run."""
+
+        return stage.items / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def utilization(self, stage: StageStats) -> float:
+        """Fraction of the run the stage's workers spent working."""
+
+        if not self.elapsed_seconds:
+            return 0.0
+        return stage.busy_seconds / (self.elapsed_seconds * stage.workers)
+
+    @property
+    def bottleneck(self) -> StageStats:
+        return max(self.stages, key=self.utilization)
+
+    def format_lines(self) -> List[str]:
+        lines = [
+            f"{'stage':<10} {'workers':>7} {'items':>9} {'busy s':>8} {'items/s':>9}"
+            f" {'busy %':>6} {'queue max':>9} {'queue avg':>9}"
+        ]
+        for stage in self.stages:
+            lines.append(
+                f"{stage.name:<10} {stage.workers:>7} {stage.items:>9} {stage.busy_seconds:>8.2f}"
+                f" {self.throughput(stage):>9.0f} {self.utilization(stage):>6.0%}"
+                f" {stage.queue_max:>9} {stage.queue_mean:>9.1f}"
+            )
+        return lines
+
+
+# A queue entry: the producing stage's pending result, its counters, and its
+# input batch when the stage keeps inputs.
+_Entry = Tuple["Future[Tuple[float, List[Any]]]", StageStats, Optional[List[Any]]]
+
+
+def _timed(function: Callable[[List[Any]], List[Any]], batch: List[Any]) -> Tuple[float, List[Any]]:
+    started = time.perf_counter()
+    result = function(batch)
+    return time.perf_counter() - started, result
+
+
+def _resolve(entry: _Entry) -> List[Any]:
+    future, producer, inputs = entry
+    seconds, outputs = future.result()
+    producer.items += len(outputs)
+    producer.busy_seconds += seconds
+    return outputs if inputs is None else list(zip(inputs, outputs))
+
+
+class Pipeline:
+    """A source and a chain of stages, run by ``run`` into a sink."""
+
+    def __init__(
+        self,
+        source: Iterable[Any],
+        stages: Sequence[Stage],
+        *,
+        source_name: str = "read",
+        sink_name: str = "index",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ) -> None:
+        if batch_size < 1 or queue_size < 1:
+            raise ValueError("batch_size and queue_size must be at least 1")
+        for stage in stages:
+            if stage.workers < 1:
+                raise ValueError(f"Stage {stage.name} needs at least one worker")
+        self.source = source
+        self.stages = list(stages)
+        self.source_name = source_name
+        self.sink_name = sink_name
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+    def run(self, sink: Callable[[List[Any]], None]) -> PipelineStats:
+        """Pass every batch out of the last stage to ``sink``, in source order.
+
+        The first error raised by the source, a stage or the sink stops the
+        pipeline and is raised here once every thread has finished.
+        """
+
+        stats = (
+            [StageStats(self.source_name, 1)]
+            + [StageStats(stage.name, stage.workers) for stage in self.stages]
+            + [StageStats(self.sink_name, 1)]
+        )
+        queues: List[queue.Queue] = [
+            queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)
+        ]
+        stop = threading.Event()
+        errors: List[BaseException] = []
+        executors: List[Executor] = []
+        threads = [
+            threading.Thread(
+                target=self._guard,
+                args=(stop, errors, self._feed, queues[0], stats[0], stats[1]),
+                name=f"notso-{self.source_name}",
+                daemon=True,
+            )
+        ]
+        for position, stage in enumerate(self.stages):
+            executor: Executor
+            if stage.processes:
+                executor = ProcessPoolExecutor(max_workers=stage.workers)
+            else:
+                executor = ThreadPoolExecutor(
+                    max_workers=stage.workers, thread_name_prefix=f"notso-{stage.name}"
+                )
+            executors.append(executor)
+            threads.append(
+                threading.Thread(
+                    target=self._guard,
+                    args=(
+                        stop,
+                        errors,
+                        self._dispatch,
+                        stage,
+                        executor,
+                        queues[position],
+                        queues[position + 1],
+                        stats[position + 1],
+                        stats[position + 2],
+                    ),
+                    name=f"notso-{stage.name}-dispatch",
+                    daemon=True,
+                )
+            )
+
+        sink_stats = stats[-1]
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            while True:
+                entry = self._get(queues[-1], stop)
+                if entry is _DONE:
+                    break
+                batch = _resolve(entry)
+                sink_started = time.perf_counter()
+                sink(batch)
+                sink_stats.busy_seconds += time.perf_counter() - sink_started
+                sink_stats.items += len(batch)
+        except _Stopped:
+            pass
+        except BaseException as exc:
+            errors.append(exc)
+        finally:
+            stop.set()
+            for thread in threads:
+                if thread.ident is not None:
+                    thread.join()
+            for executor in executors:
+                executor.shutdown(wait=True)
+        if errors:
+            raise errors[0]
+        return PipelineStats(stats, time.perf_counter() - started)
+
+    def _guard(
+        self, stop: threading.Event, errors: List[BaseException], target: Callable, *args: Any
+    ) -> None:
+        try:
+            target(stop, *args)
+        except _Stopped:
+            pass
+        except BaseException as exc:
+            errors.append(exc)
+            stop.set()
+
+    def _feed(
+        self, stop: threading.Event, out: queue.Queue, stats: StageStats, downstream: StageStats
+    ) -> None:
+        iterator = iter(self.source)
+        while True:
+            started = time.perf_counter()
+            batch = list(islice(iterator, self.batch_size))
+            seconds = time.perf_counter() - started
+            if not batch:
+                break
+            future: Future = Future()
+            future.set_result((seconds, batch))
+            self._put(out, (future, stats, None), downstream, stop)
+        self._put(out, _DONE, downstream, stop)
+
+    def _dispatch(
+        self,
+        stop: threading.Event,
+        stage: Stage,
+        executor: Executor,
+        inbox: queue.Queue,
+        out: queue.Queue,
+        stats: StageStats,
+        downstream: StageStats,
+    ) -> None:
+        while True:
+            entry = self._get(inbox, stop)
+            if entry is _DONE:
+                break
+            batch = _resolve(entry)
+            if not batch:
+                continue
+            future = executor.submit(_timed, stage.function, batch)
+            self._put(out, (future, stats, batch if stage.keep_inputs else None), downstream, stop)
+        self._put(out, _DONE, downstream, stop)
+
+    @staticmethod
+    def _put(out: queue.Queue, item: Any, downstream: StageStats, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=_POLL_SECONDS)
+            except queue.Full:
+                continue
+            downstream.sample_queue(out.qsize())
+            return
+        raise _Stopped
+
+    @staticmethod
+    def _get(inbox: queue.Queue, stop: threading.Event) -> Any:
+        while True:
+            try:
+                return inbox.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                if stop.is_set():
+                    raise _Stopped from None
+
+
+def _normalize_batch(batch: List[Tuple[int, Dict[str, Any]]]) -> List[Document]:
+    return [_normalize_document(raw, position) for position, raw in batch]
+
+
+def _read_files(batch: List[Path]) -> List[Tuple[Path, bytes]]:
+    # Files that vanish or turn unreadable are skipped, as the crawler does.
+    read = []
+    for path in batch:
+        try:
+            read.append((path, path.read_bytes()))
+        except OSError:
+            continue
+    return read
+
+
+def _parse_files(root: Path, batch: List[Tuple[Path, bytes]]) -> List[Document]:
+    documents = (parse_document(path, root, data) for path, data in batch)
+    return [document for document in documents if document is not None]
+
+
+def _analyze_batch(batch: List[Document]) -> List[TermAnalysis]:
+    return analyze_texts([(document.title, document.content) for document in batch])
+
+
+def ingest_pipeline(
+    data: str | Path,
+    *,
+    workers: Optional[Mapping[str, int]] = None,
+    dedup: Optional[NearDuplicateFilter] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> Pipeline:
+    """Return the pipeline that reads, normalizes and analyzes a corpus.
+
+    ``data`` is a JSON or JSON Lines corpus file, or a directory crawled as
+    ``crawl_documents`` crawls it. ``workers`` gives a worker count per
+    stage name in ``STAGE_NAMES`` (one by default). Reading a file is a
+    single stream, so only a directory's files are read by several workers.
+    Analysis runs in processes. ``dedup``, when given, filters the
+    normalized documents. The pipeline yields batches of ``(document,
+    TermAnalysis)`` pairs for ``InMemoryIndex.add_analyzed``.
+    """
+
+    counts = dict(workers or {})
+    unknown = set(counts) - set(STAGE_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown pipeline stage: {', '.join(sorted(unknown))}")
+    data = Path(data)
+    stages: List[Stage] = []
+    if data.is_dir():
+        source: Iterable[Any] = iter_paths(data, DEFAULT_PATTERNS)
+        source_name = "walk"
+        stages.append(Stage("read", _read_files, counts.get("read", 1)))
+        stages.append(Stage("normalize", partial(_parse_files, data), counts.get("normalize", 1)))
+    else:
+        if counts.get("read", 1) != 1:
+            raise ValueError("A corpus file is read by one worker; read workers need a directory")
+        source = enumerate(iter_records(data))
+        source_name = "read"
+        stages.append(Stage("normalize", _normalize_batch, counts.get("normalize", 1)))
+    if dedup is not None:
+        # Near-duplicates are found in document order, so one worker only.
+        stages.append(Stage("dedup", lambda batch: list(dedup.filter(batch))))
+    stages.append(
+        Stage(
+            "analyze", _analyze_batch, counts.get("analyze", 1), processes=True, keep_inputs=True
+        )
+    )
+    return Pipeline(
+        source, stages, source_name=source_name, batch_size=batch_size, queue_size=queue_size
+    )
+
+
+def build_index_pipelined(
+    data: str | Path,
+    *,
+    workers: Optional[Mapping[str, int]] = None,
+    dedup: Optional[NearDuplicateFilter] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> Tuple[InMemoryIndex, PipelineStats]:
+    """Index a corpus through ``ingest_pipeline`` and return the index and its stats.
+
+    The index is identical to ``build_index`` over the same documents.
+    """
+
+    index = InMemoryIndex()
+    pipeline = ingest_pipeline(
+        data, workers=workers, dedup=dedup, batch_size=batch_size, queue_size=queue_size
+    )
+    stats = pipeline.run(index.add_analyzed)
+    return index, stats
+
+
+__all__ = [
+    "DEFAULT_BATCH_SIZE",
+    "DEFAULT_QUEUE_SIZE",
+    "STAGE_NAMES",
+    "Pipeline",
+    "PipelineStats",
+    "Stage",
+    "StageStats",
+    "build_index_pipelined",
+    "ingest_pipeline",
+]
@@ -40,13 +40,16 @@ class ResourceGuard:
         self._clock = clock
         self._memory_reader = memory_reader
         self._start_time: Optional[float] = None
+        self._started_tracing = False
 
     def start(self) -> None:
         """Start tracking resource usage."""
 
         self._start_time = self._clock()
         if self._limits.max_memory_bytes is not None and self._memory_reader is None:
-            tracemalloc.start()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
 
             def _default_memory_reader() -> int:
                 current, _peak = tracemalloc.get_traced_memory()
@@ -54,6 +57,13 @@ class ResourceGuard:
 
             self._memory_reader = _default_memory_reader
 
+    def stop(self) -> None:
+        """Stop tracking, turning off tracemalloc if :meth:`start` turned it on."""
+
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
     def checkpoint(self, *, docs_processed: int, terms_processed: int) -> Optional[StopReason]:
         """Return a stop reason if any limit has been exceeded."""
 
@@ -1,8 +1,13 @@
-"""Sample documents for indexing demos."""
+"""Sample documents for indexing demos.
+
+``SAMPLE_DOCUMENTS`` is loaded on first access rather than at import, so
+commands that never index the samples do not pay for parsing them.
+"""
 from __future__ import annotations
 
+from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import Any, List
 
 from .ingest.loader import DEFAULT_SAMPLE_PATH, load_sample_documents
 from .core.models import Document
@@ -14,4 +19,15 @@ def load_documents(path: Path | None = None) -> List[Document]:
     return load_sample_documents(path or DEFAULT_SAMPLE_PATH)
 
 
-SAMPLE_DOCUMENTS: List[Document] = load_documents()
+@lru_cache(maxsize=None)
+def _sample_documents() -> List[Document]:
+    return load_documents()
+
+
+def __getattr__(name: str) -> Any:
+    if name == "SAMPLE_DOCUMENTS":
+        return _sample_documents()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["SAMPLE_DOCUMENTS", "load_documents"]
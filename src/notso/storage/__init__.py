@@ -0,0 +1 @@
+"""On-disk storage formats for Notso indexes and documents."""
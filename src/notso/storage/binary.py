@@ -0,0 +1,364 @@
+"""Binary index file opened zero-copy through ``mmap``.
+
+Layout (all integers little-endian)::
+
+    header    magic "NSIX", version u16, flags u16, section count u32,
+              checksum block bytes u32, table CRC32 u32
+    sections  tag 4s, offset u64, length u64    (one entry per section)
+    checksums length u32, CRC32 u32             (one entry per checksum block)
+    payloads  each section's bytes, starting on an 8-byte boundary
+
+Sections hold the sorted term table (``TOFF`` offsets into ``TERM`` bytes),
+corpus statistics (``STAT``: document count u64, average length f64), the
+name of the accompanying document store (``DOCS``), and every integer table
+of a ``CompressedIndex`` as a packed array (see ``_TABLES``). Opening a file
+reads only the header and section table; the tables are memoryviews of the
+mapping and term lookups binary-search the mapped term table, so startup
+does not grow with the corpus.
+
+Each section is split into checksum blocks of at most the header's block
+size, listed in section order, and the table CRC32 covers the section and
+checksum tables. Opening checks only the table CRC32; ``verify_binary_index``
+streams the whole file through the block checksums. Version 1 files have a
+reserved u32 in place of the block size and table CRC32, no checksum table,
+and are still opened.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from ..core.compressed import CompressedIndex, build_compressed_index
+from ..core.models import Index
+from ..core.vocab import SortedTermTable
+from .checksums import CHECKSUM_BLOCK_BYTES, VerifyResult, crc32
+from .docstore import DiskDocumentStore, document_store_path, write_document_store
+
+MAGIC = b"NSIX"
+VERSION = 2
+
+_HEADER = struct.Struct("<4sHHIII")
+_HEADER_V1 = struct.Struct("<4sHHII")
+_PREAMBLE = struct.Struct("<4sH")
+_SECTION = struct.Struct("<4sQQ")
+_CHECKSUM = struct.Struct("<II")
+_STATS = struct.Struct("<Qd")
+_ALIGNMENT = 8
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+# Section tag, CompressedIndex field and array typecode of each packed table.
+_TABLES = (
+    (b"DLEN", "_doc_lengths", "I"),
+    (b"NORM", "_length_norms", "d"),
+    (b"DFRQ", "_document_frequencies", "I"),
+    (b"MXTF", "_max_term_frequencies", "I"),
+    (b"MNLN", "_min_document_lengths", "I"),
+    (b"TBLK", "_term_blocks", "I"),
+    (b"BLST", "_block_last", "I"),
+    (b"BMTF", "_block_max_tfs", "I"),
+    (b"BMLN", "_block_min_lengths", "I"),
+    (b"BOFF", "_block_offsets", "Q"),
+    (b"PDAT", "_data", "B"),
+    (b"POFF", "_position_offsets", "Q"),
+    (b"PPOS", "_position_data", "B"),
+)
+
+
+def is_binary_index(path: str | Path) -> bool:
+    """Return whether ``path`` starts with the binary index magic."""
+
+    with Path(path).open("rb") as handle:
+        return handle.read(len(MAGIC)) == MAGIC
+
+
+def write_binary_index(path: str | Path, index: Index) -> None:
+    """Write ``index`` and its document store next to each other.
+
+    Indexes other than ``CompressedIndex`` are compacted first.
+    """
+
+    path = Path(path)
+    if not isinstance(index, CompressedIndex):
+        index = build_compressed_index(index.documents())
+    store_path = document_store_path(path)
+    write_document_store(store_path, index.documents())
+    write_binary_tables(
+        path,
+        store_path.name,
+        index.document_count(),
+        index.average_document_length(),
+        [term.encode("utf-8") for term in index.terms()],
+        {field: getattr(index, field) for _tag, field, _typecode in _TABLES},
+    )
+
+
+def write_binary_tables(
+    path: str | Path,
+    store_name: str,
+    document_count: int,
+    average_document_length: float,
+    terms: Sequence[bytes],
+    tables: Mapping[str, Union[Sequence, Path]],
+) -> None:
+    """Write an index file from its sorted UTF-8 terms and packed tables.
+
+    ``tables`` maps each ``CompressedIndex`` field named in ``_TABLES`` to
+    its values, or to a file already holding them packed little-endian,
+    which is copied in a block at a time.
+    """
+
+    path = Path(path)
+    term_offsets = array("Q", [0])
+    for term in terms:
+        term_offsets.append(term_offsets[-1] + len(term))
+    sections: List[Tuple[bytes, Union[bytes, Path]]] = [
+        (b"STAT", _STATS.pack(document_count, average_document_length)),
+        (b"DOCS", store_name.encode("utf-8")),
+        (b"TOFF", _pack(term_offsets)),
+        (b"TERM", b"".join(terms)),
+    ]
+    for tag, field, typecode in _TABLES:
+        values = tables[field]
+        if not isinstance(values, Path):
+            values = _pack(array(typecode, values))
+        sections.append((tag, values))
+
+    block_bytes = CHECKSUM_BLOCK_BYTES
+    lengths = [
+        payload.stat().st_size if isinstance(payload, Path) else len(payload)
+        for _tag, payload in sections
+    ]
+    block_count = sum(-(-length // block_bytes) for length in lengths)
+    offset = _align(_HEADER.size + _SECTION.size * len(sections) + _CHECKSUM.size * block_count)
+    entries = []
+    for (tag, _payload), length in zip(sections, lengths):
+        entries.append(_SECTION.pack(tag, offset, length))
+        offset = _align(offset + length)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + ".tmp")
+    checksums = []
+    with temporary.open("wb") as handle:
+        # The header and tables are written last, once every block's CRC32 is known.
+        handle.seek(_HEADER.size + _SECTION.size * len(sections) + _CHECKSUM.size * block_count)
+        for _tag, payload in sections:
+            _pad(handle)
+            for block in _blocks(payload, block_bytes):
+                checksums.append(_CHECKSUM.pack(len(block), crc32(block)))
+                handle.write(block)
+        tables_data = b"".join(entries + checksums)
+        handle.seek(0)
+        handle.write(
+            _HEADER.pack(MAGIC, VERSION, 0, len(sections), block_bytes, crc32(tables_data))
+        )
+        handle.write(tables_data)
+    os.replace(temporary, path)
+
+
+def open_binary_index(path: str | Path) -> CompressedIndex:
+    """Map a file written by ``write_binary_index`` as a read-only index.
+
+    Closing the index releases the mapping and the document store.
+    """
+
+    path = Path(path)
+    with path.open("rb") as handle:
+        mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    # A mapping cannot be closed while views of it are alive, so every view
+    # is collected here and released first, on close or on a failed open.
+    views: List[memoryview] = []
+
+    def mapped(values: Any) -> Any:
+        if isinstance(values, memoryview):
+            views.append(values)
+        return values
+
+    store: Optional[DiskDocumentStore] = None
+    try:
+        view = mapped(memoryview(mapping))
+        layout = _read_layout(
+            lambda offset, length: mapped(view[offset : offset + length]), path
+        )
+
+        sections: Dict[bytes, memoryview] = {}
+        for tag, offset, length in layout.sections:
+            if offset + length > len(view):
+                raise ValueError(f"Truncated index file: {path}")
+            sections[tag] = mapped(view[offset : offset + length])
+
+        def section(tag: bytes) -> memoryview:
+            try:
+                return sections[tag]
+            except KeyError:
+                raise ValueError(f"Index file {path} has no {tag.decode()} section") from None
+
+        document_count, average_length = _STATS.unpack(section(b"STAT"))
+        store = DiskDocumentStore(path.parent / bytes(section(b"DOCS")).decode("utf-8"))
+        if len(store) != document_count:
+            raise ValueError(f"Document store does not match index file: {path}")
+        terms = SortedTermTable(mapped(_unpack(section(b"TOFF"), "Q")), section(b"TERM"))
+        tables = {
+            field: mapped(_unpack(section(tag), typecode)) for tag, field, typecode in _TABLES
+        }
+    except BaseException:
+        for mapped_view in reversed(views):
+            mapped_view.release()
+        mapping.close()
+        if store is not None:
+            store.close()
+        raise
+    return CompressedIndex(
+        _store=store,
+        _ordinals=None,
+        _vocabulary=terms,
+        _term_slots=range(len(terms)),
+        _average_document_length=average_length,
+        _mapping=mapping,
+        _views=views,
+        **tables,
+    )
+
+
+def verify_binary_index(path: str | Path) -> VerifyResult:
+    """Stream a binary index file and check every block against its CRC32.
+
+    The file is read sequentially, one checksum block at a time, so memory
+    stays bounded by the block size and throughput by the disk. Verification
+    stops at the first bad block. The document store is verified separately.
+    """
+
+    path = Path(path)
+    blocks_checked = 0
+    bytes_checked = 0
+    with path.open("rb") as handle:
+
+        def read(offset: int, length: int) -> bytes:
+            handle.seek(offset)
+            return handle.read(length)
+
+        try:
+            layout = _read_layout(read, path)
+        except ValueError as exc:
+            return VerifyResult(path, 0, 0, str(exc))
+        if layout.checksums is None:
+            return VerifyResult(path, 0, 0)
+
+        checksums = iter(layout.checksums)
+        for tag, offset, length in layout.sections:
+            name = tag.decode("ascii", "replace")
+            for block, start in enumerate(range(offset, offset + length, layout.block_bytes)):
+                expected_length, expected_crc = next(checksums)
+                data = read(start, min(layout.block_bytes, offset + length - start))
+                where = f"section {name} block {block} at offset {start}"
+                if len(data) != expected_length:
+                    return VerifyResult(path, blocks_checked, bytes_checked, f"{where}: truncated")
+                if crc32(data) != expected_crc:
+                    return VerifyResult(
+                        path, blocks_checked, bytes_checked, f"{where}: checksum mismatch"
+                    )
+                blocks_checked += 1
+                bytes_checked += len(data)
+    return VerifyResult(path, blocks_checked, bytes_checked)
+
+
+class _Layout(NamedTuple):
+    block_bytes: int
+    sections: List[Tuple[bytes, int, int]]
+    # (length, CRC32) of every checksum block in section order; None for version 1.
+    checksums: Optional[List[Tuple[int, int]]]
+
+
+def _read_layout(read: Callable[[int, int], bytes], path: Path) -> _Layout:
+    """Parse and check the header, section table and checksum table."""
+
+    def exactly(offset: int, length: int) -> bytes:
+        data = read(offset, length)
+        if len(data) != length:
+            raise ValueError(f"Truncated index file: {path}")
+        return data
+
+    magic, version = _PREAMBLE.unpack(exactly(0, _PREAMBLE.size))
+    if magic != MAGIC:
+        raise ValueError(f"Not a binary index: {path}")
+    if version == 1:
+        _magic, _version, _flags, section_count, _reserved = _HEADER_V1.unpack(
+            exactly(0, _HEADER_V1.size)
+        )
+        table = exactly(_HEADER_V1.size, _SECTION.size * section_count)
+        return _Layout(0, list(_SECTION.iter_unpack(table)), None)
+    if version != VERSION:
+        raise ValueError(f"Unsupported index version: {version}")
+
+    _magic, _version, _flags, section_count, block_bytes, table_crc = _HEADER.unpack(
+        exactly(0, _HEADER.size)
+    )
+    table = exactly(_HEADER.size, _SECTION.size * section_count)
+    sections = list(_SECTION.iter_unpack(table))
+    if block_bytes == 0:
+        raise ValueError(f"Corrupt index header: {path}")
+    blocks = sum(-(-length // block_bytes) for _tag, _offset, length in sections)
+    checksums = exactly(_HEADER.size + len(table), _CHECKSUM.size * blocks)
+    if crc32(checksums, crc32(table)) != table_crc:
+        raise ValueError(f"Corrupt section table in index file: {path}")
+    return _Layout(block_bytes, sections, list(_CHECKSUM.iter_unpack(checksums)))
+
+
+def _blocks(payload: Union[bytes, Path], block_bytes: int) -> Iterator[bytes]:
+    if isinstance(payload, Path):
+        with payload.open("rb") as handle:
+            yield from iter(lambda: handle.read(block_bytes), b"")
+        return
+    view = memoryview(payload)
+    for start in range(0, len(view), block_bytes):
+        yield view[start : start + block_bytes]
+
+
+def _pack(values: array) -> bytes:
+    if not _LITTLE_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack(payload: memoryview, typecode: str) -> Sequence:
+    if _LITTLE_ENDIAN:
+        return payload.cast(typecode)
+    values = array(typecode, bytes(payload))
+    values.byteswap()
+    return values
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def _pad(handle: BinaryIO) -> None:
+    handle.write(b"\0" * (_align(handle.tell()) - handle.tell()))
+
+
+__all__ = [
+    "is_binary_index",
+    "open_binary_index",
+    "verify_binary_index",
+    "write_binary_index",
+    "write_binary_tables",
+]
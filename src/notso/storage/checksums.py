@@ -0,0 +1,38 @@
+"""Block checksums shared by the on-disk formats."""
+
+from __future__ import annotations
+
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+# Sections larger than this are checksummed in blocks of this many bytes.
+CHECKSUM_BLOCK_BYTES = 1 << 20
+
+
+def crc32(data: bytes, value: int = 0) -> int:
+    """Return the unsigned CRC32 of ``data``, continuing from ``value``."""
+
+    return zlib.crc32(data, value) & 0xFFFFFFFF
+
+
+@dataclass(frozen=True)
+class VerifyResult:
+    """Outcome of streaming one file through its block checksums.
+
+    ``error`` describes the first bad block, or is ``None`` when every block
+    matched. ``blocks`` is zero for files that carry no checksums.
+    """
+
+    path: Path
+    blocks: int
+    bytes_checked: int
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+__all__ = ["CHECKSUM_BLOCK_BYTES", "VerifyResult", "crc32"]
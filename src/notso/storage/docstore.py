@@ -0,0 +1,355 @@
+"""On-disk document store read lazily through ``mmap``.
+
+Layout (all integers little-endian)::
+
+    header   magic "NSDS", version u16, flags u16, documents per block u32
+    blocks   u32 payload length, u32 CRC32, payload    (one per block of documents)
+    names    u32 payload length, u32 CRC32, payload    (every document id and title)
+    offsets  u64 per block, plus the names offset as a sentinel
+    trailer  offsets position u64, document count u64, block count u32,
+             offsets CRC32 u32, magic "NSDS"
+
+A block payload is its documents' records back to back; a record is four u32
+field lengths (id, title, content, JSON metadata) followed by the UTF-8 field
+bytes, and an empty metadata field means ``None``. The names payload repeats
+just the id and title of every document. Payloads are zlib-compressed when
+flag bit 0 is set. Each CRC32 covers the payload bytes as stored, and a
+block's checksum is checked whenever the block is read. Version 1 files have
+no checksums (neither the per-payload CRC32 nor the offsets CRC32) and are
+still read.
+
+Opening a store reads the trailer, the offset table and the names, which
+ranking needs for every candidate; content and metadata stay on disk until a
+document is displayed, and only its block is decompressed.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from ..core.models import Document
+from ..core.store import StoredDocument
+from .checksums import VerifyResult, crc32
+
+MAGIC = b"NSDS"
+VERSION = 2
+FLAG_ZLIB = 1
+DEFAULT_BLOCK_DOCUMENTS = 32
+
+_HEADER = struct.Struct("<4sHHI")
+_TRAILER = struct.Struct("<QQII4s")
+_TRAILER_V1 = struct.Struct("<QQI4s")
+_LENGTH = struct.Struct("<I")
+_FRAME = struct.Struct("<II")
+_RECORD = struct.Struct("<IIII")
+_NAME = struct.Struct("<II")
+
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+_Record = Tuple[str, str, bytes, bytes]
+
+
+def document_store_path(index_path: str | Path) -> Path:
+    """Return the document store file that accompanies an index file.
+
+    The store is named after the whole file name, so ``index.json`` and
+    ``index.bin`` in one directory do not share a store.
+    """
+
+    path = Path(index_path)
+    return path.with_name(path.name + ".docs")
+
+
+def write_document_store(
+    path: str | Path,
+    documents: Iterable[Document],
+    *,
+    compress: bool = True,
+    block_documents: int = DEFAULT_BLOCK_DOCUMENTS,
+) -> int:
+    """Write ``documents`` to a document store file and return how many were written."""
+
+    if block_documents < 1:
+        raise ValueError("block_documents must be at least 1")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    block_offsets = array("Q")
+    names = bytearray()
+    count = 0
+    # Write beside the target and swap it in, so a store that is open (and
+    # possibly the source of ``documents``) is never truncated underneath.
+    temporary = path.with_name(path.name + ".tmp")
+    with temporary.open("wb") as handle:
+        handle.write(_HEADER.pack(MAGIC, VERSION, FLAG_ZLIB if compress else 0, block_documents))
+        block = bytearray()
+        for document in documents:
+            doc_id = document.doc_id.encode("utf-8")
+            title = document.title.encode("utf-8")
+            content = document.content.encode("utf-8")
+            metadata = b""
+            if document.metadata is not None:
+                metadata = json.dumps(document.metadata, separators=(",", ":")).encode("utf-8")
+            block += _RECORD.pack(len(doc_id), len(title), len(content), len(metadata))
+            block += doc_id + title + content + metadata
+            names += _NAME.pack(len(doc_id), len(title)) + doc_id + title
+            count += 1
+            if count % block_documents == 0:
+                block_offsets.append(handle.tell())
+                _write_payload(handle, block, compress)
+                block = bytearray()
+        if block:
+            block_offsets.append(handle.tell())
+            _write_payload(handle, block, compress)
+        names_offset = handle.tell()
+        _write_payload(handle, names, compress)
+        block_offsets.append(names_offset)
+        offsets_position = handle.tell()
+        offsets = block_offsets.tobytes() if _LITTLE_ENDIAN else _swapped(block_offsets)
+        handle.write(offsets)
+        handle.write(
+            _TRAILER.pack(offsets_position, count, len(block_offsets) - 1, crc32(offsets), MAGIC)
+        )
+    os.replace(temporary, path)
+    return count
+
+
+class DiskDocumentStore:
+    """Read-only ``DocumentSource`` over a file written by ``write_document_store``."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._file = self.path.open("rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as exc:
+            self._file.close()
+            raise ValueError(f"Empty document store: {self.path}") from exc
+        try:
+            self._read_layout()
+        except Exception:
+            self.close()
+            raise
+        self._cached_block: Tuple[int, List[_Record]] = (-1, [])
+
+    def _read_layout(self) -> None:
+        data = self._map
+        flags, block_documents, trailer = _read_header(data, self.path)
+        offsets_position, count, blocks, offsets_crc = trailer
+        self._checksummed = offsets_crc is not None
+        self._compressed = bool(flags & FLAG_ZLIB)
+        self._block_documents = block_documents
+        self._count = count
+        table = data[offsets_position : offsets_position + 8 * (blocks + 1)]
+        if len(table) != 8 * (blocks + 1) or (
+            self._checksummed and crc32(table) != offsets_crc
+        ):
+            raise ValueError(f"Corrupt document store offsets: {self.path}")
+        offsets = array("Q")
+        offsets.frombytes(table)
+        if not _LITTLE_ENDIAN:
+            offsets.byteswap()
+        self._block_offsets = offsets
+        names = self._payload(offsets[blocks])
+        self._doc_ids: List[str] = []
+        self._titles: List[str] = []
+        position = 0
+        for _ in range(count):
+            id_length, title_length = _NAME.unpack_from(names, position)
+            position += _NAME.size
+            self._doc_ids.append(names[position : position + id_length].decode("utf-8"))
+            position += id_length
+            self._titles.append(names[position : position + title_length].decode("utf-8"))
+            position += title_length
+
+    def __len__(self) -> int:
+        return self._count
+
+    def doc_id(self, ordinal: int) -> str:
+        return self._doc_ids[ordinal]
+
+    def title(self, ordinal: int) -> str:
+        return self._titles[ordinal]
+
+    def content(self, ordinal: int) -> str:
+        return self._record(ordinal)[2].decode("utf-8")
+
+    def metadata(self, ordinal: int) -> Optional[dict[str, str]]:
+        metadata = self._record(ordinal)[3]
+        return json.loads(metadata) if metadata else None
+
+    def view(self, ordinal: int) -> StoredDocument:
+        """Return a lazy view of one document."""
+
+        if not 0 <= ordinal < self._count:
+            raise IndexError("document ordinal out of range")
+        return StoredDocument(self, ordinal)
+
+    def document(self, ordinal: int) -> Document:
+        doc_id, title, content, metadata = self._record(ordinal)
+        return Document(
+            doc_id=doc_id,
+            title=title,
+            content=content.decode("utf-8"),
+            metadata=json.loads(metadata) if metadata else None,
+        )
+
+    def documents(self) -> Iterator[Document]:
+        """Decode every stored document in ordinal order, one block at a time."""
+
+        return (self.document(ordinal) for ordinal in range(self._count))
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> DiskDocumentStore:
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.close()
+
+    def _record(self, ordinal: int) -> _Record:
+        if not 0 <= ordinal < self._count:
+            raise IndexError("document ordinal out of range")
+        block, entry = divmod(ordinal, self._block_documents)
+        cached_block, records = self._cached_block
+        if cached_block != block:
+            records = self._decode_block(block)
+            self._cached_block = (block, records)
+        return records[entry]
+
+    def _decode_block(self, block: int) -> List[_Record]:
+        payload = self._payload(self._block_offsets[block])
+        records: List[_Record] = []
+        position = 0
+        while position < len(payload):
+            lengths = _RECORD.unpack_from(payload, position)
+            position += _RECORD.size
+            fields = []
+            for length in lengths:
+                fields.append(payload[position : position + length])
+                position += length
+            doc_id, title, content, metadata = fields
+            records.append((doc_id.decode("utf-8"), title.decode("utf-8"), content, metadata))
+        return records
+
+    def _payload(self, offset: int) -> bytes:
+        if self._checksummed:
+            length, checksum = _FRAME.unpack_from(self._map, offset)
+            start = offset + _FRAME.size
+        else:
+            (length,) = _LENGTH.unpack_from(self._map, offset)
+            start = offset + _LENGTH.size
+        payload = self._map[start : start + length]
+        if len(payload) != length:
+            raise ValueError(f"Truncated document store block at offset {offset}")
+        if self._checksummed and crc32(payload) != checksum:
+            raise ValueError(f"Checksum mismatch in document store block at offset {offset}")
+        return zlib.decompress(payload) if self._compressed else payload
+
+
+def verify_document_store(path: str | Path) -> VerifyResult:
+    """Stream a document store file and check every block against its CRC32.
+
+    The file is read sequentially one block at a time and nothing is decoded,
+    so memory stays bounded by the largest block. Verification stops at the
+    first bad block.
+    """
+
+    path = Path(path)
+    size = path.stat().st_size
+    blocks_checked = 0
+    with path.open("rb") as handle:
+
+        def result(error: Optional[str] = None) -> VerifyResult:
+            return VerifyResult(path, blocks_checked, handle.tell(), error)
+
+        head = handle.read(_HEADER.size)
+        handle.seek(max(size - _TRAILER.size, 0))
+        tail = handle.read(_TRAILER.size)
+        try:
+            _flags, _block_documents, trailer = _read_header(head + tail, path, size)
+        except ValueError as exc:
+            return VerifyResult(path, 0, 0, str(exc))
+        offsets_position, _count, blocks, offsets_crc = trailer
+        if offsets_crc is None:
+            return VerifyResult(path, 0, 0)
+        handle.seek(_HEADER.size)
+        # Document blocks and the names payload are framed back to back.
+        for block in range(blocks + 1):
+            name = f"block {block}" if block < blocks else "names block"
+            start = handle.tell()
+            frame = handle.read(_FRAME.size)
+            if len(frame) != _FRAME.size:
+                return result(f"{name} at offset {start}: truncated")
+            length, checksum = _FRAME.unpack(frame)
+            payload = handle.read(length)
+            if len(payload) != length or handle.tell() > offsets_position:
+                return result(f"{name} at offset {start}: truncated")
+            if crc32(payload) != checksum:
+                return result(f"{name} at offset {start}: checksum mismatch")
+            blocks_checked += 1
+        if handle.tell() != offsets_position:
+            return result(f"offset table at offset {handle.tell()}: misplaced")
+        table = handle.read(8 * (blocks + 1))
+        if len(table) != 8 * (blocks + 1) or crc32(table) != offsets_crc:
+            return result(f"offset table at offset {offsets_position}: checksum mismatch")
+        blocks_checked += 1
+        handle.seek(size)
+        return result()
+
+
+def _read_header(
+    data: bytes, path: Path, size: Optional[int] = None
+) -> Tuple[int, int, Tuple[int, int, int, Optional[int]]]:
+    """Parse the header and trailer; ``data`` ends with the file's last bytes.
+
+    Returns the flags, documents per block and the trailer fields, whose
+    offsets CRC32 is ``None`` for version 1 files.
+    """
+
+    size = len(data) if size is None else size
+    if size < _HEADER.size + _TRAILER_V1.size:
+        raise ValueError(f"Truncated document store: {path}")
+    magic, version, flags, block_documents = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"Not a document store: {path}")
+    if version == VERSION:
+        *trailer, trailer_magic = _TRAILER.unpack_from(data, len(data) - _TRAILER.size)
+    elif version == 1:
+        *trailer, trailer_magic = _TRAILER_V1.unpack_from(data, len(data) - _TRAILER_V1.size)
+        trailer.append(None)
+    else:
+        raise ValueError(f"Unsupported document store version: {version}")
+    if trailer_magic != MAGIC:
+        raise ValueError(f"Truncated document store: {path}")
+    offsets_position, count, blocks, offsets_crc = trailer
+    return flags, block_documents, (offsets_position, count, blocks, offsets_crc)
+
+
+def _swapped(values: array) -> bytes:
+    swapped = array(values.typecode, values)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def _write_payload(handle: BinaryIO, payload: bytes, compress: bool) -> None:
+    payload = zlib.compress(bytes(payload)) if compress else bytes(payload)
+    handle.write(_FRAME.pack(len(payload), crc32(payload)))
+    handle.write(payload)
+
+
+__all__ = [
+    "DiskDocumentStore",
+    "document_store_path",
+    "verify_document_store",
+    "write_document_store",
+]
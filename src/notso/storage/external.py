@@ -0,0 +1,319 @@
+"""External-memory build of a binary index for corpora larger than RAM.
+
+Documents stream into the document store while their postings are buffered
+per term, varint-encoded, until the buffer reaches the memory budget. The
+buffer is then spilled to a run file in term order. Runs cover ascending
+ordinal ranges, so a term's postings from consecutive runs can simply be
+concatenated: runs are k-way merged with ``heapq.merge`` and each term's
+postings are block-encoded straight into the postings and positions
+sections of the index file. When there are more than ``MERGE_FAN_IN`` runs
+they are first merged level by level, in groups of ``MERGE_FAN_IN``
+consecutive runs, so every posting is rewritten once per level.
+
+A merged run keeps each input entry as an entry of its own rather than
+joining a term's entries, and the final write hands each entry's encoded
+blocks to disk before reading the next. So no entry, and nothing held for
+one term, outgrows a single spill. Memory stays bounded by the budget plus
+per-document lengths, the document ids (for duplicate detection), the term
+table and the per-block tables.
+"""
+
+from __future__ import annotations
+
+import heapq
+import tempfile
+from array import array
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from ..core.index import analyze_documents
+from ..core.models import Document
+from ..core.postings import PostingsWriter, encode_positions, encode_varint, read_varint
+from ..core.ranker import relative_length
+from ..core.vocab import Vocabulary
+from .binary import write_binary_tables
+from .docstore import document_store_path, write_document_store
+
+DEFAULT_MEMORY_BUDGET = 256 << 20
+MERGE_FAN_IN = 64
+
+# Rough per-term cost of a buffered posting list beyond its encoded bytes:
+# the dict slot, the id and the bytearray object.
+_TERM_OVERHEAD = 120
+
+# A run entry: the term's UTF-8 bytes, the run's position in ordinal order,
+# and the term's encoded postings in that run.
+_RunEntry = Tuple[bytes, int, bytes]
+
+
+def build_binary_index_external(
+    path: str | Path,
+    documents: Iterable[Document],
+    *,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    temp_dir: Optional[str | Path] = None,
+    workers: int = 1,
+) -> int:
+    """Index ``documents`` into a binary index file at ``path`` and return the count.
+
+    Buffered postings are kept under ``memory_budget`` bytes. Run files go
+    to a temporary directory under ``temp_dir``, by default the index's own
+    directory, since the system temporary directory may itself be held in
+    memory. ``workers`` processes tokenize the documents (see
+    ``analyze_documents``). The result is the same file ``write_binary_index``
+    writes for the same documents.
+    """
+
+    if memory_budget < 1:
+        raise ValueError("memory_budget must be positive")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    vocabulary = Vocabulary()
+    doc_lengths = array("I")
+    seen: Set[str] = set()
+
+    with tempfile.TemporaryDirectory(
+        prefix="notso-build-", dir=temp_dir if temp_dir is not None else path.parent
+    ) as work:
+        buffer = _PostingsBuffer(Path(work), vocabulary, memory_budget)
+
+        def analyzed(documents: Iterable[Document]) -> Iterator[Document]:
+            for doc, (length, counts, positions) in analyze_documents(
+                documents, vocabulary, workers=workers
+            ):
+                if doc.doc_id in seen:
+                    raise ValueError(f"Duplicate document id: {doc.doc_id}")
+                seen.add(doc.doc_id)
+                buffer.add(len(doc_lengths), counts, positions)
+                doc_lengths.append(length)
+                yield doc
+
+        store_path = document_store_path(path)
+        count = write_document_store(store_path, analyzed(documents))
+        seen.clear()
+        runs = buffer.finish()
+        level = 0
+        while len(runs) > MERGE_FAN_IN:
+            level += 1
+            runs = [
+                _merge_runs(
+                    runs[start : start + MERGE_FAN_IN],
+                    Path(work) / f"merged-{level}-{start // MERGE_FAN_IN:06d}",
+                )
+                for start in range(0, len(runs), MERGE_FAN_IN)
+            ]
+
+        average_length = sum(doc_lengths) / max(count, 1)
+        tables = _TableWriter(Path(work), doc_lengths)
+        terms = tables.write(_merged(runs))
+        write_binary_tables(
+            path,
+            store_path.name,
+            count,
+            average_length,
+            terms,
+            dict(
+                tables.tables(),
+                _doc_lengths=doc_lengths,
+                _length_norms=array(
+                    "d", (relative_length(length, average_length) for length in doc_lengths)
+                ),
+            ),
+        )
+    return count
+
+
+class _PostingsBuffer:
+    """Postings of recent documents, spilled to a run file when over budget."""
+
+    def __init__(self, directory: Path, vocabulary: Vocabulary, budget: int) -> None:
+        self._directory = directory
+        self._vocabulary = vocabulary
+        self._budget = budget
+        self._postings: Dict[int, bytearray] = {}
+        self._bytes = 0
+        self._runs: List[Path] = []
+
+    def add(self, ordinal: int, counts: Dict[int, int], positions: Dict[int, List[int]]) -> None:
+        postings = self._postings
+        added = 0
+        for term_id, tf in counts.items():
+            encoded = postings.get(term_id)
+            if encoded is None:
+                encoded = postings[term_id] = bytearray()
+                added += _TERM_OVERHEAD
+            before = len(encoded)
+            encode_varint(ordinal, encoded)
+            encode_varint(tf, encoded)
+            encode_positions(positions.get(term_id, ()), encoded)
+            added += len(encoded) - before
+        self._bytes += added
+        if self._bytes >= self._budget:
+            self._spill()
+
+    def finish(self) -> List[Path]:
+        """Spill what is left and return the run files in ordinal order."""
+
+        self._spill()
+        return self._runs
+
+    def _spill(self) -> None:
+        if not self._postings:
+            return
+        path = self._directory / f"run-{len(self._runs):06d}"
+        term = self._vocabulary.term
+        with path.open("wb") as handle:
+            entries = ((term(term_id).encode("utf-8"), term_id) for term_id in self._postings)
+            for encoded_term, term_id in sorted(entries):
+                _write_entry(handle, encoded_term, self._postings[term_id])
+        self._runs.append(path)
+        self._postings = {}
+        self._bytes = 0
+
+
+class _TableWriter:
+    """Block-encodes merged postings into the tables of a ``CompressedIndex``."""
+
+    def __init__(self, directory: Path, doc_lengths: array) -> None:
+        self._doc_lengths = doc_lengths
+        self._data_path = directory / "postings"
+        self._position_path = directory / "positions"
+        self._columns = {
+            "_document_frequencies": array("I"),
+            "_max_term_frequencies": array("I"),
+            "_min_document_lengths": array("I"),
+            "_term_blocks": array("I"),
+            "_block_last": array("I"),
+            "_block_max_tfs": array("I"),
+            "_block_min_lengths": array("I"),
+            "_block_offsets": array("Q"),
+            "_position_offsets": array("Q"),
+        }
+
+    def write(self, entries: Iterable[_RunEntry]) -> List[bytes]:
+        """Encode every term's postings and return the terms in order."""
+
+        terms: List[bytes] = []
+        with self._data_path.open("wb") as data, self._position_path.open("wb") as positions:
+            writer: Optional[PostingsWriter] = None
+            bases = (0, 0)
+            for term, _order, encoded in entries:
+                if not terms or terms[-1] != term:
+                    if writer is not None:
+                        self._append(writer, bases)
+                    terms.append(term)
+                    writer = PostingsWriter()
+                    bases = (data.tell(), positions.tell())
+                for ordinal, tf, term_positions in _decode_postings(encoded):
+                    writer.add(ordinal, tf, term_positions, self._doc_lengths[ordinal])
+                chunk, position_chunk = writer.drain()
+                data.write(chunk)
+                positions.write(position_chunk)
+            if writer is not None:
+                self._append(writer, bases)
+            columns = self._columns
+            columns["_term_blocks"].append(len(columns["_block_last"]))
+            columns["_block_offsets"].append(data.tell())
+            columns["_position_offsets"].append(positions.tell())
+        return terms
+
+    def tables(self) -> Dict[str, object]:
+        return dict(self._columns, _data=self._data_path, _position_data=self._position_path)
+
+    def _append(self, writer: PostingsWriter, bases: Tuple[int, int]) -> None:
+        """Record the tables of a term whose postings start at ``bases``."""
+
+        columns = self._columns
+        base, position_base = bases
+        columns["_term_blocks"].append(len(columns["_block_last"]))
+        columns["_document_frequencies"].append(writer.count)
+        columns["_max_term_frequencies"].append(writer.max_term_frequency)
+        columns["_min_document_lengths"].append(writer.min_document_length)
+        columns["_block_last"].extend(writer.block_last)
+        columns["_block_max_tfs"].extend(writer.block_max_tfs)
+        columns["_block_min_lengths"].extend(writer.block_min_lengths)
+        columns["_block_offsets"].extend(base + offset for offset in writer.block_offsets)
+        columns["_position_offsets"].extend(
+            position_base + offset for offset in writer.position_offsets
+        )
+
+
+def _merge_runs(runs: List[Path], target: Path) -> Path:
+    """Merge consecutive runs into one, in term order and then ordinal order.
+
+    A term's entries are copied one by one rather than joined, so a merged
+    run's entries are no larger than those of its inputs.
+    """
+
+    with target.open("wb") as handle:
+        for term, _order, encoded in _merged(runs):
+            _write_entry(handle, term, encoded)
+    for run in runs:
+        run.unlink()
+    return target
+
+
+def _merged(runs: List[Path]) -> Iterator[_RunEntry]:
+    """K-way merge runs by term; a term's entries come out in ordinal order."""
+
+    return heapq.merge(*(_read_run(run, order) for order, run in enumerate(runs)))
+
+
+def _write_entry(handle: BinaryIO, term: bytes, encoded: bytes) -> None:
+    header = bytearray()
+    encode_varint(len(term), header)
+    encode_varint(len(encoded), header)
+    handle.write(header)
+    handle.write(term)
+    handle.write(encoded)
+
+
+def _read_run(path: Path, order: int) -> Iterator[_RunEntry]:
+    with path.open("rb") as handle:
+        while True:
+            term_length = _read_varint(handle)
+            if term_length is None:
+                return
+            encoded_length = _read_varint(handle)
+            if encoded_length is None:
+                raise ValueError(f"Truncated run file: {path}")
+            term = handle.read(term_length)
+            encoded = handle.read(encoded_length)
+            if len(term) != term_length or len(encoded) != encoded_length:
+                raise ValueError(f"Truncated run file: {path}")
+            yield term, order, encoded
+
+
+def _read_varint(handle: BinaryIO) -> Optional[int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = handle.read(1)
+        if not byte:
+            if shift:
+                raise ValueError("Truncated varint in run file")
+            return None
+        value |= (byte[0] & 0x7F) << shift
+        if not byte[0] & 0x80:
+            return value
+        shift += 7
+
+
+def _decode_postings(encoded: bytes) -> Iterator[Tuple[int, int, List[int]]]:
+    """Yield ``(ordinal, tf, positions)`` from a buffered posting list."""
+
+    position = 0
+    while position < len(encoded):
+        ordinal, position = read_varint(encoded, position)
+        tf, position = read_varint(encoded, position)
+        count, position = read_varint(encoded, position)
+        term_positions = []
+        previous = -1
+        for _ in range(count):
+            gap, position = read_varint(encoded, position)
+            previous += gap + 1
+            term_positions.append(previous)
+        yield ordinal, tf, term_positions
+
+
+__all__ = ["DEFAULT_MEMORY_BUDGET", "MERGE_FAN_IN", "build_binary_index_external"]
@@ -0,0 +1,209 @@
+"""JSON index file with precomputed corpus statistics.
+
+Version 4 stores everything ``InMemoryIndex`` derives from tokenizing its
+documents (lengths, term frequencies, content positions and document
+frequencies) plus the IDF, TF-IDF vector and vector norm tables, so loading
+only deserializes. Document text lives in the accompanying document store.
+Versions 1 and 2 embedded the documents and version 3 only named the store;
+those are still read, by re-indexing their documents.
+
+A checksum table written next to the index (``checksum_table_path``) holds
+the length and CRC32 of each block of the file, for ``verify_json_index``.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from ..core.index import (
+    InMemoryIndex,
+    analyze_documents,
+    build_in_memory_index,
+    build_in_memory_index_from_store,
+    restore_in_memory_index,
+)
+from ..core.models import Document, Index
+from ..core.ranker import bm25_idf
+from ..core.vocab import Vocabulary
+from .checksums import CHECKSUM_BLOCK_BYTES, VerifyResult, crc32
+from .docstore import DiskDocumentStore, document_store_path, write_document_store
+
+VERSION = 4
+CHECKSUM_TABLE_VERSION = 1
+
+
+def checksum_table_path(index_path: str | Path) -> Path:
+    """Return the checksum table path for a JSON index (``index.json.crc``)."""
+
+    index_path = Path(index_path)
+    return index_path.with_name(index_path.name + ".crc")
+
+
+def write_json_index(path: str | Path, index: Index) -> None:
+    """Write ``index`` as JSON next to its document store.
+
+    An ``InMemoryIndex`` is saved from its own statistics; other indexes have
+    their documents tokenized again.
+    """
+
+    path = Path(path)
+    store_path = document_store_path(path)
+    if isinstance(index, InMemoryIndex):
+        vocabulary = index.vocabulary()
+        documents = index.analyzed_documents()
+    else:
+        vocabulary = Vocabulary()
+        documents = analyze_documents(index.documents(), vocabulary)
+    term = vocabulary.term
+    doc_ids: List[str] = []
+    doc_lengths: List[int] = []
+    term_frequencies: List[Dict[str, int]] = []
+    positions: List[Dict[str, List[int]]] = []
+    document_frequencies: Dict[str, int] = {}
+
+    def analyzed(documents: Iterable[Tuple[Document, Any]]) -> Iterator[Document]:
+        # Statistics are gathered while the documents stream into the store.
+        for doc, (length, counts, content_positions) in documents:
+            doc_ids.append(doc.doc_id)
+            doc_lengths.append(length)
+            term_frequencies.append({term(term_id): tf for term_id, tf in counts.items()})
+            positions.append({term(term_id): p for term_id, p in content_positions.items()})
+            for term_id in counts:
+                name = term(term_id)
+                document_frequencies[name] = document_frequencies.get(name, 0) + 1
+            yield doc
+
+    count = write_document_store(store_path, analyzed(documents))
+    idf = {name: bm25_idf(df, count) for name, df in document_frequencies.items()}
+    doc_vectors = {
+        doc_id: {name: tf * idf[name] for name, tf in frequencies.items()}
+        for doc_id, frequencies in zip(doc_ids, term_frequencies)
+    }
+    payload: Dict[str, Any] = {
+        "version": VERSION,
+        "document_store": store_path.name,
+        "document_count": count,
+        "average_document_length": sum(doc_lengths) / max(count, 1),
+        "doc_lengths": doc_lengths,
+        "term_frequencies": term_frequencies,
+        "positions": positions,
+        "document_frequencies": document_frequencies,
+        "idf": idf,
+        "doc_vectors": doc_vectors,
+        "doc_norms": {
+            doc_id: math.sqrt(sum(weight * weight for weight in vector.values()))
+            for doc_id, vector in doc_vectors.items()
+        },
+    }
+    data = json.dumps(payload, sort_keys=True).encode("utf-8")
+    block_bytes = CHECKSUM_BLOCK_BYTES
+    blocks = [data[start : start + block_bytes] for start in range(0, len(data), block_bytes)]
+    table = {
+        "version": CHECKSUM_TABLE_VERSION,
+        "block_bytes": block_bytes,
+        "blocks": [[len(block), crc32(block)] for block in blocks],
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table_path = checksum_table_path(path)
+    for target, contents in ((path, data), (table_path, json.dumps(table).encode("utf-8"))):
+        temporary = target.with_name(target.name + ".tmp")
+        temporary.write_bytes(contents)
+        os.replace(temporary, target)
+
+
+def verify_json_index(path: str | Path) -> VerifyResult:
+    """Stream a JSON index file and check every block against its checksum table.
+
+    A missing or unreadable table is reported as an error, since the file
+    cannot be checked without it; indexes saved before the table existed
+    need saving again. The document store is verified separately.
+    """
+
+    path = Path(path)
+    table_path = checksum_table_path(path)
+    try:
+        table = json.loads(table_path.read_text(encoding="utf-8"))
+        if table.get("version") != CHECKSUM_TABLE_VERSION:
+            raise ValueError(f"unsupported version {table.get('version')}")
+        block_bytes = int(table["block_bytes"])
+        checksums = [(int(length), int(crc)) for length, crc in table["blocks"]]
+    except FileNotFoundError:
+        return VerifyResult(path, 0, 0, f"checksum table {table_path.name} is missing")
+    except (AttributeError, KeyError, TypeError, ValueError) as exc:
+        return VerifyResult(path, 0, 0, f"checksum table {table_path.name} is unreadable: {exc}")
+
+    blocks_checked = 0
+    bytes_checked = 0
+    with path.open("rb") as handle:
+        for block, (expected_length, expected_crc) in enumerate(checksums):
+            data = handle.read(block_bytes)
+            where = f"block {block} at offset {bytes_checked}"
+            if len(data) != expected_length:
+                return VerifyResult(path, blocks_checked, bytes_checked, f"{where}: wrong length")
+            if crc32(data) != expected_crc:
+                return VerifyResult(
+                    path, blocks_checked, bytes_checked, f"{where}: checksum mismatch"
+                )
+            blocks_checked += 1
+            bytes_checked += len(data)
+        if handle.read(1):
+            return VerifyResult(
+                path, blocks_checked, bytes_checked, f"unexpected data at offset {bytes_checked}"
+            )
+    return VerifyResult(path, blocks_checked, bytes_checked)
+
+
+def read_json_index(path: str | Path) -> InMemoryIndex:
+    """Load an index written by ``write_json_index`` or an older version."""
+
+    path = Path(path)
+    payload = json.loads(path.read_text(encoding="utf-8"))
+    version = payload.get("version")
+
+    if version == 4:
+        store = DiskDocumentStore(path.parent / payload["document_store"])
+        try:
+            index = restore_in_memory_index(
+                store, payload["doc_lengths"], payload["term_frequencies"], payload["positions"]
+            )
+            if index.document_count() != payload["document_count"]:
+                raise ValueError(f"Index file does not match its document store: {path}")
+        except Exception:
+            store.close()
+            raise
+        return index
+
+    if version == 3:
+        store = DiskDocumentStore(path.parent / payload["document_store"])
+        try:
+            return build_in_memory_index_from_store(store)
+        except Exception:
+            store.close()
+            raise
+
+    # Versions 1 (from the original engine) and 2 carried the documents inline.
+    if version == 1:
+        documents = [
+            Document(doc_id=item["id"], title="", content=item["text"], metadata={})
+            for item in payload["documents"]
+        ]
+    elif version == 2:
+        documents = [
+            Document(
+                doc_id=item["id"],
+                title=item.get("title", ""),
+                content=item["content"],
+                metadata=item.get("metadata"),
+            )
+            for item in payload["documents"]
+        ]
+    else:
+        raise ValueError(f"Unsupported index version: {version}")
+    return build_in_memory_index(documents)
+
+
+__all__ = ["checksum_table_path", "read_json_index", "verify_json_index", "write_json_index"]
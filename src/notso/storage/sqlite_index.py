@@ -0,0 +1,594 @@
+"""Index stored in a SQLite database that several processes can share.
+
+The database holds the documents with their token counts, a term table with
+each term's document frequency and score bounds, and one postings row per
+term and document carrying the term frequency and the document's content
+positions (encoded as in ``notso.core.postings``). It runs in WAL mode, so
+any number of processes can search while one of them adds, updates or
+deletes documents, and each search reads a single consistent snapshot.
+
+Every statement is fixed SQL text with bound parameters, so ``sqlite3``
+prepares it once per connection and reuses it from its statement cache.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from ..core.index import analyze_document
+from ..core.models import Document, DocumentView, Index
+from ..core.postings import BLOCK_SIZE, decode_positions, encode_positions
+from ..core.ranker import RelativeLengths
+from ..core.store import StoredDocument
+from ..core.vocab import Vocabulary
+from .checksums import VerifyResult
+
+SQLITE_MAGIC = b"SQLite format 3\0"
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    ordinal INTEGER PRIMARY KEY,
+    doc_id TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    metadata TEXT,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    term_id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE,
+    document_frequency INTEGER NOT NULL DEFAULT 0,
+    max_term_frequency INTEGER NOT NULL DEFAULT 0,
+    min_document_length INTEGER
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    ordinal INTEGER NOT NULL,
+    term_frequency INTEGER NOT NULL,
+    positions BLOB NOT NULL,
+    PRIMARY KEY (term_id, ordinal)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_ordinal ON postings (ordinal);
+"""
+
+# Counters kept in ``meta`` next to the schema version.
+_COUNTERS = ("document_count", "total_length", "next_ordinal")
+
+_Blocks = List[Tuple[int, int, int]]
+
+
+def is_sqlite_index(path: str | Path) -> bool:
+    """Return whether ``path`` starts with the SQLite database header."""
+
+    with Path(path).open("rb") as handle:
+        return handle.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+
+
+class _Statistics:
+    """Corpus statistics read at one database version."""
+
+    __slots__ = ("version", "document_count", "total_length", "next_ordinal")
+
+    def __init__(
+        self, version: int, document_count: int, total_length: int, next_ordinal: int
+    ) -> None:
+        self.version = version
+        self.document_count = document_count
+        self.total_length = total_length
+        self.next_ordinal = next_ordinal
+
+    @property
+    def average_document_length(self) -> float:
+        return self.total_length / max(self.document_count, 1)
+
+
+class SqliteIndex(Index):
+    """``Index`` over a SQLite database, updated in place.
+
+    Ordinals are assigned in insertion order and never reused; deleting a
+    document removes its rows, so its ordinal simply has no postings. Each
+    instance owns one connection and may be shared by threads; other
+    processes open their own instance on the same file. Length norms are
+    computed from each document's row against the total length kept in
+    ``meta``, and postings are read from the database a block at a time, so
+    no per-document or per-term table is held in memory.
+    """
+
+    def __init__(self, path: str | Path, *, timeout: float = 5.0) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(
+            str(self.path),
+            timeout=timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        self._lock = threading.RLock()
+        self._statistics: Optional[_Statistics] = None
+        self._writing = False
+        # Term ids are cached between writes. Another connection can rebuild
+        # the database and reassign them, so ``_write`` drops the cache when
+        # ``PRAGMA data_version`` shows that one committed.
+        self._term_ids: Dict[str, int] = {}
+        self._term_ids_version: Optional[int] = None
+        # Posting block summaries read during a snapshot, which cannot change under it.
+        self._snapshot_blocks: Optional[Dict[str, _Blocks]] = None
+        self._store = SqliteDocumentStore(self)
+        try:
+            self._initialize()
+        except Exception:
+            self._connection.close()
+            raise
+
+    def _initialize(self) -> None:
+        connection = self._connection
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with self._write():
+            # ``executescript`` would commit first, so run the statements one by one.
+            for statement in _SCHEMA.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+            connection.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', ?)",
+                (SCHEMA_VERSION,),
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES (?, 0)",
+                [(key,) for key in _COUNTERS],
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', ?)",
+                (_new_generation(),),
+            )
+            version = self._counter("schema_version")
+        if version != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported index schema version: {version}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self) -> SqliteIndex:
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.close()
+
+    @contextmanager
+    def snapshot(self) -> Iterator[None]:
+        """Read from one consistent database snapshot while the block runs.
+
+        Commits by other connections become visible after the block exits;
+        this instance's other threads wait for it.
+        """
+
+        with self._lock:
+            if self._connection.in_transaction:
+                yield
+                return
+            self._connection.execute("BEGIN")
+            self._snapshot_blocks = {}
+            try:
+                yield
+            finally:
+                self._snapshot_blocks = None
+                self._connection.execute("COMMIT")
+
+    def documents(self) -> Iterator[Document]:
+        return self._store.documents()
+
+    def document_at(self, ordinal: int) -> DocumentView:
+        return self._store.view(ordinal)
+
+    def document_length(self, ordinal: int) -> int:
+        row = self._fetchone("SELECT length FROM documents WHERE ordinal = ?", (ordinal,))
+        if row is None:
+            raise IndexError("document ordinal out of range")
+        return row[0]
+
+    def length_norms(self) -> Sequence[float]:
+        statistics = self._current_statistics()
+        return RelativeLengths(
+            self.document_length, statistics.next_ordinal, statistics.average_document_length
+        )
+
+    def postings(self, term: str) -> Iterator[Tuple[int, int]]:
+        return self._stream(
+            "SELECT p.ordinal, p.term_frequency FROM terms t"
+            " JOIN postings p ON p.term_id = t.term_id WHERE t.term = ? ORDER BY p.ordinal",
+            (term,),
+        )
+
+    def positions(self, ordinal: int, term: str) -> Sequence[int]:
+        row = self._fetchone(
+            "SELECT p.positions FROM terms t JOIN postings p ON p.term_id = t.term_id"
+            " WHERE t.term = ? AND p.ordinal = ?",
+            (term, ordinal),
+        )
+        return () if row is None else decode_positions(row[0], 0, 0)
+
+    def term_bound(self, term: str) -> Tuple[int, int]:
+        row = self._fetchone(
+            "SELECT max_term_frequency, min_document_length FROM terms WHERE term = ?", (term,)
+        )
+        if row is None or row[1] is None:
+            return (0, 0)
+        return row[0], row[1]
+
+    def posting_blocks(self, term: str) -> Sequence[Tuple[int, int, int]]:
+        cache = self._snapshot_blocks
+        if cache is not None and term in cache:
+            return cache[term]
+        # One pass over the postings, keeping a summary per block of them.
+        blocks: _Blocks = []
+        rows = self._stream(
+            "SELECT p.ordinal, p.term_frequency, d.length FROM terms t"
+            " JOIN postings p ON p.term_id = t.term_id"
+            " JOIN documents d ON d.ordinal = p.ordinal WHERE t.term = ? ORDER BY p.ordinal",
+            (term,),
+        )
+        for entry, (ordinal, tf, length) in enumerate(rows):
+            if entry % BLOCK_SIZE == 0:
+                blocks.append((ordinal, tf, length))
+            else:
+                _last, max_tf, min_length = blocks[-1]
+                blocks[-1] = (ordinal, max(max_tf, tf), min(min_length, length))
+        if cache is not None:
+            cache[term] = blocks
+        return blocks
+
+    def block_postings(self, term: str, block: int) -> Sequence[Tuple[int, int]]:
+        blocks = self.posting_blocks(term)
+        first = blocks[block - 1][0] + 1 if block > 0 else 0
+        return self._fetchall(
+            "SELECT p.ordinal, p.term_frequency FROM terms t"
+            " JOIN postings p ON p.term_id = t.term_id"
+            " WHERE t.term = ? AND p.ordinal BETWEEN ? AND ? ORDER BY p.ordinal",
+            (term, first, blocks[block][0]),
+        )
+
+    def term_frequencies(self, doc_id: str) -> Dict[str, int]:
+        return dict(
+            self._fetchall(
+                "SELECT t.term, p.term_frequency FROM documents d"
+                " JOIN postings p ON p.ordinal = d.ordinal"
+                " JOIN terms t ON t.term_id = p.term_id WHERE d.doc_id = ?",
+                (doc_id,),
+            )
+        )
+
+    def document_frequency(self, term: str) -> int:
+        row = self._fetchone("SELECT document_frequency FROM terms WHERE term = ?", (term,))
+        return 0 if row is None else row[0]
+
+    def document_count(self) -> int:
+        return self._current_statistics().document_count
+
+    def generation(self) -> int:
+        """Return an id that is new each time the database is created or rebuilt."""
+
+        return self._counter("generation")
+
+    def average_document_length(self) -> float:
+        return self._current_statistics().average_document_length
+
+    def add_documents(self, documents: Iterable[Document]) -> int:
+        """Index new documents in one transaction and return how many were added.
+
+        A duplicate id rolls the whole batch back.
+        """
+
+        vocabulary = Vocabulary()
+        added = 0
+        with self._write():
+            for doc in documents:
+                self._insert(doc, vocabulary)
+                added += 1
+        return added
+
+    def update_document(self, document: Document) -> None:
+        """Replace the document with the same id, or add it if it is new."""
+
+        with self._write():
+            self._remove(document.doc_id)
+            self._insert(document, Vocabulary())
+
+    def delete_document(self, doc_id: str) -> bool:
+        """Delete a document and return whether it was present."""
+
+        with self._write():
+            return self._remove(doc_id)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Group the writes made while the block runs into one transaction.
+
+        Other processes see all of them or none, and an exception rolls them
+        all back.
+        """
+
+        with self._write():
+            yield
+
+    def _insert(self, doc: Document, vocabulary: Vocabulary) -> None:
+        length, counts, positions = analyze_document(doc, vocabulary)
+        ordinal = self._counter("next_ordinal")
+        metadata = None if doc.metadata is None else json.dumps(doc.metadata)
+        try:
+            self._connection.execute(
+                "INSERT INTO documents (ordinal, doc_id, title, content, metadata, length)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (ordinal, doc.doc_id, doc.title, doc.content, metadata, length),
+            )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Duplicate document id: {doc.doc_id}") from None
+        postings = []
+        bounds = []
+        for local_id, tf in counts.items():
+            term_id = self._intern(vocabulary.term(local_id))
+            encoded = bytearray()
+            encode_positions(positions.get(local_id, ()), encoded)
+            postings.append((term_id, ordinal, tf, bytes(encoded)))
+            bounds.append((tf, length, length, term_id))
+        self._connection.executemany(
+            "INSERT INTO postings (term_id, ordinal, term_frequency, positions)"
+            " VALUES (?, ?, ?, ?)",
+            postings,
+        )
+        self._connection.executemany(
+            "UPDATE terms SET document_frequency = document_frequency + 1,"
+            " max_term_frequency = max(max_term_frequency, ?),"
+            " min_document_length = coalesce(min(min_document_length, ?), ?)"
+            " WHERE term_id = ?",
+            bounds,
+        )
+        self._add_counters(document_count=1, total_length=length, next_ordinal=1)
+
+    def _remove(self, doc_id: str) -> bool:
+        row = self._fetchone("SELECT ordinal, length FROM documents WHERE doc_id = ?", (doc_id,))
+        if row is None:
+            return False
+        ordinal, length = row
+        # Term bounds are left as they are; they can only overestimate now.
+        self._connection.execute(
+            "UPDATE terms SET document_frequency = document_frequency - 1"
+            " WHERE term_id IN (SELECT term_id FROM postings WHERE ordinal = ?)",
+            (ordinal,),
+        )
+        self._connection.execute("DELETE FROM postings WHERE ordinal = ?", (ordinal,))
+        self._connection.execute("DELETE FROM documents WHERE ordinal = ?", (ordinal,))
+        self._add_counters(document_count=-1, total_length=-length, next_ordinal=0)
+        return True
+
+    def _intern(self, term: str) -> int:
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            self._connection.execute("INSERT OR IGNORE INTO terms (term) VALUES (?)", (term,))
+            (term_id,) = self._fetchone("SELECT term_id FROM terms WHERE term = ?", (term,))
+            self._term_ids[term] = term_id
+        return term_id
+
+    def _counter(self, key: str) -> int:
+        (value,) = self._fetchone("SELECT value FROM meta WHERE key = ?", (key,))
+        return value
+
+    def _add_counters(self, **deltas: int) -> None:
+        self._connection.executemany(
+            "UPDATE meta SET value = value + ? WHERE key = ?",
+            [(delta, key) for key, delta in deltas.items()],
+        )
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        with self._lock:
+            if self._writing:
+                # Nested in ``transaction``: the outermost block commits.
+                yield
+                return
+            # Taking the write lock up front avoids upgrading a read lock,
+            # which can fail with SQLITE_BUSY when another process writes.
+            self._connection.execute("BEGIN IMMEDIATE")
+            (version,) = self._fetchone("PRAGMA data_version")
+            if version != self._term_ids_version:
+                self._term_ids.clear()
+                self._term_ids_version = version
+            self._writing = True
+            try:
+                yield
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                self._term_ids.clear()
+                raise
+            else:
+                self._connection.execute("COMMIT")
+            finally:
+                self._writing = False
+                self._statistics = None
+
+    def _current_statistics(self) -> _Statistics:
+        with self._lock:
+            (version,) = self._fetchone("PRAGMA data_version")
+            statistics = self._statistics
+            if statistics is None or statistics.version != version:
+                rows = dict(self._fetchall("SELECT key, value FROM meta"))
+                statistics = _Statistics(
+                    version, rows["document_count"], rows["total_length"], rows["next_ordinal"]
+                )
+                self._statistics = statistics
+            return statistics
+
+    def _stream(self, sql: str, parameters: Sequence[Any] = ()) -> Iterator[Any]:
+        # Rows are fetched a block at a time, so memory does not grow with the
+        # number of rows.
+        with self._lock:
+            cursor = self._connection.execute(sql, parameters)
+        try:
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(BLOCK_SIZE)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    def _fetchone(self, sql: str, parameters: Sequence[Any] = ()) -> Any:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchone()
+
+    def _fetchall(self, sql: str, parameters: Sequence[Any] = ()) -> List[Any]:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+
+class SqliteDocumentStore:
+    """``DocumentSource`` over the documents table of a ``SqliteIndex``.
+
+    Ordinals of deleted documents raise ``IndexError``.
+    """
+
+    __slots__ = ("_index",)
+
+    def __init__(self, index: SqliteIndex) -> None:
+        self._index = index
+
+    def __len__(self) -> int:
+        return self._index._counter("next_ordinal")
+
+    def doc_id(self, ordinal: int) -> str:
+        return self._field("doc_id", ordinal)
+
+    def title(self, ordinal: int) -> str:
+        return self._field("title", ordinal)
+
+    def content(self, ordinal: int) -> str:
+        return self._field("content", ordinal)
+
+    def metadata(self, ordinal: int) -> Optional[dict[str, str]]:
+        metadata = self._field("metadata", ordinal)
+        return None if metadata is None else json.loads(metadata)
+
+    def view(self, ordinal: int) -> StoredDocument:
+        """Return a lazy view of one document."""
+
+        if ordinal < 0:
+            raise IndexError("document ordinal out of range")
+        return StoredDocument(self, ordinal)
+
+    def document(self, ordinal: int) -> Document:
+        row = self._index._fetchone(
+            "SELECT doc_id, title, content, metadata FROM documents WHERE ordinal = ?", (ordinal,)
+        )
+        if row is None:
+            raise IndexError("document ordinal out of range")
+        return _document(row)
+
+    def documents(self) -> Iterator[Document]:
+        """Yield every document in ordinal order, a page at a time."""
+
+        last = -1
+        while True:
+            rows = self._index._fetchall(
+                "SELECT ordinal, doc_id, title, content, metadata FROM documents"
+                " WHERE ordinal > ? ORDER BY ordinal LIMIT 256",
+                (last,),
+            )
+            if not rows:
+                return
+            for row in rows:
+                yield _document(row[1:])
+            last = rows[-1][0]
+
+    def close(self) -> None:
+        # The connection belongs to the index; ``SqliteIndex.close`` closes it.
+        pass
+
+    def _field(self, column: str, ordinal: int) -> Any:
+        # ``column`` is one of a fixed set of names, never user input.
+        row = self._index._fetchone(
+            f"SELECT {column} FROM documents WHERE ordinal = ?", (ordinal,)
+        )
+        if row is None:
+            raise IndexError("document ordinal out of range")
+        return row[0]
+
+
+def write_sqlite_index(path: str | Path, index: Index) -> None:
+    """Replace the contents of the database at ``path`` with ``index``'s documents.
+
+    The swap is one transaction, so processes reading the database see
+    either the old or the new documents.
+    """
+
+    path = Path(path)
+    if isinstance(index, SqliteIndex) and path.exists() and path.samefile(index.path):
+        return
+    with SqliteIndex(path) as target:
+        vocabulary = Vocabulary()
+        with target._write():
+            for table in ("postings", "documents", "terms"):
+                target._connection.execute(f"DELETE FROM {table}")
+            target._connection.executemany(
+                "UPDATE meta SET value = 0 WHERE key = ?", [(key,) for key in _COUNTERS]
+            )
+            target._connection.execute(
+                "UPDATE meta SET value = ? WHERE key = 'generation'", (_new_generation(),)
+            )
+            target._term_ids.clear()
+            for doc in index.documents():
+                target._insert(doc, vocabulary)
+
+
+def verify_sqlite_index(path: str | Path) -> VerifyResult:
+    """Run SQLite's ``quick_check`` over every page of the database."""
+
+    path = Path(path)
+    connection = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        (pages,) = connection.execute("PRAGMA page_count").fetchone()
+        (page_size,) = connection.execute("PRAGMA page_size").fetchone()
+        problems = [row[0] for row in connection.execute("PRAGMA quick_check")]
+    except sqlite3.DatabaseError as exc:
+        return VerifyResult(path, 0, 0, str(exc))
+    finally:
+        connection.close()
+    if problems != ["ok"]:
+        return VerifyResult(path, 0, pages * page_size, problems[0])
+    return VerifyResult(path, pages, pages * page_size)
+
+
+def _new_generation() -> int:
+    # 62 random bits fit SQLite's signed 64-bit integers.
+    return uuid.uuid4().int >> 66
+
+
+def _document(row: Sequence[Any]) -> Document:
+    doc_id, title, content, metadata = row
+    return Document(
+        doc_id=doc_id,
+        title=title,
+        content=content,
+        metadata=None if metadata is None else json.loads(metadata),
+    )
+
+
+__all__ = [
+    "SqliteDocumentStore",
+    "SqliteIndex",
+    "is_sqlite_index",
+    "verify_sqlite_index",
+    "write_sqlite_index",
+]
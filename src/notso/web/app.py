@@ -9,11 +9,12 @@ from string import Template
 from typing import Iterable, List
 from urllib.parse import parse_qs, urlparse
 
-from ..engine import InMemoryIndex as SearchIndex, SearchResult, build_index, load_index, search
-from ..sample_docs import SAMPLE_DOCUMENTS
+from .. import sample_docs
+from ..core.models import Index as SearchIndex
+from ..engine import SearchResult, build_index, load_index, search
 
 
-DEFAULT_INDEX_PATH = Path("data/index.json")
+DEFAULT_INDEX_PATH = Path("data/index.bin")
 
 
 @dataclass
@@ -86,7 +87,7 @@ def load_or_build_index(index_path: Path) -> SearchIndex:
 
     if index_path.exists():
         return load_index(index_path)
-    return build_index(SAMPLE_DOCUMENTS)
+    return build_index(sample_docs.SAMPLE_DOCUMENTS)
 
 
 def create_handler(app: SearchWebApp) -> type[BaseHTTPRequestHandler]:
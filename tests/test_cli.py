@@ -35,6 +35,102 @@ class CliTests(unittest.TestCase):
             self.assertIn("1.", output)
             self.assertIn("[", output)
 
+    def test_index_command_builds_on_disk_within_memory_budget(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index_path = Path(temp_dir) / "index.bin"
+            stdout = io.StringIO()
+            with redirect_stdout(stdout):
+                exit_code = cli.main(
+                    ["index", "--output", str(index_path), "--max-memory-mb", "1", "--workers", "2"]
+                )
+                self.assertEqual(cli.main(["search", "python", "--index", str(index_path)]), 0)
+            self.assertEqual(exit_code, 0)
+            self.assertIn("1.", stdout.getvalue())
+
+    def test_incremental_index_applies_changes(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            corpus = Path(temp_dir) / "corpus"
+            corpus.mkdir()
+            (corpus / "one.txt").write_text("first file", encoding="utf-8")
+            (corpus / "two.txt").write_text("second file", encoding="utf-8")
+            args = ["index", "--data", str(corpus), "--incremental"]
+            index_path = Path(temp_dir) / "index.db"
+            stdout = io.StringIO()
+            with redirect_stdout(stdout):
+                self.assertEqual(cli.main(args), 2)
+                self.assertEqual(cli.main(args + ["--output", str(index_path)]), 0)
+                (corpus / "two.txt").unlink()
+                self.assertEqual(cli.main(args + ["--output", str(index_path)]), 0)
+            lines = stdout.getvalue().splitlines()
+            self.assertIn("2 added, 0 updated, 0 removed; 2 documents", lines[1])
+            self.assertIn("0 added, 0 updated, 1 removed; 1 documents", lines[2])
+
+    def test_incremental_index_ignores_a_stale_manifest(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            corpus = Path(temp_dir) / "corpus"
+            corpus.mkdir()
+            (corpus / "one.txt").write_text("first file", encoding="utf-8")
+            (corpus / "two.txt").write_text("second file", encoding="utf-8")
+            index_path = Path(temp_dir) / "index.db"
+            manifest_path = Path(temp_dir) / "index.manifest.json"
+            args = ["index", "--data", str(corpus), "--incremental", "--output", str(index_path)]
+            stdout = io.StringIO()
+            with redirect_stdout(stdout):
+                self.assertEqual(cli.main(args), 0)
+                stale = manifest_path.read_text(encoding="utf-8")
+
+                # A full build replaces the corpus and removes the manifest.
+                self.assertEqual(cli.main(["index", "--output", str(index_path)]), 0)
+                self.assertFalse(manifest_path.exists())
+                # A manifest left from before the rebuild is not trusted.
+                manifest_path.write_text(stale, encoding="utf-8")
+                self.assertEqual(cli.main(args), 0)
+
+                # Nor is one whose database is gone.
+                for path in Path(temp_dir).glob("index.db*"):
+                    path.unlink()
+                self.assertEqual(cli.main(args), 0)
+            lines = stdout.getvalue().splitlines()
+            sample_count = int(lines[1].split()[1])
+            self.assertIn(
+                f"2 added, 0 updated, {sample_count} removed; 2 documents", lines[2]
+            )
+            self.assertIn("2 added, 0 updated, 0 removed; 2 documents", lines[3])
+
+    def test_pipeline_index_reports_stage_stats(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index_path = Path(temp_dir) / "index.json"
+            stdout = io.StringIO()
+            with redirect_stdout(stdout):
+                args = ["index", "--output", str(index_path), "--pipeline", "analyze=2"]
+                self.assertEqual(cli.main(args), 0)
+                self.assertEqual(cli.main(["search", "python", "--index", str(index_path)]), 0)
+            output = stdout.getvalue()
+            self.assertIn("normalize", output)
+            self.assertIn("Bottleneck:", output)
+            self.assertIn("1.", output)
+
+    def test_verify_command_reports_corruption(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index_path = Path(temp_dir) / "index.bin"
+            with redirect_stdout(io.StringIO()):
+                cli.main(["index", "--output", str(index_path)])
+
+            stdout = io.StringIO()
+            with redirect_stdout(stdout):
+                exit_code = cli.main(["verify", str(index_path)])
+            self.assertEqual(exit_code, 0)
+            self.assertEqual(stdout.getvalue().count(": OK"), 2)
+
+            data = bytearray(index_path.read_bytes())
+            data[-1] ^= 0xFF
+            index_path.write_bytes(bytes(data))
+            stdout = io.StringIO()
+            with redirect_stdout(stdout):
+                exit_code = cli.main(["verify", str(index_path)])
+            self.assertEqual(exit_code, 1)
+            self.assertIn("CORRUPT", stdout.getvalue())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from notso.core.compressed import build_compressed_index
+from notso.core.models import Document
+from notso.core.postings import BLOCK_SIZE, decode_varints, encode_varint
+from notso.engine import build_index, search
+
+
+def _corpus(size: int) -> list:
+    return [
+        Document(
+            doc_id=f"d{i}",
+            title=f"T{i % 7}",
+            content=" ".join(["common"] * (1 + i % 3) + [f"rare{i % 50}", "x" * (i % 4 + 1)]),
+        )
+        for i in range(size)
+    ]
+
+
+class CompressedIndexTests(unittest.TestCase):
+    def test_varint_round_trip(self) -> None:
+        values = [0, 1, 127, 128, 300, 2**32 + 5]
+        buffer = bytearray()
+        for value in values:
+            encode_varint(value, buffer)
+
+        self.assertEqual(decode_varints(buffer, 0, len(buffer)), values)
+
+    def test_postings_match_in_memory_index(self) -> None:
+        documents = _corpus(BLOCK_SIZE * 3 + 17)
+        reference = build_index(documents)
+        compressed = build_compressed_index(documents)
+
+        for term in ("common", "rare3", "xx", "t2", "missing"):
+            self.assertEqual(list(compressed.postings(term)), list(reference.postings(term)))
+            self.assertEqual(compressed.document_frequency(term), reference.document_frequency(term))
+        for ordinal in (0, BLOCK_SIZE, BLOCK_SIZE * 3 + 16):
+            for term in ("common", "t2", "xx"):
+                self.assertEqual(
+                    list(compressed.positions(ordinal, term)),
+                    list(reference.positions(ordinal, term)),
+                )
+        self.assertEqual(compressed.term_frequencies("d5"), reference.term_frequencies("d5"))
+        self.assertEqual(compressed.document_length(9), reference.document_length(9))
+        self.assertAlmostEqual(
+            compressed.average_document_length(), reference.average_document_length()
+        )
+
+    def test_search_results_match_in_memory_index(self) -> None:
+        documents = _corpus(300)
+        expected = search(build_index(documents), "common rare7 xxx", top_k=10)
+        actual = search(build_compressed_index(documents), "common rare7 xxx", top_k=10)
+
+        self.assertEqual(actual, expected)
+
+    def test_reports_bytes_per_posting(self) -> None:
+        index = build_compressed_index(_corpus(1000))
+
+        self.assertGreater(index.posting_count(), 1000)
+        self.assertLess(index.bytes_per_posting(), 4.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
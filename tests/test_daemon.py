@@ -0,0 +1,99 @@
+import io
+import socket
+import tempfile
+import threading
+import tracemalloc
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest import mock
+
+from notso import cli
+from notso.daemon import DaemonClient, QueryServer, QueryService
+from notso.engine import build_index, save_index, search_with_limits
+from notso.resource_plan import ResourceLimits
+from notso.sample_docs import SAMPLE_DOCUMENTS
+
+
+class DaemonTests(unittest.TestCase):
+    def setUp(self) -> None:
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = Path(temp_dir.name)
+        self.index = build_index(SAMPLE_DOCUMENTS)
+
+    def _serve(self) -> Path:
+        socket_path = self.directory / "notso.sock"
+        server = QueryServer(socket_path, QueryService(self.index))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        def stop() -> None:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.addCleanup(stop)
+        return socket_path
+
+    def test_client_matches_local_search(self) -> None:
+        socket_path = self._serve()
+        limits = ResourceLimits(max_documents=2)
+        with DaemonClient(socket_path) as client:
+            for query in ("python", "quick fox", "search engine", "zzz"):
+                for strategy in ("exhaustive", "blockmax"):
+                    local, local_stop = search_with_limits(
+                        self.index, query, top_k=3, limits=limits, strategy=strategy
+                    )
+                    remote, remote_stop = client.search(
+                        query, top_k=3, limits=limits, strategy=strategy
+                    )
+                    self.assertEqual(
+                        [(r.doc_id, r.score, r.text) for r in remote],
+                        [(r.doc_id, r.score, r.text) for r in local],
+                    )
+                    self.assertEqual(remote_stop, local_stop)
+            with self.assertRaises(ValueError):
+                client.search("python", strategy="bogus")
+            self.assertIn("error", client.request({"query": "python", "limits": []}))
+            self.assertEqual(len(client.search("python", top_k=1)[0]), 1)
+
+    def test_memory_limit_leaves_tracing_off(self) -> None:
+        service = QueryService(self.index)
+        response = service.handle({"query": "python", "limits": {"max_memory_bytes": 10**9}})
+        self.assertIn("results", response)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_stale_socket_is_replaced_and_live_one_refused(self) -> None:
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(str(self.directory / "notso.sock"))
+        stale.close()
+        socket_path = self._serve()
+        with DaemonClient(socket_path) as client:
+            self.assertTrue(client.search("python")[0])
+        with self.assertRaises(OSError):
+            QueryServer(socket_path, QueryService(self.index))
+
+    def test_cli_forwards_to_daemon_and_runs_shell(self) -> None:
+        index_path = self.directory / "index.json"
+        save_index(self.index, index_path)
+        socket_path = self._serve()
+        search = ["search", "python", "--index", str(index_path)]
+        local, forwarded, missing, shell = (io.StringIO() for _ in range(4))
+        with redirect_stdout(local):
+            self.assertEqual(cli.main(search), 0)
+        with redirect_stdout(forwarded):
+            self.assertEqual(cli.main(search + ["--daemon", str(socket_path)]), 0)
+        with redirect_stdout(missing):
+            self.assertEqual(cli.main(search + ["--daemon", str(self.directory / "no")]), 1)
+        self.assertEqual(forwarded.getvalue(), local.getvalue())
+        self.assertIn("notso serve-cli", missing.getvalue())
+
+        queries = io.StringIO("python\n\nzzz\nquit\npython\n")
+        with mock.patch("sys.stdin", queries), redirect_stdout(shell):
+            self.assertEqual(cli.main(["shell", "--index", str(index_path)]), 0)
+        self.assertEqual(shell.getvalue(), local.getvalue() + "\nNo results found.\n\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
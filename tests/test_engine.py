@@ -1,7 +1,9 @@
 import unittest
 
 from notso.core.models import Document
-from notso.engine import build_index, search
+from notso.core.ranker import HybridRanker, bm25_idf
+from notso.engine import build_index, search, search_with_limits
+from notso.resource_plan import ResourceLimits
 
 
 class EngineTests(unittest.TestCase):
@@ -18,6 +20,85 @@ class EngineTests(unittest.TestCase):
         self.assertEqual(results[0].doc_id, "b")
         self.assertGreaterEqual(results[0].score, results[1].score)
 
+    def test_postings_list_documents_in_corpus_order(self) -> None:
+        documents = [
+            Document(doc_id="a", title="A", content="alpha beta", metadata={}),
+            Document(doc_id="b", title="B", content="gamma", metadata={}),
+            Document(doc_id="c", title="C", content="alpha alpha", metadata={}),
+        ]
+        index = build_index(documents)
+
+        self.assertEqual(list(index.postings("alpha")), [(0, 1), (2, 2)])
+        self.assertEqual(list(index.postings("missing")), [])
+        self.assertEqual(index.document_at(2).doc_id, "c")
+
+    def test_indexed_positions_match_tokenized_proximity(self) -> None:
+        document = Document(
+            doc_id="a", title="Alpha Title", content="gamma alpha delta beta alpha", metadata={}
+        )
+        index = build_index([document])
+        ranker = HybridRanker()
+        terms = ["alpha", "beta"]
+        common = dict(
+            query_terms=terms,
+            document=document,
+            term_frequencies=index.term_frequencies("a"),
+            average_document_length=index.average_document_length(),
+            corpus_size=1,
+            document_frequency_lookup=index.document_frequency,
+        )
+
+        self.assertEqual(list(index.positions(0, "alpha")), [1, 4])
+        self.assertEqual(list(index.positions(0, "title")), [])
+        self.assertEqual(
+            ranker.score(**common, term_positions={t: index.positions(0, t) for t in terms}),
+            ranker.score(**common),
+        )
+
+    def test_scoring_context_matches_direct_scoring(self) -> None:
+        documents = [
+            Document(doc_id="a", title="A", content="alpha beta gamma", metadata={}),
+            Document(doc_id="b", title="B", content="alpha beta alpha delta epsilon", metadata={}),
+        ]
+        index = build_index(documents)
+        ranker = HybridRanker()
+        terms = ["alpha", "beta"]
+        idfs = {t: bm25_idf(index.document_frequency(t), index.document_count()) for t in terms}
+        context = ranker.context(terms, idfs)
+
+        for ordinal, document in enumerate(documents):
+            frequencies = index.term_frequencies(document.doc_id)
+            expected = ranker.score(
+                query_terms=terms,
+                document=document,
+                term_frequencies=frequencies,
+                average_document_length=index.average_document_length(),
+                corpus_size=index.document_count(),
+                document_frequency_lookup=index.document_frequency,
+            )
+            actual = ranker.score_document(
+                context,
+                document=document,
+                term_frequencies={t: frequencies[t] for t in terms},
+                length_norm=index.length_norms()[ordinal],
+            )
+            self.assertAlmostEqual(actual, expected)
+        self.assertAlmostEqual(index.length_norms()[1], 6 / 5)
+
+    def test_search_only_visits_posting_candidates(self) -> None:
+        documents = [
+            Document(doc_id="a", title="A", content="gamma delta", metadata={}),
+            Document(doc_id="b", title="B", content="gamma", metadata={}),
+            Document(doc_id="c", title="C", content="alpha", metadata={}),
+        ]
+        index = build_index(documents)
+        limits = ResourceLimits(max_documents=1)
+
+        results, reason = search_with_limits(index, "alpha", top_k=5, limits=limits)
+
+        self.assertIsNone(reason)
+        self.assertEqual([result.doc_id for result in results], ["c"])
+
 
 if __name__ == "__main__":
     unittest.main()
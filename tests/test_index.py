@@ -0,0 +1,175 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from notso.core import index as index_module
+from notso.core.compressed import build_compressed_index
+from notso.core.index import (
+    COMPACT_MIN_DEAD,
+    InMemoryIndex,
+    build_in_memory_index,
+    build_in_memory_index_from_store,
+)
+from notso.core.models import Document
+from notso.core.store import DocumentStore
+from notso.core.vocab import Vocabulary
+from notso.engine import build_index_file, save_index, search_with_limits
+
+
+def _doc(doc_id: str, content: str) -> Document:
+    return Document(doc_id=doc_id, title=doc_id.upper(), content=content)
+
+
+def _scores(index: InMemoryIndex, query: str, strategy: str = "exhaustive") -> dict:
+    results, _ = search_with_limits(index, query, top_k=50, strategy=strategy)
+    return {result.doc_id: round(result.score, 9) for result in results}
+
+
+class IncrementalIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.documents = [
+            _doc(f"d{i}", " ".join(["alpha"] * (i % 4 + 1) + ["beta"] * (i % 3) + ["pad"] * i))
+            for i in range(300)
+        ]
+
+    def test_add_update_delete_match_fresh_build(self) -> None:
+        index = build_in_memory_index(self.documents[:200])
+        index.add_documents(self.documents[200:])
+        index.delete_document("d5")
+        index.delete_document("d250")
+        index.update_document(_doc("d7", "beta gamma gamma"))
+
+        live = [doc for doc in self.documents if doc.doc_id not in {"d5", "d250", "d7"}]
+        live.append(_doc("d7", "beta gamma gamma"))
+        fresh = build_in_memory_index(live)
+
+        self.assertEqual(index.document_count(), fresh.document_count())
+        self.assertEqual(index.deleted_count(), 3)
+        self.assertAlmostEqual(index.average_document_length(), fresh.average_document_length())
+        for term in ("alpha", "beta", "gamma", "pad"):
+            self.assertEqual(index.document_frequency(term), fresh.document_frequency(term))
+        for query in ("alpha beta", "gamma", "pad alpha"):
+            expected = _scores(fresh, query)
+            for strategy in ("exhaustive", "maxscore", "blockmax"):
+                self.assertEqual(_scores(index, query, strategy), expected, (query, strategy))
+
+    def test_deleted_documents_are_not_returned(self) -> None:
+        index = InMemoryIndex()
+        index.add_documents([_doc("a", "alpha"), _doc("b", "alpha beta")])
+
+        self.assertTrue(index.delete_document("a"))
+        self.assertFalse(index.delete_document("a"))
+        self.assertEqual(list(_scores(index, "alpha")), ["b"])
+        self.assertEqual(index.document_frequency("alpha"), 1)
+
+    def test_update_stream_compacts_dead_postings(self) -> None:
+        index = build_in_memory_index(self.documents)
+        for round_number in range(3):
+            for doc in self.documents:
+                index.update_document(_doc(doc.doc_id, f"{doc.content} r{round_number}"))
+
+        self.assertLess(index.deleted_count(), COMPACT_MIN_DEAD + len(self.documents) // 3)
+        self.assertLess(len(index._postings[index.vocabulary().get("alpha")]), 2 * 300)
+        fresh = build_in_memory_index([_doc(d.doc_id, f"{d.content} r2") for d in self.documents])
+        self.assertEqual([doc.doc_id for doc in index.documents()], [f"d{i}" for i in range(300)])
+        for query in ("alpha beta", "pad r2", "r1"):
+            expected = _scores(fresh, query)
+            for strategy in ("exhaustive", "maxscore", "blockmax"):
+                self.assertEqual(_scores(index, query, strategy), expected, (query, strategy))
+
+    def test_compact_keeps_base_store_ordinals(self) -> None:
+        base = DocumentStore()
+        for doc in self.documents[:200]:
+            base.append(doc)
+        index = build_in_memory_index_from_store(base)
+        index.add_documents(self.documents[200:])
+        for i in range(0, 300, 7):
+            index.delete_document(f"d{i}")
+        view = index.document_at(205)
+
+        self.assertEqual(index.compact(), 43)
+        self.assertEqual(index.compact(), 0)
+        live = [doc for i, doc in enumerate(self.documents) if i % 7]
+        fresh = build_in_memory_index(live)
+        self.assertEqual(index.deleted_count(), 29)
+        self.assertEqual(index.document_at(1).doc_id, "d1")
+        self.assertEqual(index.document_at(204).doc_id, "d205")
+        self.assertEqual(view.doc_id, "d205")
+        self.assertEqual(list(index.documents()), live)
+        for query in ("alpha beta", "pad alpha"):
+            expected = _scores(fresh, query)
+            for strategy in ("exhaustive", "maxscore", "blockmax"):
+                self.assertEqual(_scores(index, query, strategy), expected, (query, strategy))
+
+    def test_add_rejects_existing_id(self) -> None:
+        index = build_in_memory_index([_doc("a", "alpha")])
+
+        with self.assertRaises(ValueError):
+            index.add_documents([_doc("a", "beta")])
+
+
+class VocabularyTests(unittest.TestCase):
+    def test_interns_terms_as_dense_ids(self) -> None:
+        vocabulary = Vocabulary()
+
+        self.assertEqual(vocabulary.encode("Beta alpha beta"), [0, 1, 0])
+        self.assertEqual(vocabulary.intern("gamma"), 2)
+        self.assertEqual(vocabulary.get("alpha"), 1)
+        self.assertIsNone(vocabulary.get("delta"))
+        self.assertEqual(vocabulary.term(0), "beta")
+        self.assertEqual(vocabulary.sorted_ids(range(3)), [1, 0, 2])
+
+    def test_indexes_share_a_vocabulary(self) -> None:
+        vocabulary = Vocabulary()
+        documents = [_doc("a", "alpha beta"), _doc("b", "beta gamma")]
+        memory = build_in_memory_index(documents, vocabulary)
+        compressed = build_compressed_index([_doc("c", "gamma delta")], vocabulary)
+
+        self.assertEqual(len(vocabulary), 7)
+        expected_ids = {vocabulary.get(term): 1 for term in ("a", "alpha", "beta")}
+        self.assertEqual(memory.term_counts("a"), expected_ids)
+        self.assertEqual(memory.term_frequencies("b"), {"b": 1, "beta": 1, "gamma": 1})
+        self.assertEqual(memory.document_frequency("delta"), 0)
+        self.assertEqual(compressed.terms(), ["c", "delta", "gamma"])
+        self.assertEqual(compressed.document_frequency("alpha"), 0)
+        self.assertEqual(list(compressed.postings("gamma")), [(0, 1)])
+
+
+class ParallelBuildTests(unittest.TestCase):
+    def test_worker_builds_are_identical_to_serial(self) -> None:
+        documents = [
+            _doc(f"d{i}", f"w{i % 11} shared w{i % 5} ünï w{i % 3} shared") for i in range(150)
+        ]
+        serial = build_in_memory_index(documents)
+        with mock.patch.object(index_module, "ANALYZE_BATCH_SIZE", 16):
+            parallel = build_in_memory_index(iter(documents), workers=3)
+            compressed = build_compressed_index(documents, workers=2)
+
+        self.assertEqual(list(parallel.vocabulary().terms()), list(serial.vocabulary().terms()))
+        self.assertEqual(parallel._postings, serial._postings)
+        self.assertEqual(parallel._positions, serial._positions)
+        self.assertEqual(list(parallel.documents()), documents)
+        self.assertEqual(list(compressed.postings("shared")), list(serial.postings("shared")))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = []
+            for name, workers in (("serial", 1), ("parallel", 3)):
+                path = Path(temp_dir) / name / "index.bin"
+                with mock.patch.object(index_module, "ANALYZE_BATCH_SIZE", 16):
+                    build_index_file(iter(documents), path, workers=workers)
+                paths.append(path)
+                json_path = Path(temp_dir) / name / "index.json"
+                save_index(parallel if workers > 1 else serial, json_path)
+                paths.append(json_path)
+            serial_bin, serial_json, parallel_bin, parallel_json = paths
+            self.assertEqual(parallel_bin.read_bytes(), serial_bin.read_bytes())
+            self.assertEqual(parallel_json.read_bytes(), serial_json.read_bytes())
+
+    def test_duplicate_ids_are_rejected(self) -> None:
+        with self.assertRaises(ValueError):
+            build_in_memory_index([_doc("a", "x"), _doc("a", "y")], workers=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,22 @@
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
 from pathlib import Path
+from unittest import mock
 
-from notso.ingest.loader import DEFAULT_SAMPLE_PATH, load_documents_from_json
+from notso.core.models import Document
+from notso.engine import build_index
+from notso.ingest import loader
+from notso.ingest.crawler import crawl_documents
+from notso.ingest.dedup import NearDuplicateIndex, deduplicate_documents
+from notso.ingest import manifest as manifest_module
+from notso.ingest.loader import DEFAULT_SAMPLE_PATH, iter_documents, load_documents_from_json
+from notso.ingest.manifest import Manifest, apply_changes, corpus_changes
+from notso.ingest.pipeline import Pipeline, Stage, build_index_pipelined
+from notso.storage.sqlite_index import SqliteIndex
 
 
 def test_loads_sample_documents() -> None:
@@ -16,3 +32,210 @@ def test_loads_sample_documents() -> None:
 def test_can_load_from_explicit_path() -> None:
     docs = load_documents_from_json(Path("data/sample_docs.json"))
     assert docs
+
+
+def _write_corpus(path: Path, documents: list, **extra: object) -> None:
+    path.write_text(json.dumps({**extra, "documents": documents}, indent=1), encoding="utf-8")
+
+
+class StreamingLoaderTests(unittest.TestCase):
+    def test_streams_envelope_across_read_chunks(self) -> None:
+        raw = [
+            {"id": f"d{i}", "title": "T  \u00e9", "content": f"text {i} " * 3, "metadata": {"n": i}}
+            for i in range(30)
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "corpus.json"
+            _write_corpus(path, raw, version=1, note=[1.5, {"x": None}])
+
+            with mock.patch.object(loader, "_READ_CHUNK", 7):
+                stream = loader.iter_documents_from_json(path)
+                first = next(stream)
+                self.assertEqual(
+                    (first.doc_id, first.title, first.metadata), ("d0", "T é", {"n": "0"})
+                )
+                docs = [first, *stream]
+            self.assertEqual([doc.doc_id for doc in docs], [f"d{i}" for i in range(30)])
+            self.assertEqual(docs, load_documents_from_json(path))
+
+    def test_large_record_is_read_in_growing_chunks(self) -> None:
+        payload = {"documents": [{"content": "word " * 20_000}]}
+        stream = io.StringIO(json.dumps(payload))
+        handle = mock.Mock(read=mock.Mock(wraps=stream.read))
+        with mock.patch.object(loader, "_READ_CHUNK", 7):
+            self.assertEqual(loader._JsonReader(handle).value(), payload)
+        # One read per 7 characters would be over 14,000.
+        self.assertLess(handle.read.call_count, 40)
+
+    def test_envelope_version_is_checked(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "corpus.json"
+            _write_corpus(path, [{"content": "x"}], version=2)
+            with self.assertRaisesRegex(ValueError, "version"):
+                list(loader.iter_documents_from_json(path))
+            path.write_text('{"documents": [{"content": "x"}', encoding="utf-8")
+            with self.assertRaises(ValueError):
+                list(loader.iter_documents_from_json(path))
+
+    def test_streams_json_lines(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "corpus.jsonl"
+            path.write_text(
+                '{"id": "a", "content": "alpha beta"}\n\n{"content": "gamma"}\n', encoding="utf-8"
+            )
+            docs = list(loader.iter_documents(path))
+            self.assertEqual(
+                [(doc.doc_id, doc.content) for doc in docs],
+                [("a", "alpha beta"), ("doc-2", "gamma")],
+            )
+            index = build_index(loader.iter_documents(path))
+            self.assertEqual(index.document_count(), 2)
+
+            path.write_text('{"content": "ok"}\n[1]\n', encoding="utf-8")
+            with self.assertRaisesRegex(ValueError, "Line 2"):
+                list(loader.iter_documents(path))
+
+
+class CrawlerTests(unittest.TestCase):
+    def test_crawls_text_and_html_in_walk_order(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            (root / "b" / "deep").mkdir(parents=True)
+            (root / "a.txt").write_text("plain   text\nfile", encoding="utf-8")
+            (root / "b" / "page.html").write_text(
+                "<html><head><title>My &amp; Page</title><style>p {}</style></head>"
+                "<body><p>Hello</p><p>world<script>var x;</script></p></body></html>",
+                encoding="utf-8",
+            )
+            (root / "b" / "deep" / "z.txt").write_bytes(b"bad \xff byte")
+            (root / "b" / "empty.txt").write_text("   ", encoding="utf-8")
+            (root / "b" / "skip.md").write_text("not matched", encoding="utf-8")
+
+            docs = list(crawl_documents(root, threads=3, queue_size=2))
+
+            self.assertEqual(
+                [doc.doc_id for doc in docs], ["a.txt", "b/page.html", "b/deep/z.txt"]
+            )
+            self.assertEqual((docs[0].title, docs[0].content), ("a", "plain text file"))
+            self.assertEqual((docs[1].title, docs[1].content), ("My & Page", "Hello world"))
+            self.assertEqual(docs[1].metadata, {"path": "b/page.html", "type": "html"})
+            self.assertEqual(docs[2].content, "bad \ufffd byte")
+            self.assertEqual(docs[2].metadata, {"path": "b/deep/z.txt", "type": "text"})
+            self.assertEqual(build_index(crawl_documents(root)).document_count(), 3)
+
+
+class ManifestTests(unittest.TestCase):
+    def test_manifest_applies_only_changed_sources(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            corpus = Path(temp_dir) / "corpus"
+            corpus.mkdir()
+            for name, text in [("a.txt", "alpha"), ("b.txt", "beta"), ("c.txt", "gamma")]:
+                (corpus / name).write_text(text, encoding="utf-8")
+            manifest = Manifest()
+            with SqliteIndex(Path(temp_dir) / "index.db") as index:
+                self.assertEqual(
+                    apply_changes(index, corpus_changes(corpus, manifest)),
+                    {"add": 3, "update": 0, "delete": 0},
+                )
+                manifest.save(Path(temp_dir) / "index.manifest.json")
+
+                (corpus / "a.txt").write_text("alpha again", encoding="utf-8")
+                os.utime(corpus / "b.txt", ns=(1, 1))
+                (corpus / "c.txt").unlink()
+                (corpus / "d.txt").write_text("delta", encoding="utf-8")
+                with mock.patch.object(
+                    manifest_module, "read_document", wraps=manifest_module.read_document
+                ) as read_document:
+                    manifest = Manifest.load(Path(temp_dir) / "index.manifest.json")
+                    changes = list(corpus_changes(corpus, manifest))
+
+                    self.assertEqual(
+                        [(change.kind, change.doc_id) for change in changes],
+                        [("update", "a.txt"), ("add", "d.txt"), ("delete", "c.txt")],
+                    )
+                    # b.txt was touched, so it is re-read, but its content is unchanged.
+                    read = [call.args[0].name for call in read_document.call_args_list]
+                    self.assertEqual(read, ["a.txt", "b.txt", "d.txt"])
+                    apply_changes(index, changes)
+                    self.assertEqual(
+                        [doc.content for doc in index.documents()],
+                        ["beta", "alpha again", "delta"],
+                    )
+                    self.assertEqual(list(corpus_changes(corpus, manifest)), [])
+                    self.assertEqual(read_document.call_count, 3)
+
+
+class DeduplicationTests(unittest.TestCase):
+    def test_near_duplicates_are_dropped_or_clustered(self) -> None:
+        words = " ".join(f"word{i}" for i in range(300))
+        docs = [
+            Document("a", "A", words),
+            Document("b", "B", words.replace("word150", "edited"), {"source": "feed"}),
+            Document("c", "C", " ".join(f"other{i}" for i in range(300))),
+        ]
+
+        self.assertEqual([doc.doc_id for doc in deduplicate_documents(docs)], ["a", "c"])
+        clustered = list(deduplicate_documents(docs, "cluster"))
+        self.assertEqual(
+            [doc.metadata for doc in clustered],
+            [None, {"source": "feed", "duplicate_of": "a"}, None],
+        )
+
+    def test_banded_lookup_finds_every_fingerprint_within_distance(self) -> None:
+        rng = random.Random(3)
+        stored = [rng.getrandbits(64) for _ in range(200)]
+        index = NearDuplicateIndex(max_distance=3)
+        for position, fingerprint in enumerate(stored):
+            index.add(fingerprint, str(position))
+        for position, fingerprint in enumerate(stored[:50]):
+            flipped = fingerprint
+            for bit in rng.sample(range(64), 3):
+                flipped ^= 1 << bit
+            self.assertEqual(index.find(flipped), str(position))
+        self.assertIsNone(index.find(stored[0] ^ 0b11111))
+
+
+class PipelineTests(unittest.TestCase):
+    def test_pipeline_builds_the_serial_index(self) -> None:
+        rng = random.Random(7)
+        words = ["alpha", "beta", "gamma", "delta", "epsilon"]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            corpus = Path(temp_dir) / "corpus.jsonl"
+            corpus.write_text(
+                "".join(
+                    json.dumps({"id": f"d{i}", "content": " ".join(rng.choices(words, k=12))})
+                    + "\n"
+                    for i in range(150)
+                ),
+                encoding="utf-8",
+            )
+
+            index, stats = build_index_pipelined(
+                corpus, workers={"normalize": 2, "analyze": 2}, batch_size=7, queue_size=2
+            )
+
+            expected = build_index(iter_documents(corpus))
+        self.assertEqual(list(index.documents()), list(expected.documents()))
+        self.assertEqual(index.vocabulary().terms(), expected.vocabulary().terms())
+        for term in words:
+            self.assertEqual(index.postings(term), expected.postings(term))
+        self.assertEqual(
+            [stage.name for stage in stats.stages], ["read", "normalize", "analyze", "index"]
+        )
+        for stage in stats.stages:
+            self.assertEqual(stage.items, 150)
+            self.assertLessEqual(stage.queue_max, 2)
+
+    def test_pipeline_stops_on_the_first_error(self) -> None:
+        def fail_on_seven(batch: list) -> list:
+            if 7 in batch:
+                raise RuntimeError("bad item")
+            return batch
+
+        received: list = []
+        pipeline = Pipeline(
+            range(1000), [Stage("check", fail_on_seven, workers=2)], batch_size=1, queue_size=1
+        )
+        with self.assertRaisesRegex(RuntimeError, "bad item"):
+            pipeline.run(received.extend)
+        self.assertEqual(received, list(range(7)))
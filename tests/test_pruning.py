@@ -0,0 +1,87 @@
+import random
+import unittest
+
+from notso.core.compressed import build_compressed_index
+from notso.core.models import Document
+from notso.core.postings import BLOCK_SIZE
+from notso.core.pruning import END_OF_POSTINGS, EvaluationStats, PostingCursor
+from notso.engine import build_index, search_with_limits
+
+_WORDS = ["the", "a", "search", "engine", "index", "query", "rank", "block", "score", "term"]
+
+
+def _corpus(size: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    documents = []
+    for i in range(size):
+        length = rng.randint(3, 40)
+        words = [rng.choice(_WORDS[: rng.randint(2, len(_WORDS))]) for _ in range(length)]
+        title = " ".join(rng.sample(_WORDS, 2))
+        documents.append(Document(doc_id=f"d{i}", title=title, content=" ".join(words)))
+    return documents
+
+
+class PruningTests(unittest.TestCase):
+    def test_matches_exhaustive_top_k(self) -> None:
+        documents = _corpus(400)
+        queries = ["the search", "engine index query", "block score term rank", "the a", "term"]
+        for index in (build_index(documents), build_compressed_index(documents)):
+            for query in queries:
+                for top_k in (1, 3, 10):
+                    expected, _ = search_with_limits(index, query, top_k=top_k)
+                    for strategy in ("maxscore", "blockmax"):
+                        actual, _ = search_with_limits(
+                            index, query, top_k=top_k, strategy=strategy
+                        )
+                        self.assertEqual(actual, expected, (query, top_k, strategy))
+
+    def test_reports_skipped_documents(self) -> None:
+        index = build_index(_corpus(2000))
+        exhaustive = EvaluationStats()
+        pruned = EvaluationStats()
+
+        search_with_limits(index, "the a search", top_k=5, stats=exhaustive)
+        search_with_limits(index, "the a search", top_k=5, strategy="maxscore", stats=pruned)
+
+        self.assertEqual(exhaustive.docs_skipped, 0)
+        self.assertGreater(pruned.docs_skipped, 0)
+        self.assertLess(pruned.docs_scored, exhaustive.docs_scored)
+
+    def test_block_max_skips_blocks(self) -> None:
+        filler = "one two three four five six seven eight nine ten"
+        documents = [Document(doc_id="lead", title="alpha", content="alpha x alpha")]
+        for i in range(2000):
+            content = f"alpha {filler}" if i % 3 == 0 else filler
+            documents.append(Document(doc_id=f"d{i}", title="t", content=content))
+        documents.append(Document(doc_id="peak", title="t", content="alpha " * 20))
+        index = build_index(documents)
+        stats = EvaluationStats()
+        exhaustive = EvaluationStats()
+
+        results, _ = search_with_limits(index, "alpha", top_k=1, strategy="blockmax", stats=stats)
+        expected, _ = search_with_limits(index, "alpha", top_k=1, stats=exhaustive)
+
+        self.assertEqual(results, expected)
+        self.assertGreater(stats.blocks_skipped, 0)
+        self.assertLess(stats.docs_scored, exhaustive.docs_scored // 2)
+
+    def test_cursor_counts_postings_passed_after_deletes(self) -> None:
+        size = 2 * BLOCK_SIZE + 5
+        documents = [Document(doc_id=f"d{i}", title="t", content="alpha") for i in range(size)]
+        index = build_index(documents)
+        for i in range(1, 101):
+            index.delete_document(f"d{i}")
+        cursor = PostingCursor(index, "alpha")
+
+        passed = cursor.advance(END_OF_POSTINGS)
+
+        self.assertEqual(passed, size - 100)
+        self.assertEqual(cursor.doc, END_OF_POSTINGS)
+
+    def test_rejects_unknown_strategy(self) -> None:
+        with self.assertRaises(ValueError):
+            search_with_limits(build_index(_corpus(5)), "the", strategy="nope")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import tracemalloc
 import unittest
 
 from notso.core.models import Document
@@ -44,5 +45,15 @@ class ResourcePlanTests(unittest.TestCase):
         self.assertLessEqual(len(results), 1)
 
 
+    def test_resource_guard_keeps_existing_tracing(self) -> None:
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        guard = ResourceGuard(ResourceLimits(max_memory_bytes=10**9))
+        guard.start()
+        guard.stop()
+
+        self.assertTrue(tracemalloc.is_tracing())
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,117 @@
+import random
+import time
+import unittest
+from unittest import mock
+
+from notso.core.index import build_in_memory_index
+from notso.core.models import Document
+from notso.core.segments import SegmentedIndex
+from notso.engine import search_with_limits
+
+_WORDS = ["alpha", "beta", "gamma", "delta", "pad"]
+
+
+def _corpus(size: int, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    return [
+        Document(
+            doc_id=f"d{i}",
+            title=rng.choice(_WORDS),
+            content=" ".join(rng.choice(_WORDS) for _ in range(rng.randint(2, 20))),
+        )
+        for i in range(size)
+    ]
+
+
+def _results(index, query: str, strategy: str = "exhaustive") -> list:
+    results, _ = search_with_limits(index, query, top_k=20, strategy=strategy)
+    return [(result.doc_id, round(result.score, 9)) for result in results]
+
+
+class SegmentedIndexTests(unittest.TestCase):
+    def test_matches_single_index_after_writes_and_merges(self) -> None:
+        documents = _corpus(500)
+        index = SegmentedIndex(documents[:300], buffer_size=40, merge_factor=3, background=False)
+        index.add_documents(documents[300:])
+        for doc_id in ("d3", "d150", "d420", "d499"):
+            self.assertTrue(index.delete_document(doc_id))
+        replacement = Document(doc_id="d10", title="gamma", content="gamma delta gamma")
+        index.update_document(replacement)
+
+        removed = {"d3", "d150", "d420", "d499", "d10"}
+        live = [doc for doc in documents if doc.doc_id not in removed] + [replacement]
+        fresh = build_in_memory_index(live)
+
+        self.assertEqual(index.document_count(), fresh.document_count())
+        self.assertAlmostEqual(index.average_document_length(), fresh.average_document_length())
+        self.assertEqual([doc.doc_id for doc in index.documents()], [doc.doc_id for doc in live])
+        for query in ("alpha beta", "gamma delta", "pad", "beta gamma delta alpha"):
+            expected = _results(fresh, query)
+            for strategy in ("exhaustive", "maxscore", "blockmax"):
+                self.assertEqual(_results(index, query, strategy), expected, (query, strategy))
+
+    def test_tiered_merge_bounds_segment_count(self) -> None:
+        index = SegmentedIndex(_corpus(400), buffer_size=10, merge_factor=4, background=False)
+
+        # 40 flushes collapse into at most merge_factor - 1 segments per tier.
+        self.assertLessEqual(index.segment_count(), 3 * 3)
+        self.assertEqual(index.merge_pending(), 0)
+        self.assertEqual(index.document_count(), 400)
+
+    def test_background_merge(self) -> None:
+        documents = _corpus(200)
+        index = SegmentedIndex(buffer_size=10, merge_factor=4)
+        for doc in documents:
+            index.add_documents([doc])
+        index.close()
+
+        self.assertLess(index.segment_count(), 20)
+        expected = _results(build_in_memory_index(documents), "alpha gamma")
+        self.assertEqual(_results(index, "alpha gamma"), expected)
+
+    def test_failed_background_merge_is_reported_and_merging_resumes(self) -> None:
+        documents = _corpus(3)
+        index = SegmentedIndex(buffer_size=1, merge_factor=2)
+        merge_once = index._merge_once
+        failures = [OSError("disk full")]
+
+        def merge() -> bool:
+            if failures:
+                raise failures.pop()
+            return merge_once()
+
+        with mock.patch.object(index, "_merge_once", side_effect=merge):
+            index.add_documents(documents[:2])
+            deadline = time.monotonic() + 10
+            while index._merge_error is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            with self.assertRaisesRegex(RuntimeError, "merge failed") as raised:
+                index.add_documents(documents[2:])
+            self.assertIsInstance(raised.exception.__cause__, OSError)
+            index.add_documents(documents[2:])
+            index.close()
+
+        self.assertEqual(index.segment_count(), 2)
+        expected = _results(build_in_memory_index(documents), "alpha")
+        self.assertEqual(_results(index, "alpha"), expected)
+
+    def test_close_reports_failed_background_merge(self) -> None:
+        index = SegmentedIndex(buffer_size=1, merge_factor=2)
+
+        with mock.patch.object(index, "_merge_once", side_effect=OSError("disk full")):
+            index.add_documents(_corpus(2))
+            with self.assertRaisesRegex(RuntimeError, "merge failed"):
+                index.close()
+
+    def test_rejects_duplicate_ids_across_segments(self) -> None:
+        index = SegmentedIndex(_corpus(30), buffer_size=10, background=False)
+
+        with self.assertRaises(ValueError):
+            index.add_documents([Document(doc_id="d0", title="", content="alpha")])
+        self.assertTrue(index.delete_document("d0"))
+        self.assertFalse(index.delete_document("d0"))
+        self.assertNotIn("d0", [doc_id for doc_id, _score in _results(index, "alpha beta gamma")])
+
+
+if __name__ == "__main__":
+    unittest.main()
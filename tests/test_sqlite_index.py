@@ -0,0 +1,146 @@
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from notso.core.index import build_in_memory_index
+from notso.core.models import Document
+from notso.core.postings import BLOCK_SIZE
+from notso.engine import SEARCH_STRATEGIES, load_index, save_index, search_with_limits
+from notso.storage.sqlite_index import SqliteIndex
+
+_WORDS = ["alpha", "beta", "gamma", "delta", "pad"]
+_SRC = str(Path(__file__).resolve().parents[1] / "src")
+
+
+def _corpus(size: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    return [
+        Document(
+            doc_id=f"d{i}",
+            title=rng.choice(_WORDS),
+            content=" ".join(rng.choice(_WORDS) for _ in range(rng.randint(2, 20))),
+            metadata={"i": str(i)} if i % 3 == 0 else None,
+        )
+        for i in range(size)
+    ]
+
+
+def _results(index, query: str, strategy: str = "exhaustive") -> list:
+    results, _ = search_with_limits(index, query, top_k=20, strategy=strategy)
+    return [(result.doc_id, round(result.score, 9), result.text) for result in results]
+
+
+class SqliteIndexTests(unittest.TestCase):
+    def test_matches_in_memory_index_after_updates(self) -> None:
+        documents = _corpus(400)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with SqliteIndex(Path(temp_dir) / "index.db") as index:
+                self.assertEqual(index.add_documents(documents), 400)
+                for doc_id in ("d3", "d150", "d399"):
+                    self.assertTrue(index.delete_document(doc_id))
+                self.assertFalse(index.delete_document("d3"))
+                replacement = Document(doc_id="d10", title="gamma", content="gamma delta gamma")
+                index.update_document(replacement)
+
+                removed = {"d3", "d150", "d399", "d10"}
+                live = [doc for doc in documents if doc.doc_id not in removed] + [replacement]
+                fresh = build_in_memory_index(live)
+
+                self.assertEqual(index.document_count(), fresh.document_count())
+                self.assertAlmostEqual(
+                    index.average_document_length(), fresh.average_document_length()
+                )
+                self.assertEqual(list(index.documents()), live)
+                self.assertEqual(index.term_frequencies("d7"), fresh.term_frequencies("d7"))
+                self.assertEqual(
+                    index.document_frequency("gamma"), fresh.document_frequency("gamma")
+                )
+                for query in ("alpha beta", "gamma delta", "pad", "beta gamma delta alpha"):
+                    expected = _results(fresh, query)
+                    for strategy in SEARCH_STRATEGIES:
+                        self.assertEqual(_results(index, query, strategy), expected, strategy)
+
+    def test_duplicate_id_rolls_back_the_batch(self) -> None:
+        documents = _corpus(5)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with SqliteIndex(Path(temp_dir) / "index.db") as index:
+                index.add_documents(documents[:2])
+                with self.assertRaises(ValueError):
+                    index.add_documents(documents[2:] + documents[:1])
+                self.assertEqual(index.document_count(), 2)
+                self.assertEqual(index.document_frequency("zzz"), 0)
+                self.assertEqual([doc.doc_id for doc in index.documents()], ["d0", "d1"])
+
+    def test_open_writer_survives_a_rebuild_by_another_connection(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "index.db"
+            with SqliteIndex(path) as writer:
+                writer.add_documents([Document("a1", "", "alpha")])
+                # The rebuild empties the terms table, so "beta" reuses alpha's id.
+                rebuilt = build_in_memory_index([Document("b1", "", "beta")])
+                save_index(rebuilt, path)
+                writer.add_documents([Document("a2", "", "alpha")])
+
+                self.assertEqual([result[0] for result in _results(writer, "alpha")], ["a2"])
+                self.assertEqual([result[0] for result in _results(writer, "beta")], ["b1"])
+
+    def test_searches_fetch_at_most_a_block_of_rows(self) -> None:
+        documents = _corpus(1500)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "index.db"
+            with SqliteIndex(path) as reader, SqliteIndex(path) as writer:
+                reader.add_documents(documents)
+                _results(reader, "alpha beta")
+                # A commit by another connection must not make the next search
+                # reload anything per document.
+                extra = Document(doc_id="extra", title="alpha", content="alpha beta")
+                writer.add_documents([extra])
+                fresh = build_in_memory_index(documents + [extra])
+
+                fetched = []
+                fetchall = SqliteIndex._fetchall
+
+                def record(index, sql, parameters=()):
+                    rows = fetchall(index, sql, parameters)
+                    fetched.append(len(rows))
+                    return rows
+
+                with mock.patch.object(SqliteIndex, "_fetchall", autospec=True, side_effect=record):
+                    for strategy in SEARCH_STRATEGIES:
+                        expected = _results(fresh, "alpha beta", strategy)
+                        self.assertEqual(_results(reader, "alpha beta", strategy), expected)
+                self.assertGreater(len(fetched), 0)
+                self.assertLessEqual(max(fetched), BLOCK_SIZE)
+
+    def test_other_processes_see_committed_writes(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "shared.db"
+            save_index(build_in_memory_index(_corpus(20)), path)
+            reader = load_index(path)
+            self.assertIsInstance(reader, SqliteIndex)
+            self.assertEqual(reader.document_count(), 20)
+
+            script = (
+                "import sys\n"
+                "from notso.core.models import Document\n"
+                "from notso.storage.sqlite_index import SqliteIndex\n"
+                "with SqliteIndex(sys.argv[1]) as index:\n"
+                "    index.add_documents([Document('new', 'fresh', 'zebra zebra')])\n"
+                "    index.delete_document('d0')\n"
+            )
+            env = dict(os.environ, PYTHONPATH=_SRC)
+            subprocess.run([sys.executable, "-c", script, str(path)], check=True, env=env)
+
+            self.assertEqual(reader.document_count(), 20)
+            self.assertEqual([result[0] for result in _results(reader, "zebra")], ["new"])
+            self.assertNotIn("d0", [doc.doc_id for doc in reader.documents()])
+            reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
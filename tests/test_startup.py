@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+_SRC = str(Path(__file__).resolve().parents[1] / "src")
+
+# Cumulative ``-X importtime`` budget for ``import notso.cli``, best of a few
+# runs. Wall-clock timings vary with machine load, so the check only runs
+# when NOTSO_TIME_IMPORTS is set; the module checks below run always and
+# catch regressions exactly.
+IMPORT_BUDGET_US = 250_000
+
+# Modules short commands must not import: they belong to index builds or the daemon.
+_DEFERRED = (
+    "concurrent.futures",
+    "multiprocessing",
+    "tempfile",
+    "html.parser",
+    "notso.daemon",
+    "notso.ingest.crawler",
+    "notso.ingest.manifest",
+    "notso.ingest.pipeline",
+    "notso.storage.external",
+)
+
+_REPORT = (
+    "import sys\n"
+    "import {module}\n"
+    "from notso import sample_docs\n"
+    "print(sample_docs._sample_documents.cache_info().currsize)\n"
+    "print(' '.join(sorted(sys.modules)))\n"
+)
+
+
+def _run(code: str, *options: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=_SRC)
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+
+
+class StartupTests(unittest.TestCase):
+    def test_cli_and_web_imports_defer_heavy_modules(self) -> None:
+        for module in ("notso.cli", "notso.web.app"):
+            loaded_samples, modules = _run(_REPORT.format(module=module)).stdout.splitlines()
+            self.assertEqual(loaded_samples, "0", module)
+            imported = set(modules.split())
+            for deferred in _DEFERRED:
+                self.assertNotIn(deferred, imported, module)
+
+    def test_daemon_does_not_import_cli(self) -> None:
+        modules = _run(_REPORT.format(module="notso.daemon")).stdout.splitlines()[1]
+        self.assertNotIn("notso.cli", modules.split())
+
+    @unittest.skipUnless(os.environ.get("NOTSO_TIME_IMPORTS"), "set NOTSO_TIME_IMPORTS to time")
+    def test_cli_import_time_within_budget(self) -> None:
+        timings = []
+        for _ in range(3):
+            stderr = _run("import notso.cli", "-X", "importtime").stderr
+            for line in stderr.splitlines():
+                fields = line.split("|")
+                if len(fields) == 3 and fields[2].strip() == "notso.cli":
+                    timings.append(int(fields[1]))
+        self.assertEqual(len(timings), 3)
+        self.assertLess(min(timings), IMPORT_BUDGET_US)
+
+
+if __name__ == "__main__":
+    unittest.main()
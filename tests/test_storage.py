@@ -0,0 +1,402 @@
+import json
+import mmap
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from notso.core import index as index_module
+from notso.core.compressed import CompressedIndex, build_compressed_index
+from notso.core.models import Document
+from notso.engine import (
+    SEARCH_STRATEGIES,
+    build_index,
+    load_index,
+    save_index,
+    search,
+    verify_index,
+)
+from notso.sample_docs import SAMPLE_DOCUMENTS
+from notso.storage import external
+from notso.storage.binary import open_binary_index, verify_binary_index, write_binary_index
+from notso.storage.docstore import (
+    DiskDocumentStore,
+    document_store_path,
+    verify_document_store,
+    write_document_store,
+)
+from notso.storage.json_index import checksum_table_path, verify_json_index
+
+
+def _documents(count: int) -> list:
+    return [
+        Document(
+            doc_id=f"d{i}",
+            title=f"Title {i}",
+            content=f"content {i} " + "é" * (i % 5),
+            metadata={"n": str(i)} if i % 2 else None,
+        )
+        for i in range(count)
+    ]
+
+
+class DocumentStoreFileTests(unittest.TestCase):
+    def test_round_trip(self) -> None:
+        documents = _documents(70)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for compress in (True, False):
+                path = Path(temp_dir) / f"docs-{compress}.docs"
+                self.assertEqual(
+                    write_document_store(path, documents, compress=compress, block_documents=16),
+                    70,
+                )
+                with DiskDocumentStore(path) as store:
+                    self.assertEqual(len(store), 70)
+                    self.assertEqual(list(store.documents()), documents)
+                    view = store.view(33)
+                    self.assertEqual((view.doc_id, view.title), ("d33", "Title 33"))
+                    self.assertEqual(view.content, documents[33].content)
+                    self.assertEqual(view.metadata, {"n": "33"})
+                    with self.assertRaises(IndexError):
+                        store.view(70)
+
+    def test_rejects_other_files(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "bogus.docs"
+            path.write_bytes(b"not a document store at all")
+            with self.assertRaises(ValueError):
+                DiskDocumentStore(path)
+
+    def test_saved_index_reads_content_from_store(self) -> None:
+        index = build_index(SAMPLE_DOCUMENTS)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "index.json"
+            save_index(index, path)
+            self.assertTrue((Path(temp_dir) / "index.json.docs").exists())
+
+            with load_index(path) as loaded:
+                self.assertEqual(list(loaded.documents()), list(index.documents()))
+                self.assertEqual(search(loaded, "python search"), search(index, "python search"))
+
+                # Saving over the store the index is reading from is safe.
+                save_index(loaded, path)
+            # Closing the index closes its document store.
+            self.assertTrue(loaded._store._base._map.closed)
+            with load_index(path) as reloaded:
+                self.assertEqual(list(reloaded.documents()), list(index.documents()))
+
+    def test_json_index_is_saved_from_index_statistics(self) -> None:
+        index = build_index(SAMPLE_DOCUMENTS)
+        index.delete_document(SAMPLE_DOCUMENTS[0].doc_id)
+        index.update_document(Document(doc_id="new", title="Fresh", content="python python"))
+        compressed = build_compressed_index(index.documents())
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "index.json"
+            fallback = Path(temp_dir) / "compressed.json"
+            with mock.patch.object(
+                index_module, "analyze_document", wraps=index_module.analyze_document
+            ) as analyze:
+                save_index(index, path)
+                self.assertEqual(analyze.call_count, 0)
+                save_index(compressed, fallback)
+                self.assertEqual(analyze.call_count, compressed.document_count())
+
+            saved = json.loads(path.read_text(encoding="utf-8"))
+            saved.pop("document_store")
+            from_fallback = json.loads(fallback.read_text(encoding="utf-8"))
+            from_fallback.pop("document_store")
+            self.assertEqual(saved, from_fallback)
+            with load_index(path) as loaded:
+                self.assertEqual(list(loaded.documents()), list(index.documents()))
+                self.assertEqual(search(loaded, "python search"), search(index, "python search"))
+
+
+class BinaryIndexTests(unittest.TestCase):
+    def test_mapped_index_matches_built_index(self) -> None:
+        documents = [
+            Document(
+                doc_id=f"d{i}",
+                title=f"t{i % 7}",
+                content=" ".join(f"w{j % 13}" for j in range(i % 40 + 1)),
+            )
+            for i in range(600)
+        ]
+        index = build_index(documents)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "index.bin"
+            write_binary_index(path, index)
+            with open_binary_index(path) as mapped:
+                self.assertIsInstance(mapped, CompressedIndex)
+                self.assertIsInstance(mapped.length_norms(), memoryview)
+                self.assertEqual(mapped.document_count(), index.document_count())
+                self.assertEqual(mapped.average_document_length(), index.average_document_length())
+                self.assertEqual(mapped.document_frequency("w3"), index.document_frequency("w3"))
+                self.assertEqual(mapped.document_frequency("missing"), 0)
+                self.assertEqual(mapped.term_frequencies("d5"), index.term_frequencies("d5"))
+                for query in ("w1 w2", "t3 w12", "w0 missing"):
+                    for strategy in SEARCH_STRATEGIES:
+                        self.assertEqual(
+                            search(mapped, query, top_k=10, strategy=strategy),
+                            search(index, query, top_k=10, strategy=strategy),
+                        )
+
+    def test_close_and_failed_opens_release_the_mapping(self) -> None:
+        # Collects the index's mappings and those of its document store.
+        mappings = []
+        real_mmap = mmap.mmap
+
+        def capture(*args, **kwargs):
+            mappings.append(real_mmap(*args, **kwargs))
+            return mappings[-1]
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "index.bin"
+            write_binary_index(path, build_index(_documents(40)))
+            with mock.patch("notso.storage.binary.mmap.mmap", side_effect=capture):
+                with open_binary_index(path) as mapped:
+                    self.assertEqual(search(mapped, "content")[0].doc_id, "d0")
+                self.assertTrue(all(mapping.closed for mapping in mappings))
+                with self.assertRaises(ValueError):
+                    mapped.length_norms()[0]
+
+                write_document_store(document_store_path(path), _documents(39))
+                with self.assertRaisesRegex(ValueError, "does not match"):
+                    open_binary_index(path)
+                self.assertTrue(all(mapping.closed for mapping in mappings))
+
+                path.write_bytes(path.read_bytes()[:200])
+                with self.assertRaisesRegex(ValueError, "Truncated"):
+                    open_binary_index(path)
+                self.assertTrue(all(mapping.closed for mapping in mappings))
+
+    def test_save_index_picks_format_from_suffix(self) -> None:
+        index = build_index(SAMPLE_DOCUMENTS)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            binary_path = Path(temp_dir) / "index.bin"
+            json_path = Path(temp_dir) / "other.json"
+            save_index(index, binary_path)
+            save_index(index, json_path)
+
+            with load_index(binary_path) as loaded:
+                self.assertIsInstance(loaded, CompressedIndex)
+            self.assertTrue(json_path.read_text(encoding="utf-8").startswith("{"))
+            for path in (binary_path, json_path):
+                with load_index(path) as loaded:
+                    self.assertEqual(search(loaded, "python"), search(index, "python"))
+
+    def test_formats_sharing_a_stem_keep_separate_stores(self) -> None:
+        first, second = build_index(_documents(3)), build_index(_documents(5))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            binary_path = Path(temp_dir) / "index.bin"
+            json_path = Path(temp_dir) / "index.json"
+            save_index(first, binary_path)
+            save_index(second, json_path)
+
+            with load_index(binary_path) as loaded:
+                self.assertEqual(list(loaded.documents()), _documents(3))
+            with load_index(json_path) as loaded:
+                self.assertEqual(list(loaded.documents()), _documents(5))
+
+
+class ExternalBuildTests(unittest.TestCase):
+    def test_spilled_build_matches_in_memory_build(self) -> None:
+        documents = [
+            Document(
+                doc_id=f"d{i}",
+                title=f"t{i % 7} ü",
+                content=" ".join(f"w{(i * j) % 17}" for j in range(i % 50 + 1)),
+            )
+            for i in range(500)
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            spilled = Path(temp_dir) / "spilled" / "index.bin"
+            reference = Path(temp_dir) / "reference" / "index.bin"
+            # A tiny budget and fan-in force many runs and several merge passes.
+            with mock.patch.object(external, "MERGE_FAN_IN", 3):
+                count = external.build_binary_index_external(
+                    spilled, iter(documents), memory_budget=4000
+                )
+            write_binary_index(reference, build_index(documents))
+
+            self.assertEqual(count, 500)
+            self.assertEqual(spilled.read_bytes(), reference.read_bytes())
+            self.assertEqual(
+                document_store_path(spilled).read_bytes(),
+                document_store_path(reference).read_bytes(),
+            )
+            # The run files are gone.
+            names = sorted(path.name for path in spilled.parent.iterdir())
+            self.assertEqual(names, ["index.bin", "index.bin.docs"])
+
+    def test_merge_levels_copy_bounded_entries(self) -> None:
+        documents = [Document(f"d{i}", "", "common " * 20 + f"w{i % 9}") for i in range(400)]
+        merge_runs, write_entry = external._merge_runs, external._write_entry
+        entry_sizes = []
+        merge_inputs = []
+
+        def record_merge(runs: list, target: Path) -> Path:
+            merge_inputs.extend((run, run.stat().st_size) for run in runs)
+            return merge_runs(runs, target)
+
+        def record_entry(handle, term: bytes, encoded: bytes) -> None:
+            entry_sizes.append(len(encoded))
+            write_entry(handle, term, encoded)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "index.bin"
+            with mock.patch.object(external, "MERGE_FAN_IN", 3), mock.patch.object(
+                external, "_merge_runs", record_merge
+            ), mock.patch.object(external, "_write_entry", record_entry):
+                external.build_binary_index_external(path, iter(documents), memory_budget=2000)
+            with load_index(path) as loaded:
+                self.assertEqual(loaded.document_frequency("common"), 400)
+
+        # A term's entries are copied, not joined, so none outgrows one spill.
+        self.assertLess(max(entry_sizes), 2000 + 100)
+        # Every level reads the spilled data exactly once.
+        spilled = [size for run, size in merge_inputs if run.name.startswith("run-")]
+        runs, levels = len(spilled), 0
+        while runs > 3:
+            runs, levels = -(-runs // 3), levels + 1
+        self.assertGreater(levels, 1)
+        self.assertEqual(sum(size for _run, size in merge_inputs), levels * sum(spilled))
+
+    def test_rejects_duplicate_ids(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with self.assertRaises(ValueError):
+                external.build_binary_index_external(
+                    Path(temp_dir) / "index.bin", _documents(3) + _documents(1)
+                )
+
+
+def _flip_byte(path: Path, offset: int) -> None:
+    data = bytearray(path.read_bytes())
+    data[offset] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+
+class VerifyTests(unittest.TestCase):
+    def test_clean_files_verify(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            binary_path = Path(temp_dir) / "index.bin"
+            json_path = Path(temp_dir) / "index.json"
+            save_index(build_index(SAMPLE_DOCUMENTS), binary_path)
+            save_index(build_index(SAMPLE_DOCUMENTS), json_path)
+
+            index_result, store_result = verify_index(binary_path)
+            self.assertTrue(index_result.ok and store_result.ok)
+            self.assertGreater(index_result.blocks, 0)
+            self.assertGreater(index_result.bytes_checked, 0)
+            json_result, store_result = verify_index(json_path)
+            self.assertTrue(json_result.ok and store_result.ok)
+            self.assertEqual(json_result.blocks, 1)
+            self.assertEqual(json_result.bytes_checked, json_path.stat().st_size)
+            self.assertGreater(store_result.blocks, 0)
+
+    def test_reports_bad_json_index_block(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "index.json"
+            with mock.patch("notso.storage.json_index.CHECKSUM_BLOCK_BYTES", 256):
+                save_index(build_index(_documents(50)), path)
+            clean = verify_json_index(path)
+            self.assertTrue(clean.ok)
+            self.assertGreater(clean.blocks, 5)
+
+            _flip_byte(path, 300)
+            result = verify_json_index(path)
+            self.assertFalse(result.ok)
+            self.assertIn("block 1 at offset 256: checksum mismatch", result.error)
+            self.assertEqual(result.blocks, 1)
+
+            checksum_table_path(path).unlink()
+            result = verify_json_index(path)
+            self.assertFalse(result.ok)
+            self.assertIn("index.json.crc is missing", result.error)
+
+    def test_reports_first_bad_index_block(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "index.bin"
+            with mock.patch("notso.storage.binary.CHECKSUM_BLOCK_BYTES", 64):
+                write_binary_index(path, build_index(_documents(200)))
+            clean = verify_binary_index(path)
+            self.assertTrue(clean.ok)
+            self.assertGreater(clean.blocks, 20)
+            with open_binary_index(path) as mapped:
+                self.assertEqual(mapped.document_count(), 200)
+
+            # The last byte of the file belongs to the last block of the last section.
+            _flip_byte(path, path.stat().st_size - 1)
+            result = verify_binary_index(path)
+            self.assertFalse(result.ok)
+            self.assertIn("section PPOS", result.error)
+            self.assertIn("checksum mismatch", result.error)
+            self.assertEqual(result.blocks, clean.blocks - 1)
+
+    def test_corrupt_section_table_is_rejected_on_open(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "index.bin"
+            write_binary_index(path, build_index(SAMPLE_DOCUMENTS))
+            _flip_byte(path, 30)
+            with self.assertRaises(ValueError):
+                open_binary_index(path)
+            self.assertFalse(verify_binary_index(path).ok)
+
+    def test_reports_bad_document_store_block(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "store.docs"
+            write_document_store(path, _documents(40), block_documents=8)
+            self.assertEqual(verify_document_store(path).blocks, 7)
+
+            _flip_byte(path, 40)
+            result = verify_document_store(path)
+            self.assertFalse(result.ok)
+            self.assertEqual(result.blocks, 0)
+            self.assertIn("block 0 at offset 12", result.error)
+            with DiskDocumentStore(path) as store:
+                with self.assertRaises(ValueError):
+                    store.content(0)
+                self.assertEqual(store.content(39), _documents(40)[39].content)
+
+
+class JsonIndexTests(unittest.TestCase):
+    def test_loading_uses_persisted_statistics(self) -> None:
+        index = build_index(SAMPLE_DOCUMENTS)
+        index.delete_document(SAMPLE_DOCUMENTS[0].doc_id)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "index.json"
+            save_index(index, path)
+            payload = json.loads(path.read_text(encoding="utf-8"))
+            self.assertEqual(payload["version"], 4)
+            self.assertEqual(set(payload["doc_norms"]), set(payload["doc_vectors"]))
+            self.assertIn("python", payload["idf"])
+
+            with mock.patch("notso.core.vocab.tokenize", side_effect=AssertionError("tokenized")):
+                loaded = load_index(path)
+
+            with loaded:
+                self.assertEqual(loaded.document_count(), index.document_count())
+                self.assertEqual(loaded.average_document_length(), index.average_document_length())
+                self.assertEqual(
+                    loaded.document_frequency("python"), index.document_frequency("python")
+                )
+                for strategy in SEARCH_STRATEGIES:
+                    self.assertEqual(
+                        search(loaded, "python search engine", strategy=strategy),
+                        search(index, "python search engine", strategy=strategy),
+                    )
+
+    def test_reads_documents_embedded_by_version_2(self) -> None:
+        payload = {
+            "version": 2,
+            "documents": [{"id": "a", "title": "A", "content": "alpha beta", "metadata": None}],
+        }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "legacy.json"
+            path.write_text(json.dumps(payload), encoding="utf-8")
+            with load_index(path) as loaded:
+                results = search(loaded, "alpha")
+            self.assertEqual([result.doc_id for result in results], ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
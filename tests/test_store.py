@@ -0,0 +1,46 @@
+import pickle
+import unittest
+from dataclasses import FrozenInstanceError
+
+from notso.core.models import Document
+from notso.core.store import DocumentStore
+from notso.engine import build_index, search
+
+
+class DocumentStoreTests(unittest.TestCase):
+    def test_round_trips_documents(self) -> None:
+        store = DocumentStore()
+        first = Document(doc_id="a", title="Alpha", content="café alpha", metadata={"k": "v"})
+        second = Document(doc_id="b", title="Beta", content="beta")
+
+        self.assertEqual(store.append(first), 0)
+        self.assertEqual(store.append(second), 1)
+        self.assertEqual(list(store.documents()), [first, second])
+        view = store.view(0)
+        self.assertEqual((view.doc_id, view.title, view.content), ("a", "Alpha", "café alpha"))
+        self.assertEqual(view.metadata, {"k": "v"})
+        self.assertIsNone(store.metadata(1))
+        with self.assertRaises(IndexError):
+            store.view(2)
+
+    def test_document_is_slotted_and_immutable(self) -> None:
+        document = Document(doc_id="a", title="A", content="alpha")
+
+        self.assertFalse(hasattr(document, "__dict__"))
+        with self.assertRaises(FrozenInstanceError):
+            document.title = "B"  # type: ignore[misc]
+        self.assertEqual(pickle.loads(pickle.dumps(document)), document)
+        self.assertEqual(hash(document), hash(Document(doc_id="a", title="A", content="alpha")))
+
+    def test_results_read_text_from_the_store(self) -> None:
+        document = Document(doc_id="a", title="A", content="alpha beta", metadata={"k": "v"})
+        index = build_index([document])
+
+        [result] = search(index, "alpha")
+        self.assertFalse(hasattr(result, "__dict__"))
+        self.assertEqual(result.text, "alpha beta")
+        self.assertEqual(result.metadata, {"k": "v"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from notso.core.topk import TopKCollector
+
+
+class TopKCollectorTests(unittest.TestCase):
+    def test_keeps_best_scores_with_stable_ties(self) -> None:
+        collector = TopKCollector(3)
+        for ordinal, score in enumerate([0.5, 2.0, 1.0, 2.0, 0.1, 1.0]):
+            collector.offer(ordinal, score)
+
+        self.assertEqual(collector.results(), [(1, 2.0), (3, 2.0), (2, 1.0)])
+        self.assertEqual(collector.threshold(), 1.0)
+
+    def test_threshold_is_unbounded_until_full(self) -> None:
+        collector = TopKCollector(2)
+        collector.offer(0, 3.0)
+
+        self.assertFalse(collector.is_full())
+        self.assertEqual(collector.threshold(), float("-inf"))
+
+
+if __name__ == "__main__":
+    unittest.main()